@@ -1,12 +1,20 @@
 import os
+import re
 import sys
+import csv
+import json
+import time
+import argparse
+from datetime import date, datetime
+from datetime import time as dt_time
+from concurrent.futures import ProcessPoolExecutor
 from getpass import getpass
 from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, inspect, text
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, inspect, text, select
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
 from tabulate import tabulate  # for displaying tables nicely
-from models import User, engine
+from models import User, ScheduleAppointment, engine
 from dotenv import load_dotenv
 from tabulate import tabulate
 
@@ -31,7 +39,8 @@ def create_user():
     password = getpass("Password (hidden): ")
     confirm_password = getpass("Confirm Password (hidden): ")
     user_type = input("User Type (doctor/patient/nurse): ").strip().lower()
-    secret_code = getpass("Your Secret Code: ")
+    tel = input("Phone: ").strip()
+    sc_code = getpass("Your Secret Code: ")
 
     if password != confirm_password:
         print("❌ Passwords do not match.")
@@ -45,7 +54,9 @@ def create_user():
         email=email,
         password=hashed_password,
         user_type=user_type,
-        secret_code=secret_code
+        sc_code=sc_code,
+        tel=tel,
+        image_url=""
     )
 
     try:
@@ -150,24 +161,121 @@ def select_table():
         print("❌ Invalid table name.")
         return None
 
-def view_records(table_name):
+# Records are read through a server-side cursor and shown one page at a time,
+# so memory stays flat however big the table is. Filters look like
+# "sender_id = 5" or "email like %@clinic.ma" and are always bound as parameters.
+
+VIEW_PAGE_SIZE = 50
+FILTER_PATTERN = re.compile(r'^\s*(\w+)\s*(<=|>=|!=|=|<|>|like\b)\s*(.*?)\s*$', re.IGNORECASE)
+FILTER_OPERATORS = {
+    '=': lambda column, value: column == value,
+    '!=': lambda column, value: column != value,
+    '<': lambda column, value: column < value,
+    '<=': lambda column, value: column <= value,
+    '>': lambda column, value: column > value,
+    '>=': lambda column, value: column >= value,
+    'like': lambda column, value: column.like(value),
+}
+
+
+def _coerce(column, value):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is bool:
+        return value.lower() in ('1', 'true', 'yes')
+    if python_type in (int, float):
+        return python_type(value)
+    if python_type in (date, datetime, dt_time):
+        return python_type.fromisoformat(value)
+    return value
+
+
+def build_records_query(table_name, columns=None, filters=None):
+    """SELECT for `table_name` limited to `columns` and `filters` (e.g. "id > 10").
+    Raises ValueError for unknown tables, columns or malformed filters."""
+    if table_name not in inspect(engine).get_table_names():
+        raise ValueError(f"Unknown table '{table_name}'")
+    table = Table(table_name, MetaData(), autoload_with=engine)
+
+    unknown = [c for c in columns or [] if c not in table.c]
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+    query = select(*[table.c[c] for c in columns]) if columns else select(table)
+
+    for condition in filters or []:
+        match = FILTER_PATTERN.match(condition)
+        if not match or match.group(1) not in table.c:
+            raise ValueError(f"Can't use filter '{condition}'")
+        column = table.c[match.group(1)]
+        query = query.where(FILTER_OPERATORS[match.group(2).lower()](column, _coerce(column, match.group(3))))
+
+    return query.order_by(*table.primary_key.columns)
+
+
+def stream_records(query, page_size=VIEW_PAGE_SIZE):
+    """Yield (column names, rows) one page at a time from a server-side cursor."""
     with engine.connect() as connection:
-        try:
-            query = text(f"SELECT * FROM {table_name}")
-            result = connection.execute(query)
-            rows = result.fetchall()
-
-            if not rows:
-                print("📭 No records found.")
-                return
-
-            # Get column names
-            columns = result.keys()
-            data = [list(row) for row in rows]
-            print("\n📋 Records:")
-            print(tabulate(data, headers=columns, tablefmt="pretty"))
-        except Exception as e:
-            print(f"❌ Error viewing records: {e}")
+        result = connection.execution_options(stream_results=True).execute(query)
+        columns = list(result.keys())
+        for page in result.partitions(page_size):
+            yield columns, page
+
+
+def view_records(table_name, columns=None, filters=None, page_size=VIEW_PAGE_SIZE, interactive=True):
+    try:
+        query = build_records_query(table_name, columns, filters)
+        shown = 0
+        for number, (names, page) in enumerate(stream_records(query, page_size), 1):
+            print(f"\n📋 Records (page {number}, rows {shown + 1}-{shown + len(page)}):")
+            print(tabulate([list(row) for row in page], headers=names, tablefmt="pretty"))
+            shown += len(page)
+            if interactive and len(page) == page_size:
+                if input("Enter for the next page, q to stop: ").strip().lower() == 'q':
+                    break
+        if not shown:
+            print("📭 No records found.")
+        return shown
+    except (ValueError, SQLAlchemyError) as e:
+        print(f"❌ Error viewing records: {e}")
+
+
+def export_records(table_name, path, columns=None, filters=None, fmt=None):
+    try:
+        fmt = file_format(path, fmt)
+        query = build_records_query(table_name, columns, filters)
+        with engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(query)
+            count = write_rows(path, fmt, list(result.keys()), (dict(row._mapping) for row in result))
+        print(f"✅ Exported {count:,} records from {table_name} to {path}.")
+        return count
+    except (ValueError, SQLAlchemyError) as e:
+        print(f"❌ Error exporting records: {e}")
+
+
+def _ask_view_options():
+    columns = [c.strip() for c in input("Columns (comma separated, blank for all): ").split(',') if c.strip()]
+    filters = []
+    while True:
+        condition = input("Filter, e.g. id > 10 (blank to finish): ").strip()
+        if not condition:
+            break
+        filters.append(condition)
+    return columns, filters
+
+
+def browse_records(table_name):
+    columns, filters = _ask_view_options()
+    page_size = input(f"Rows per page [{VIEW_PAGE_SIZE}]: ").strip()
+    view_records(table_name, columns, filters, int(page_size) if page_size.isdigit() else VIEW_PAGE_SIZE)
+
+
+def export_records_menu(table_name):
+    columns, filters = _ask_view_options()
+    path = input("Export to (.csv or .jsonl): ").strip()
+    if path:
+        export_records(table_name, path, columns, filters)
 
 def insert_into_table(table_name):
     """Insert a record into a specific table."""
@@ -235,11 +343,12 @@ def control_table_menu(table_name):
         print("3. Delete Record")
         print("4. Delete Table")
         print("5. Add Column")
-        print("6. Back")
+        print("6. Export Records")
+        print("7. Back")
         choice = input("Enter your choice: ")
 
         if choice == '1':
-            view_records(table_name)
+            browse_records(table_name)
         elif choice == '2':
             insert_into_table(table_name)
         elif choice == '3':
@@ -249,10 +358,304 @@ def control_table_menu(table_name):
         elif choice == '5':
             add_column_to_table(table_name)
         elif choice == '6':
+            export_records_menu(table_name)
+        elif choice == '7':
             break
         else:
             print("❌ Invalid choice. Please try again.")
 
+# ======== BULK IMPORT / EXPORT ========
+# Non-interactive subcommands, e.g.
+#   python admin_console.py import-users staff.csv
+#   python admin_console.py export-appointments appointments.jsonl
+# Files are CSV or JSON Lines (picked from the extension, or --format). Imports
+# run in chunks of --chunk-size rows, one transaction and one executemany
+# INSERT per chunk; plain-text passwords are hashed in a process pool since
+# that is where the time goes.
+
+USER_TYPES = ('doctor', 'patient', 'nurse')
+USER_FIELDS = ['first_name', 'last_name', 'email', 'user_type', 'sc_code', 'tel', 'image_url']
+APPOINTMENT_FIELDS = ['patient_id', 'patient_email', 'appointment_type', 'date', 'time', 'reason', 'meet_link']
+IMPORT_CHUNK_SIZE = 1000
+
+
+def file_format(path, fmt=None):
+    fmt = (fmt or os.path.splitext(path)[1].lstrip('.')).lower()
+    if fmt in ('jsonl', 'ndjson', 'json'):
+        return 'jsonl'
+    if fmt == 'csv':
+        return 'csv'
+    raise ValueError(f"Unsupported file format '{fmt}' (use csv or jsonl)")
+
+
+def read_rows(path, fmt):
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def write_rows(path, fmt, fields, rows):
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields) if fmt == 'csv' else None
+        if writer:
+            writer.writeheader()
+        for row in rows:
+            if writer:
+                writer.writerow(row)
+            else:
+                f.write(json.dumps(row, default=str) + "\n")
+            count += 1
+    return count
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Progress:
+    def __init__(self, label):
+        self.label = label
+        self.started = time.monotonic()
+
+    def report(self, stats):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        done = sum(stats.values())
+        details = ", ".join(f"{key} {value:,}" for key, value in stats.items())
+        print(f"⏳ {self.label}: {done:,} rows in {elapsed:.1f}s ({done / elapsed:,.0f}/s) — {details}", flush=True)
+
+
+def _clean(row, field):
+    value = row.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def _hash_all(passwords, pool, workers):
+    if pool is None:
+        return [generate_password_hash(p) for p in passwords]
+    return list(pool.map(generate_password_hash, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def import_users(path, fmt=None, chunk_size=IMPORT_CHUNK_SIZE, workers=None, bind=None):
+    """Bulk-create users. Rows need first_name, last_name, email, user_type, sc_code
+    (the secret code asked at login) and a password (plain text) or password_hash.
+    Existing emails are skipped."""
+    bind = bind or engine
+    fmt = file_format(path, fmt)
+    workers = workers or os.cpu_count() or 1
+    users = User.__table__
+    stats = {'inserted': 0, 'skipped': 0, 'invalid': 0, 'failed': 0}
+    progress = Progress(f"Importing users from {path}")
+    seen = set()
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for chunk in chunked(read_rows(path, fmt), chunk_size):
+            records, passwords = [], []
+            for row in chunk:
+                record = {field: _clean(row, field) for field in USER_FIELDS}
+                record['user_type'] = record['user_type'].lower()
+                password, password_hash = _clean(row, 'password'), _clean(row, 'password_hash')
+                if not (record['first_name'] and record['last_name'] and record['email'] and record['sc_code']) \
+                        or record['user_type'] not in USER_TYPES or not (password or password_hash):
+                    stats['invalid'] += 1
+                    continue
+                if record['email'] in seen:
+                    stats['skipped'] += 1
+                    continue
+                seen.add(record['email'])
+                record['password'] = password_hash
+                record['created_at'] = datetime.utcnow()
+                records.append(record)
+                passwords.append(None if password_hash else password)
+
+            if records:
+                with bind.connect() as conn:
+                    existing = set(conn.execute(
+                        select(users.c.email).where(users.c.email.in_([r['email'] for r in records]))
+                    ).scalars())
+                keep = [i for i, r in enumerate(records) if r['email'] not in existing]
+                stats['skipped'] += len(records) - len(keep)
+                records = [records[i] for i in keep]
+                passwords = [passwords[i] for i in keep]
+
+                to_hash = [i for i, p in enumerate(passwords) if p]
+                for i, hashed in zip(to_hash, _hash_all([passwords[i] for i in to_hash], pool, workers)):
+                    records[i]['password'] = hashed
+
+            if records:
+                try:
+                    with bind.begin() as conn:
+                        conn.execute(users.insert(), records)
+                    stats['inserted'] += len(records)
+                except SQLAlchemyError as e:
+                    stats['failed'] += len(records)
+                    print(f"❌ Chunk of {len(records)} users failed: {e}")
+            progress.report(stats)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    print(f"✅ Users imported: {stats['inserted']:,} ({stats['skipped']:,} existing, "
+          f"{stats['invalid']:,} invalid, {stats['failed']:,} failed).")
+    return stats
+
+
+def export_users(path, fmt=None, with_password_hashes=False, bind=None):
+    bind = bind or engine
+    fmt = file_format(path, fmt)
+    users = User.__table__
+    fields = ['id'] + USER_FIELDS + ['created_at'] + (['password_hash'] if with_password_hashes else [])
+    columns = [users.c[f] for f in ['id'] + USER_FIELDS + ['created_at']]
+    if with_password_hashes:
+        columns.append(users.c.password.label('password_hash'))
+
+    with bind.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(select(*columns).order_by(users.c.id))
+        count = write_rows(path, fmt, fields, (dict(row._mapping) for row in result))
+    print(f"✅ Exported {count:,} users to {path}.")
+    return count
+
+
+def import_appointments(path, fmt=None, chunk_size=IMPORT_CHUNK_SIZE, bind=None):
+    """Bulk-create appointments. Rows give the patient as patient_id or
+    patient_email, plus appointment_type, date (YYYY-MM-DD), time (HH:MM) and reason.
+    Rows whose patient isn't in the users table count as invalid."""
+    bind = bind or engine
+    fmt = file_format(path, fmt)
+    appointments, users = ScheduleAppointment.__table__, User.__table__
+    stats = {'inserted': 0, 'invalid': 0, 'failed': 0}
+    progress = Progress(f"Importing appointments from {path}")
+
+    for chunk in chunked(read_rows(path, fmt), chunk_size):
+        emails = {_clean(row, 'patient_email') for row in chunk if not _clean(row, 'patient_id')} - {''}
+        ids = {int(value) for value in (_clean(row, 'patient_id') for row in chunk) if value.isdigit()}
+        patient_ids, known_ids = {}, set()
+        with bind.connect() as conn:
+            if emails:
+                patient_ids = dict(conn.execute(
+                    select(users.c.email, users.c.id).where(users.c.email.in_(emails))
+                ).all())
+            if ids:
+                known_ids = set(conn.execute(select(users.c.id).where(users.c.id.in_(ids))).scalars())
+
+        records = []
+        for row in chunk:
+            try:
+                patient_id = int(_clean(row, 'patient_id') or patient_ids[_clean(row, 'patient_email')])
+                if _clean(row, 'patient_id') and patient_id not in known_ids:
+                    raise KeyError(patient_id)
+                record = {
+                    'patient_id': patient_id,
+                    'appointment_type': _clean(row, 'appointment_type'),
+                    'date': date.fromisoformat(_clean(row, 'date')),
+                    'time': dt_time.fromisoformat(_clean(row, 'time')),
+                    'reason': _clean(row, 'reason'),
+                    'meet_link': _clean(row, 'meet_link') or None,
+                    'created_at': datetime.utcnow(),
+                }
+            except (KeyError, ValueError):
+                stats['invalid'] += 1
+                continue
+            if not record['appointment_type']:
+                stats['invalid'] += 1
+                continue
+            records.append(record)
+
+        if records:
+            try:
+                with bind.begin() as conn:
+                    conn.execute(appointments.insert(), records)
+                stats['inserted'] += len(records)
+            except SQLAlchemyError as e:
+                stats['failed'] += len(records)
+                print(f"❌ Chunk of {len(records)} appointments failed: {e}")
+        progress.report(stats)
+
+    print(f"✅ Appointments imported: {stats['inserted']:,} ({stats['invalid']:,} invalid, "
+          f"{stats['failed']:,} failed).")
+    return stats
+
+
+def export_appointments(path, fmt=None, bind=None):
+    bind = bind or engine
+    fmt = file_format(path, fmt)
+    appointments, users = ScheduleAppointment.__table__, User.__table__
+    fields = ['id'] + APPOINTMENT_FIELDS + ['created_at']
+    query = select(
+        appointments.c.id, appointments.c.patient_id, users.c.email.label('patient_email'),
+        appointments.c.appointment_type, appointments.c.date, appointments.c.time,
+        appointments.c.reason, appointments.c.meet_link, appointments.c.created_at,
+    ).select_from(
+        appointments.outerjoin(users, appointments.c.patient_id == users.c.id)
+    ).order_by(appointments.c.id)
+
+    with bind.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(query)
+        count = write_rows(path, fmt, fields, (dict(row._mapping) for row in result))
+    print(f"✅ Exported {count:,} appointments to {path}.")
+    return count
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Telehealth admin console. Run without arguments for the interactive menu.")
+    commands = parser.add_subparsers(dest='command')
+
+    for name, help_text in [('import-users', "create users from a CSV/JSONL file"),
+                            ('import-appointments', "create appointments from a CSV/JSONL file")]:
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('path')
+        command.add_argument('--format', choices=['csv', 'jsonl'])
+        command.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+        if name == 'import-users':
+            command.add_argument('--workers', type=int, help="password hashing processes (default: CPU count)")
+
+    for name, help_text in [('export-users', "write all users to a CSV/JSONL file"),
+                            ('export-appointments', "write all appointments to a CSV/JSONL file")]:
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('path')
+        command.add_argument('--format', choices=['csv', 'jsonl'])
+        if name == 'export-users':
+            command.add_argument('--with-password-hashes', action='store_true',
+                                 help="include password hashes so the file can be re-imported")
+
+    command = commands.add_parser('view-table', help="page through (or export) a table's records")
+    command.add_argument('table')
+    command.add_argument('--columns', help="comma-separated column names")
+    command.add_argument('--where', action='append', default=[], help='filter such as "sender_id = 5"; repeatable')
+    command.add_argument('--page-size', type=int, default=VIEW_PAGE_SIZE)
+    command.add_argument('--export', metavar='PATH', help="write matching records to a CSV/JSONL file instead")
+    return parser
+
+
+def run_command(args):
+    if args.command == 'import-users':
+        import_users(args.path, args.format, args.chunk_size, args.workers)
+    elif args.command == 'import-appointments':
+        import_appointments(args.path, args.format, args.chunk_size)
+    elif args.command == 'export-users':
+        export_users(args.path, args.format, args.with_password_hashes)
+    elif args.command == 'export-appointments':
+        export_appointments(args.path, args.format)
+    elif args.command == 'view-table':
+        columns = [c.strip() for c in args.columns.split(',')] if args.columns else None
+        if args.export:
+            export_records(args.table, args.export, columns, args.where)
+        else:
+            view_records(args.table, columns, args.where, args.page_size, interactive=sys.stdin.isatty())
+
 # ======== MENUS ========
 
 def user_management_menu():
@@ -307,6 +710,10 @@ def db_control_menu():
 # ======== MAIN PROGRAM ========
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run_command(build_parser().parse_args())
+        sys.exit(0)
+
     while True:
         print("\n=== 🖥️  TELEHEALTH ADMIN CONSOLE ===")
         print("1. User Management")
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import re
+import requests
+from requests.adapters import HTTPAdapter
+from cache import TTLCache, DiskBackedTTLCache
+
+# Thin client for the Together completions API used by /api/ask and /chat.
+# One pooled keep-alive session is shared by every request in the process,
+# calls have explicit connect/read timeouts, and answers can be streamed
+# token by token instead of holding a worker until the whole reply is ready.
+
+TOGETHER_API_BASE = os.getenv('TOGETHER_API_BASE', 'https://api.together.xyz/v1')
+ASSISTANT_MODEL = "mistralai/Mixtral-8x7B-Instruct-v0.1"
+ASSISTANT_MAX_TOKENS = 300
+ASSISTANT_TEMPERATURE = 0.7
+
+FALLBACK_REPLY = "Sorry, I couldn’t understand your question clearly. Could you rephrase it?"
+
+
+class AssistantError(Exception):
+    """Raised when the AI provider can't be reached or returns an error."""
+
+
+# ==== response cache ====
+# Most questions are asked again and again ("what causes knee pain"), so answers
+# are cached by normalised prompt + model + sampling parameters. Configure with
+# AI_CACHE_TTL (seconds), AI_CACHE_SIZE (entries) and optionally AI_CACHE_PATH,
+# a SQLite file that keeps answers across restarts and workers.
+
+def normalize_prompt(text):
+    """Lowercase, collapse whitespace and drop sentence-ending punctuation."""
+    text = re.sub(r'[?!.,;:]+(?=\s|$)', '', (text or '').lower())
+    return ' '.join(text.split())
+
+
+def response_cache_key(kind, prompt, model, **params):
+    raw = json.dumps({'kind': kind, 'prompt': prompt, 'model': model, 'params': params}, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def make_response_cache():
+    ttl = int(os.getenv('AI_CACHE_TTL', 24 * 60 * 60))
+    maxsize = int(os.getenv('AI_CACHE_SIZE', 1024))
+    path = os.getenv('AI_CACHE_PATH')
+    if path:
+        return DiskBackedTTLCache(path, maxsize=maxsize, ttl=ttl)
+    return TTLCache(maxsize=maxsize, ttl=ttl)
+
+
+def medical_prompt(question):
+    return (
+        "You are a helpful, kind, and professional medical assistant. "
+        f"Question: {question}\n\nAnswer:"
+    )
+
+
+def tidy_reply(text):
+    reply = (text or '').strip()
+    if not reply or "I don't understand" in reply or "I'm not sure" in reply:
+        return FALLBACK_REPLY
+    return reply
+
+
+class TogetherClient:
+    def __init__(self, api_key, base_url=TOGETHER_API_BASE, connect_timeout=None, read_timeout=None,
+                 pool_size=None, cache=None):
+        self.base_url = base_url.rstrip('/')
+        self.cache = cache
+        self.timeout = (
+            float(connect_timeout or os.getenv('AI_CONNECT_TIMEOUT', 5)),
+            float(read_timeout or os.getenv('AI_READ_TIMEOUT', 60)),
+        )
+        pool_size = int(pool_size or os.getenv('AI_POOL_SIZE', 10))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        })
+
+    def _post(self, path, payload, stream=False):
+        try:
+            response = self.session.post(f"{self.base_url}{path}", json=payload,
+                                         timeout=self.timeout, stream=stream)
+        except requests.RequestException as e:
+            raise AssistantError(f"AI provider unreachable: {e}")
+        if not response.ok:
+            response.close()
+            raise AssistantError(f"AI provider returned HTTP {response.status_code}")
+        return response
+
+    def _lines(self, response):
+        # A read timeout or dropped connection mid-answer must not look like the end of the answer
+        try:
+            yield from response.iter_lines(decode_unicode=True)
+        except requests.RequestException as e:
+            raise AssistantError(f"AI provider connection lost: {e}")
+
+    def _stream(self, path, payload, extract):
+        response = self._post(path, dict(payload, stream=True), stream=True)
+        with response:
+            for line in self._lines(response):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    return
+                try:
+                    token = extract(json.loads(data)['choices'][0])
+                except (ValueError, KeyError, IndexError):
+                    continue
+                if token:
+                    yield token
+        raise AssistantError("AI provider closed the stream before finishing the answer")
+
+    def _cached(self, key, fetch):
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        text = fetch()
+        if self.cache is not None and text:
+            self.cache.set(key, text)
+        return text
+
+    def _cached_stream(self, key, tokens):
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        parts = []
+        for token in tokens():
+            parts.append(token)
+            yield token
+        if self.cache is not None and parts:
+            self.cache.set(key, ''.join(parts))
+
+    def _completion_key(self, prompt, model, max_tokens, temperature):
+        return response_cache_key('completion', normalize_prompt(prompt), model,
+                                  max_tokens=max_tokens, temperature=temperature)
+
+    def _chat_key(self, messages, model, max_tokens, temperature):
+        normalized = [{'role': m['role'], 'content': normalize_prompt(m['content'])} for m in messages]
+        return response_cache_key('chat', normalized, model, max_tokens=max_tokens, temperature=temperature)
+
+    def complete(self, prompt, model=ASSISTANT_MODEL, max_tokens=ASSISTANT_MAX_TOKENS,
+                 temperature=ASSISTANT_TEMPERATURE):
+        payload = {"model": model, "prompt": prompt, "max_tokens": max_tokens, "temperature": temperature}
+
+        def fetch():
+            try:
+                return self._post('/completions', payload).json()["choices"][0]["text"]
+            except (ValueError, KeyError, IndexError):
+                raise AssistantError("Unexpected response from AI provider")
+
+        return self._cached(self._completion_key(prompt, model, max_tokens, temperature), fetch)
+
+    def stream_complete(self, prompt, model=ASSISTANT_MODEL, max_tokens=ASSISTANT_MAX_TOKENS,
+                        temperature=ASSISTANT_TEMPERATURE):
+        payload = {"model": model, "prompt": prompt, "max_tokens": max_tokens, "temperature": temperature}
+        return self._cached_stream(
+            self._completion_key(prompt, model, max_tokens, temperature),
+            lambda: self._stream('/completions', payload, lambda choice: choice.get('text')),
+        )
+
+    def chat(self, messages, model=ASSISTANT_MODEL, max_tokens=ASSISTANT_MAX_TOKENS,
+             temperature=ASSISTANT_TEMPERATURE):
+        payload = {"model": model, "messages": messages, "max_tokens": max_tokens, "temperature": temperature}
+
+        def fetch():
+            try:
+                return self._post('/chat/completions', payload).json()["choices"][0]["message"]["content"]
+            except (ValueError, KeyError, IndexError):
+                raise AssistantError("Unexpected response from AI provider")
+
+        return self._cached(self._chat_key(messages, model, max_tokens, temperature), fetch)
+
+    def stream_chat(self, messages, model=ASSISTANT_MODEL, max_tokens=ASSISTANT_MAX_TOKENS,
+                    temperature=ASSISTANT_TEMPERATURE):
+        payload = {"model": model, "messages": messages, "max_tokens": max_tokens, "temperature": temperature}
+        return self._cached_stream(
+            self._chat_key(messages, model, max_tokens, temperature),
+            lambda: self._stream('/chat/completions', payload,
+                                 lambda choice: choice.get('delta', {}).get('content')),
+        )
+
+
+def sse_event(data, event=None):
+    """Format one Server-Sent Events frame."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
@@ -1,109 +1,122 @@
 import os
-import uuid
-import requests
 import json
 import re
-import tempfile
-import together
 from flask_cors import CORS
 from datetime import date as dt_date
 from datetime import datetime
-from flask import Flask, render_template, redirect, request, flash, url_for, session, jsonify, g
+from flask import Flask, render_template, redirect, request, flash, url_for, session, jsonify, g, Response, stream_with_context, abort
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
 from sqlalchemy import func, Text, DateTime ,ForeignKey
 from sqlalchemy.orm import sessionmaker
-from models import User, SQLASession, engine, ScheduleAppointment, Message
+from models import User, SQLASession, ReadSession, engine, ScheduleAppointment, Message
+from cache import TTLCache
+from appointments import upcoming_appointments, past_appointments
+from clinical_records import clinical_records_page
+from risk import get_model, risk_band, RiskModelMissing
+from symptom_videos import SymptomVideoIndex
+from media import MediaLibrary
+from assets import (AssetManifest, DIST_FOLDER, COMPRESSIBLE as ASSET_COMPRESSIBLE, MANIFEST_NAME as ASSET_MANIFEST_NAME,
+                    HISTORY_NAME as ASSET_HISTORY_NAME)
+from page_cache import PageCache
+from uploads import ImageStore, UploadError, UPLOAD_FOLDER
+from meetings import MeetingService, GoogleCalendarBackend, MeetingError
+from ai_assistant import (TogetherClient, AssistantError, medical_prompt, tidy_reply, sse_event,
+                          make_response_cache)
+from messaging import (conversation_page, serialize_message, record_message, mark_conversation_read,
+                       contacts_with_summaries, MessageWriter, PAGE_SIZE)
 from dotenv import load_dotenv
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from flask_login import current_user
 from flask_socketio import SocketIO, emit, join_room
+from realtime import (socketio_options, EventThrottle, socketio_scheduler, make_presence, PRESENCE_URL,
+                      PRESENCE_TTL, SOCKETIO_MESSAGE_QUEUE)
 
 app = Flask(__name__)
 CORS(app)
 
 # App config
-SQLASession = sessionmaker(bind=engine)
 load_dotenv()
 
-socketio = SocketIO(app)
+# Rooms and emits go through the backend named by SOCKETIO_MESSAGE_QUEUE (see realtime.py)
+socketio = SocketIO(app, **socketio_options())
 
 app.secret_key = os.getenv('SECRET_KEY')
 TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY")
-TOGETHER_MODEL = "mistralai/Mistral-7B-Instruct-v0.1"
 
-VIDEO_MAPPING = {
-    "knee": "static/assets/videos/knee.mp4",
-    "heart": "static/assets/videos/heart.mp4",
-    "kidney": "static/assets/videos/kidney.mp4",
-    "leg": "static/assets/videos/leg.mp4"
-}
+# Shared, pooled client for the AI assistant endpoints, with repeated questions cached
+assistant = TogetherClient(TOGETHER_API_KEY, cache=make_response_cache())
 
+# Symptom keywords -> explainer videos, compiled once from data/symptom_videos.json
+symptom_videos = SymptomVideoIndex.from_file()
 
-# Setup upload folder
-UPLOAD_FOLDER = os.path.join('static', 'uploads', 'profile_pics')
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+# 3D models and videos under static/assets, served with ranges and fingerprinted URLs
+media_library = MediaLibrary()
+app.jinja_env.globals['media_url'] = media_library.url
+
+# Content-hashed copies of static files written by `python assets.py`
+asset_manifest = AssetManifest.load()
+asset_library = MediaLibrary(DIST_FOLDER, compressible=ASSET_COMPRESSIBLE, immutable=True)
+app.jinja_env.globals['asset_url'] = asset_manifest.url
+app.jinja_env.globals['asset_srcset'] = asset_manifest.srcset
+
+# Rendered public pages for anonymous visitors, and {% call cache_fragment(...) %} blocks
+page_cache = PageCache()
+app.jinja_env.globals['cache_fragment'] = page_cache.fragment
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+# How many upcoming appointments the doctor's dashboard card shows
+DASHBOARD_APPOINTMENTS = 5
+
+# Profile pictures: deduplicated by content, thumbnailed off the request thread
+image_store = ImageStore(UPLOAD_FOLDER)
+app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.jinja_env.globals['avatar_url'] = image_store.avatar_url
 
 today = dt_date.today()
 
-SCOPES = ['https://www.googleapis.com/auth/calendar.events']
-
-def create_google_meet_event(summary, description, start_datetime, end_datetime, email):
-    # Load the JSON string from the .env and convert to dict
-    creds_json = os.getenv('GOOGLE_CREDS_JSON')
-    creds_dict = json.loads(creds_json)
-
-    # Save the JSON to a temporary file
-    with tempfile.NamedTemporaryFile(mode='w+', suffix='.json', delete=False) as tmp:
-        json.dump(creds_dict, tmp)
-        tmp.flush()
-
-        # Use the temp file to initialize the flow
-        flow = InstalledAppFlow.from_client_secrets_file(tmp.name, SCOPES)
-        creds = flow.run_local_server(port=5002)
-
-    service = build('calendar', 'v3', credentials=creds)
-
-    event = {
-        'summary': summary,
-        'description': description,
-        'start': {
-            'dateTime': start_datetime.isoformat(),
-            'timeZone': 'Africa/Casablanca',
-        },
-        'end': {
-            'dateTime': end_datetime.isoformat(),
-            'timeZone': 'Africa/Casablanca',
-        },
-        'attendees': [{'email': email}],
-        'conferenceData': {
-            'createRequest': {
-                'requestId': f"meet-{int(datetime.datetime.now().timestamp())}"
-            }
-        },
-    }
+# Meet links are created ahead of time and stored on the appointment by a
+# single `python meetings.py watch` process (see meetings.py), not by every worker
+meeting_service = MeetingService(GoogleCalendarBackend())
+
+# ==== logged-in user cache ====
+# Detached User rows, one cache per worker process, keyed by (user id, the
+# user_version stamp in the visitor's session). Saving a profile bumps the
+# stamp, so the owner's next request misses in every worker, not just the one
+# that handled the save. Changes made elsewhere (another session, a deleted
+# account) aren't seen until the entry expires, so USER_CACHE_TTL stays short.
+user_cache = TTLCache(maxsize=int(os.getenv('USER_CACHE_SIZE', 1024)),
+                      ttl=int(os.getenv('USER_CACHE_TTL', 5)))
+
+
+def _user_cache_key(user_id):
+    return (user_id, session.get('user_version', 0))
+
+
+def get_current_user():
+    """Return the logged-in User, loading it at most once per request."""
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        user = user_cache.get(_user_cache_key(user_id)) if user_id else None
+        if user_id and user is None:
+            with SQLASession() as db_session:
+                user = db_session.query(User).filter_by(id=user_id).first()
+            if user:
+                user_cache.set(_user_cache_key(user_id), user)
+        g.current_user = user
+    return g.current_user
+
+
+def forget_user(user_id):
+    user_cache.delete(_user_cache_key(user_id))
+    if session.get('user_id') == user_id:
+        session['user_version'] = session.get('user_version', 0) + 1
+    g.pop('current_user', None)
 
-    event = service.events().insert(calendarId='primary', body=event, conferenceDataVersion=1).execute()
-    return event.get('hangoutLink')
 
 # make the user to be existin all the pages
 
 @app.context_processor
 def inject_user():
-    user_id = session.get('user_id')
-    if user_id:
-        with SQLASession() as db_session:
-            user = db_session.query(User).filter_by(id=user_id).first()
-            return dict(user=user)
-    return dict(user=None)
+    return dict(user=get_current_user())
 
 @socketio.on('send_message')
 def handle_send_message(data):
@@ -114,62 +127,152 @@ def handle_send_message(data):
     if not sender_id or not receiver_id or not content:
         return
 
-    with SQLASession() as db_session:
-        msg = Message(sender_id=sender_id, receiver_id=receiver_id, content=content)
-        db_session.add(msg)
-        db_session.commit()
-
-        # Prepare payload for clients
-        payload = {
-            'sender_id': sender_id,
-            'receiver_id': receiver_id,
-            'content': content,
-            'timestamp': msg.timestamp.strftime('%H:%M'),
-        }
-
-        # Emit message only to involved users
-        emit('receive_message', payload, room=str(sender_id))
+    try:
+        pending = message_writer.submit(sender_id, receiver_id, content, client_ref=data.get('client_ref'))
+    except Exception:
+        # Only raised in write-through mode (MESSAGE_FLUSH_INTERVAL=0), where nothing was emitted yet
+        app.logger.exception("Error saving message")
+        emit('message_failed', {'client_ref': data.get('client_ref')}, room=str(sender_id))
+        return
+
+    # Emit right away; the message is written to the database in the next batch
+    payload = {
+        'sender_id': sender_id,
+        'receiver_id': receiver_id,
+        'content': content,
+        'timestamp': pending.timestamp.strftime('%H:%M'),
+        'client_ref': pending.client_ref,
+    }
+
+    # Emit message only to involved users that are connected
+    emit('receive_message', payload, room=str(sender_id))
+    if is_listening(receiver_id):
         emit('receive_message', payload, room=str(receiver_id))
 
+
+def announce_saved_message(pending, msg_id):
+    payload = {'client_ref': pending.client_ref, 'id': msg_id}
+    for user_id in (pending.sender_id, pending.receiver_id):
+        if is_listening(user_id):
+            socketio.emit('message_saved', payload, room=str(user_id))
+
+
+def announce_failed_message(pending):
+    # Both sides were shown the message when it was sent; tell them it wasn't kept
+    payload = {'client_ref': pending.client_ref}
+    for user_id in (pending.sender_id, pending.receiver_id):
+        if is_listening(user_id):
+            socketio.emit('message_failed', payload, room=str(user_id))
+
+
+message_writer = MessageWriter(SQLASession, on_persisted=announce_saved_message,
+                               on_failed=announce_failed_message)
+
+# ==== presence ====
+presence = make_presence()
+# Without a shared registry, a worker behind a message queue only knows its own
+# sockets, so it can't tell that a user is offline everywhere
+presence_is_complete = bool(PRESENCE_URL) or not SOCKETIO_MESSAGE_QUEUE
+presence_sweeper = None
+
+
+def is_listening(user_id):
+    return presence.is_online(int(user_id)) if presence_is_complete else True
+
+
+def online_user_ids(user_ids):
+    """Ids among `user_ids` that are online, or None when presence isn't known."""
+    return presence.online(user_ids) if presence_is_complete else None
+
+
+def sweep_presence():
+    while True:
+        socketio.sleep(PRESENCE_TTL)
+        presence.expire()
+
+
+@socketio.on('connect')
+def handle_connect():
+    global presence_sweeper
+    if presence_sweeper is None:
+        presence_sweeper = socketio.start_background_task(sweep_presence)
+    user_id = session.get('user_id')
+    if user_id:
+        presence.connect(int(user_id), request.sid)
+        join_room(str(user_id))
+
+
+@socketio.on('disconnect')
+def handle_disconnect(reason=None):
+    presence.disconnect(request.sid)
+
+
+@socketio.on('heartbeat')
+def handle_heartbeat():
+    presence.heartbeat(request.sid)
+
+
 @socketio.on('join_room')
 def handle_join_room(data):
     user_id = str(data.get('user_id'))
-    if user_id:
+    if user_id.isdigit():
         join_room(user_id)
+        presence.connect(int(user_id), request.sid)
 
 
+# One typing event per sender per TYPING_THROTTLE_WINDOW seconds reaches the receiver
+typing_throttle = EventThrottle(float(os.getenv('TYPING_THROTTLE_WINDOW', 1.0)),
+                                schedule=socketio_scheduler(socketio))
+
 @socketio.on('typing')
 def handle_typing(data):
-    emit('typing', {
-        'sender_id': data['sender_id'],
-    }, room=str(data['receiver_id']))
+    if not is_listening(data['receiver_id']):
+        return
+    room = str(data['receiver_id'])
+    typing_throttle.submit(
+        ('typing', room, data['sender_id']),
+        {'sender_id': data['sender_id']},
+        lambda payload: socketio.emit('typing', payload, room=room),
+    )
+
+
+@app.route('/api/realtime/stats')
+def realtime_stats():
+    return jsonify({'typing': typing_throttle.stats()})
 
 
 @app.route('/')
+@page_cache.cached
 def index():
     return render_template('index.html')
 
 @app.route('/about')
+@page_cache.cached
 def about():
     return render_template('about.html')
 
 @app.route('/services')
+@page_cache.cached
 def services():
     return render_template('Services.html')
 
 @app.route('/contact')
+@page_cache.cached
 def contact():
     return render_template('Contact.html')
 
 @app.route('/privacy')
+@page_cache.cached
 def privacy():
     return render_template('privacy.html')
 
 @app.route('/terms')
+@page_cache.cached
 def terms():
     return render_template('terms.html')
 
 @app.route('/faq')
+@page_cache.cached
 def faq():
     return render_template('faq.html')
 
@@ -273,30 +376,50 @@ def logout():
 def ask():
     data = request.get_json()
     user_prompt = data.get("prompt", "").strip()
-    full_prompt = (
-        "You are a helpful, kind, and professional medical assistant. "
-        f"Question: {user_prompt}\n\nAnswer:"
-    )
 
-    headers = {
-        "Authorization": f"Bearer {TOGETHER_API_KEY}",
-        "Content-Type": "application/json"
-    }
+    try:
+        reply = assistant.complete(medical_prompt(user_prompt))
+    except AssistantError:
+        return jsonify({"error": "Failed to get AI response"}), 500
+    return jsonify({"response": tidy_reply(reply)})
 
-    json_data = {
-        "model": "mistralai/Mixtral-8x7B-Instruct-v0.1",
-        "prompt": full_prompt,
-        "max_tokens": 300,
-        "temperature": 0.7
-    }
 
-    response = requests.post("https://api.together.xyz/v1/completions", headers=headers, json=json_data)
-    if response.ok:
-        reply = response.json()["choices"][0]["text"].strip()
-        if not reply or "I don't understand" in reply or "I'm not sure" in reply:
-            reply = "Sorry, I couldn’t understand your question clearly. Could you rephrase it?"
-        return jsonify({"response": reply})
-    return jsonify({"error": "Failed to get AI response"}), 500
+def token_events(tokens, finish=None):
+    """Server-Sent Events for a token stream, ending with an `error` event or a `done`
+    event whose `response` is the whole answer, passed through `finish` if given."""
+    parts = []
+    try:
+        for token in tokens:
+            parts.append(token)
+            yield sse_event({"token": token})
+    except AssistantError:
+        yield sse_event({"error": "Failed to get AI response"}, event="error")
+        return
+    answer = ''.join(parts)
+    yield sse_event({"response": finish(answer) if finish else answer}, event="done")
+
+
+def event_stream(events):
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Same answer as /api/ask, sent to the browser as Server-Sent Events while it is
+# generated; the `done` event carries the tidied answer /api/ask would return.
+# In production the app runs on gevent workers (see procfile), so a stream waiting
+# on the AI provider parks a greenlet instead of holding a worker process.
+@app.route('/api/ask/stream', methods=['POST'])
+def ask_stream():
+    data = request.get_json() or {}
+    user_prompt = data.get("prompt", "").strip()
+    if not user_prompt:
+        return jsonify({"error": "No prompt provided"}), 400
+    return event_stream(token_events(assistant.stream_complete(medical_prompt(user_prompt)), finish=tidy_reply))
+
+
+@app.route('/api/ask/cache_stats')
+def ask_cache_stats():
+    return jsonify(assistant.cache.stats() if assistant.cache is not None else {})
 
 # ====== diagnosis page ======
 @app.route("/diagnosis", methods=["POST"])
@@ -304,40 +427,48 @@ def diagnosis():
         return  render_template('diagnoses.html')
 
 
+@app.route('/media/<path:filename>')
+def media(filename):
+    return media_library.response(filename, request)
+
+
+@app.route('/assets/<path:filename>')
+def assets(filename):
+    # The build's own bookkeeping isn't a public asset (and isn't content-hashed)
+    if filename in (ASSET_MANIFEST_NAME, ASSET_HISTORY_NAME):
+        abort(404)
+    return asset_library.response(filename, request)
+
+
 @app.route('/chat', methods=['POST'])
 def chat():
     user_question = request.json.get('question', '')
     if not user_question:
         return jsonify({'error': 'No question provided'}), 400
 
-    # Call Together AI
-    try:
-        response = client.chat.completions.create(
-            model="mistralai/Mixtral-8x7B-Instruct-v0.1",
-            messages=[
-                {"role": "system", "content": "You are a helpful medical assistant."},
-                {"role": "user", "content": user_question}
-            ],
-            temperature=0.7,
-            max_tokens=300
-        )
-        ai_answer = response.choices[0].message.content
-    except Exception as e:
-        ai_answer = "Sorry, there was an error processing your request."
+    messages = [
+        {"role": "system", "content": "You are a helpful medical assistant."},
+        {"role": "user", "content": user_question}
+    ]
 
     # Determine video based on symptoms
-    video_mapping = {
-        "heart": "heart.mp4",
-        "kidney": "kidney.mp4",
-        "knee": "knees.mp4",
-        "leg": "legs.mp4"
-    }
-
     video_file = None
-    for keyword, file in video_mapping.items():
-        if keyword in user_question.lower():
-            video_file = url_for('static', filename=f'assets/videos/{file}')
-            break
+    video = symptom_videos.video_for(user_question)
+    if video:
+        video_file = media_library.url(f'videos/{video}')
+
+    # Clients that ask for text/event-stream get the video first, then the answer as it is generated
+    if request.accept_mimetypes.best == 'text/event-stream':
+        def generate():
+            yield sse_event({'video_url': video_file}, event='video')
+            yield from token_events(assistant.stream_chat(messages))
+        return event_stream(generate())
+
+    # Call Together AI
+    try:
+        ai_answer = assistant.chat(messages)
+    except AssistantError:
+        ai_answer = "Sorry, there was an error processing your request."
 
     return jsonify({
         'answer': ai_answer,
@@ -355,28 +486,18 @@ def patient_dash():
 # ==== patient appointment ====
 @app.route('/patient_appoin')
 def patient_appoin():
-    with SQLASession() as db_session:
-        all_appointments = db_session.query(ScheduleAppointment).order_by(ScheduleAppointment.date.desc()).all()
-
-        today = dt_date.today()
-
-        print("TODAY:", today)
-        print("All appointments:")
-        for a in all_appointments:
-            print(f"ID: {a.id}, Date: {a.date}, Type: {a.appointment_type}")
-        
-        upcoming_appointments = [a for a in all_appointments if a.date >= today]
-        past_appointments = [a for a in all_appointments if a.date < today]
+    user_id = session.get('user_id')
+    if not user_id:
+        flash('Please log in to see your appointments.', 'error')
+        return redirect(url_for('login'))
 
-        print("Upcoming appointments:")
-        for a in upcoming_appointments:
-            print(f"ID: {a.id}, Date: {a.date}")
-        
-        print("Past appointments:")
-        for a in past_appointments:
-            print(f"ID: {a.id}, Date: {a.date}")
+    with ReadSession() as db_session:
+        upcoming = upcoming_appointments(db_session, patient_id=user_id,
+                                         page=request.args.get('page', 1, type=int))
+        past = past_appointments(db_session, patient_id=user_id,
+                                 page=request.args.get('past_page', 1, type=int))
 
-        return render_template('patient_appoin.html', upcoming_appointments=upcoming_appointments, past_appointments=past_appointments)
+        return render_template('patient_appoin.html', upcoming_appointments=upcoming, past_appointments=past)
 
 
 
@@ -393,6 +514,7 @@ def schedule_app():
 
             with SQLASession() as db_session:
                 schedule_appointments = ScheduleAppointment(
+                    patient_id=session.get('user_id'),
                     appointment_type=appointment_type,
                     date=date,
                     time=time,
@@ -444,57 +566,80 @@ def join_meeting(appointment_id):
             return redirect(url_for('patient_appoin'))
 
         try:
-            meet_link = create_google_meet_event(
-                summary=f"Appointment: {appointment.appointment_type}",
-                description=appointment.reason,
-                start_datetime=datetime.combine(appointment.date, appointment.time),
-                end_datetime=datetime.combine(appointment.date, appointment.time) + timedelta(minutes=30),
-                email=user.email
-            )
-        except Exception as e:
+            meet_link = meeting_service.ensure_link(db_session, appointment, user.email)
+        except MeetingError as e:
             flash(f'Failed to create meeting: {str(e)}', 'error')
             return redirect(url_for('patient_appoin'))
 
         return redirect(meet_link)
 
 
-@app.route('/patient_mess', defaults={'contact_id': None}, methods=['GET', 'POST'])
-@app.route('/patient_mess/<int:contact_id>', methods=['GET', 'POST'])
-def patient_mess(contact_id):
+# ==== messaging pages (shared by patient / doctor / nurse) ====
+def render_messages_page(template, endpoint, contact_types, contact_id):
     current_user_id = session.get('user_id')
 
     with SQLASession() as db_session:
-        # جِب كل الدكاترة والنيرسات باش المريض يقدر يرسل ليهم
-        contacts = db_session.query(User).filter(User.user_type.in_(['doctor', 'nurse'])).all()
         messages = []
-        contact = None 
+        contact = None
+        next_cursor = None
 
         if contact_id:
             contact = db_session.query(User).filter_by(id=contact_id).first()
 
-            if contact:
-                messages = db_session.query(Message).filter(
-                    ((Message.sender_id == current_user_id) & (Message.receiver_id == contact_id)) |
-                    ((Message.sender_id == contact_id) & (Message.receiver_id == current_user_id))
-                ).order_by(Message.timestamp.asc()).all()
-
-            # إرسال رسالة جديدة
+            # send a new message
             if request.method == 'POST':
                 content = request.form.get('content')
                 if content:
                     msg = Message(sender_id=current_user_id, receiver_id=contact_id, content=content)
                     db_session.add(msg)
+                    record_message(db_session, msg)
                     db_session.commit()
-                    return redirect(url_for('patient_mess', contact_id=contact_id))
+                    return redirect(url_for(endpoint, contact_id=contact_id))
 
-        return render_template("patient_mess.html",
+            if contact:
+                mark_conversation_read(db_session, current_user_id, contact_id)
+                messages, next_cursor = conversation_page(db_session, current_user_id, contact_id)
+
+        # one row per contact with its unread count and last message
+        contacts = contacts_with_summaries(db_session, current_user_id, contact_types)
+        online_ids = online_user_ids([c.id for c, _ in contacts])
+
+        return render_template(template,
                                contacts=contacts,
+                               online_ids=online_ids,
                                contact=contact,
                                messages=messages,
+                               next_cursor=next_cursor,
                                contact_id=contact_id,
                                current_user_id=current_user_id)
 
 
+@app.route('/api/messages/<int:contact_id>')
+def conversation_history(contact_id):
+    current_user_id = session.get('user_id')
+    if not current_user_id:
+        return jsonify({'error': 'Please log in first'}), 401
+
+    limit = request.args.get('limit', PAGE_SIZE, type=int)
+    try:
+        with ReadSession() as db_session:
+            messages, next_cursor = conversation_page(
+                db_session, current_user_id, contact_id,
+                before=request.args.get('before'), limit=limit)
+            return jsonify({
+                'messages': [serialize_message(m) for m in messages],
+                'next_cursor': next_cursor,
+            })
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+
+@app.route('/patient_mess', defaults={'contact_id': None}, methods=['GET', 'POST'])
+@app.route('/patient_mess/<int:contact_id>', methods=['GET', 'POST'])
+def patient_mess(contact_id):
+    return render_messages_page('patient_mess.html', 'patient_mess', ['doctor', 'nurse'], contact_id)
+
+
 # ==== Patient Profile ====
 @app.route('/patient_prf', methods=['GET', 'POST'])
 def patient_prf():
@@ -503,6 +648,14 @@ def patient_prf():
         flash('Please log in to access profile.', 'error')
         return redirect(url_for('login'))
 
+    # viewing comes straight from the user cache, only saving needs a live row
+    if request.method == 'GET':
+        user = get_current_user()
+        if not user:
+            flash('User not found.', 'error')
+            return redirect(url_for('login'))
+        return render_template('patient_prf.html', user=user)
+
     with SQLASession() as db_session:
         user = db_session.query(User).filter_by(id=user_id).first()
         if not user:
@@ -539,19 +692,18 @@ def patient_prf():
 
             image = request.files.get('image')
             if image and image.filename != '':
-                filename = secure_filename(image.filename)
-                unique_filename = f"{uuid.uuid4().hex}_{filename}"
-                upload_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                image.save(upload_path)
-                user.image_url = f"uploads/profile_pics/{unique_filename}".replace("\\", "/")
+                try:
+                    user.image_url = image_store.save(image)
+                except UploadError as e:
+                    flash(str(e), 'error')
+                    return redirect(url_for('patient_prf'))
 
             db_session.commit()
+            forget_user(user_id)
             flash('Profile updated successfully!', 'success')
             return redirect(url_for('patient_prf'))
 
 
-        return render_template('patient_prf.html', user=user)
-
 # ====== doctor's dash ======
 @app.route('/doctor_dash')
 def doctor_dash():
@@ -560,66 +712,16 @@ def doctor_dash():
         flash("⛔ Unauthorized access.", "error")
         return redirect(url_for('login'))
      
-     with SQLASession() as db_session:
-        all_appointments = db_session.query(ScheduleAppointment).order_by(ScheduleAppointment.date.desc()).all()
-
-        today = dt_date.today()
-
-        print("TODAY:", today)
-        print("All appointments:")
-        for a in all_appointments:
-            print(f"ID: {a.id}, Date: {a.date}, Type: {a.appointment_type}")
-        
-        upcoming_appointments = [a for a in all_appointments if a.date >= today]
-        past_appointments = [a for a in all_appointments if a.date < today]
-
-        print("Upcoming appointments:")
-        for a in upcoming_appointments:
-            print(f"ID: {a.id}, Date: {a.date}")
-        
-        print("Past appointments:")
-        for a in past_appointments:
-            print(f"ID: {a.id}, Date: {a.date}")
-
-        return render_template('doctor_dash.html', upcoming_appointments=upcoming_appointments)
+     with ReadSession() as db_session:
+        upcoming = upcoming_appointments(db_session, per_page=DASHBOARD_APPOINTMENTS)
+        return render_template('doctor_dash.html', upcoming_appointments=upcoming)
 
 
 # ======== doctor's messages ======
 @app.route('/doc_mess', defaults={'contact_id': None}, methods=['GET', 'POST'])
 @app.route('/doc_mess/<int:contact_id>', methods=['GET', 'POST'])
 def doc_mess(contact_id):
-    current_user_id = session.get('user_id')
-
-    with SQLASession() as db_session:
-        # جِب كل الدكاترة والنيرسات باش المريض يقدر يرسل ليهم
-        contacts = db_session.query(User).filter(User.user_type.in_(['patient', 'nurse'])).all()
-        messages = []
-        contact = None
-
-        if contact_id:
-            contact = db_session.query(User).filter_by(id=contact_id).first()
-
-            if contact:
-                messages = db_session.query(Message).filter(
-                    ((Message.sender_id == current_user_id) & (Message.receiver_id == contact_id)) |
-                    ((Message.sender_id == contact_id) & (Message.receiver_id == current_user_id))
-                ).order_by(Message.timestamp.asc()).all()
-
-            # إرسال رسالة جديدة
-            if request.method == 'POST':
-                content = request.form.get('content')
-                if content:
-                    msg = Message(sender_id=current_user_id, receiver_id=contact_id, content=content)
-                    db_session.add(msg)
-                    db_session.commit()
-                    return redirect(url_for('doc_mess', contact_id=contact_id))
-
-        return render_template("doc_mess.html",
-                               contacts=contacts,
-                               contact=contact,
-                               messages=messages,
-                               contact_id=contact_id,
-                               current_user_id=current_user_id)
+    return render_messages_page('doc_mess.html', 'doc_mess', ['patient', 'nurse'], contact_id)
 
 # ==== Doctor Profile ====
 @app.route('/doc_prf', methods=['GET', 'POST'])
@@ -631,6 +733,14 @@ def doc_prf():
         flash('Access denied or please log in.', 'error')
         return redirect(url_for('login'))
 
+    # viewing comes straight from the user cache, only saving needs a live row
+    if request.method == 'GET':
+        user = get_current_user()
+        if not user or user.user_type != 'doctor':
+            flash('Doctor profile not found.', 'error')
+            return redirect(url_for('login'))
+        return render_template('doc_prf.html', user=user)
+
     with SQLASession() as db_session:
         user = db_session.query(User).filter_by(id=user_id, user_type='doctor').first()
         if not user:
@@ -667,45 +777,61 @@ def doc_prf():
 
             image = request.files.get('image')
             if image and image.filename != '':
-                filename = secure_filename(image.filename)
-                unique_filename = f"{uuid.uuid4().hex}_{filename}"
-                upload_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                image.save(upload_path)
-                user.image_url = f"uploads/profile_pics/{unique_filename}".replace("\\", "/")
+                try:
+                    user.image_url = image_store.save(image)
+                except UploadError as e:
+                    flash(str(e), 'error')
+                    return redirect(url_for('doc_prf'))
 
             db_session.commit()
+            forget_user(user_id)
             flash('Profile updated successfully!', 'success')
             return redirect(url_for('doc_prf'))
 
-        return render_template('doc_prf.html', user=user)
-
 
 @app.route('/doc_appoin', methods=['POST', 'GET'])
 def doc_appoin():
-     with SQLASession() as db_session:
-        all_appointments = db_session.query(ScheduleAppointment).order_by(ScheduleAppointment.date.desc()).all()
+     with ReadSession() as db_session:
+        upcoming = upcoming_appointments(db_session, page=request.args.get('page', 1, type=int))
+        return render_template('doc_appoin.html', appointments=upcoming)
 
-        today = dt_date.today()
 
-        print("TODAY:", today)
-        print("All appointments:")
-        for a in all_appointments:
-            print(f"ID: {a.id}, Date: {a.date}, Type: {a.appointment_type}")
-        
-        upcoming_appointments = [a for a in all_appointments if a.date >= today]
+def render_clinical_records(template, endpoint, user_type):
+    if 'user_id' not in session or session.get('user_type') != user_type:
+        flash("⛔ Unauthorized access.", "error")
+        return redirect(url_for('login'))
 
-        print("Upcoming appointments:")
-        for a in upcoming_appointments:
-            print(f"ID: {a.id}, Date: {a.date}")
+    filters = {
+        'patient_id': request.args.get('patient_id', type=int),
+        'max_ejection_fraction': request.args.get('max_ef', type=int),
+        'min_serum_creatinine': request.args.get('min_creatinine', type=float),
+    }
+    with ReadSession() as db_session:
+        records = clinical_records_page(db_session, page=request.args.get('page', 1, type=int), **filters)
+        return render_template(template, records=records, endpoint=endpoint,
+                               filters={key: value for key, value in request.args.items() if key != 'page'})
 
-        return render_template('doc_appoin.html', appointments=upcoming_appointments)
 
-        return render_template('patient_prf.html', user=user)
+@app.context_processor
+def inject_risk_band():
+    return dict(risk_band=risk_band)
+
+
+@app.route('/api/risk', methods=['POST'])
+def score_risk():
+    record = request.get_json(silent=True) or {}
+    try:
+        probability = get_model().score_record(record)
+    except RiskModelMissing:
+        return jsonify({'error': 'Risk model is not trained yet'}), 503
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Missing or invalid clinical values'}), 400
+    return jsonify({'risk': round(probability, 4), 'band': risk_band(probability)})
 
 
 @app.route('/doc_patient')
 def doc_patient():
-    return render_template('doc_patient.html')
+    return render_clinical_records('doc_patient.html', 'doc_patient', 'doctor')
 
 
 @app.route('/nurse_dash')
@@ -715,43 +841,12 @@ def nurse_dash():
 
 @app.route('/nur_patient')
 def nur_patient():
-    return render_template('nur_patient.html')
+    return render_clinical_records('nur_patient.html', 'nur_patient', 'nurse')
 
 @app.route('/nur_mess', defaults={'contact_id': None}, methods=['GET', 'POST'])
 @app.route('/nur_mess/<int:contact_id>', methods=['GET', 'POST'])
 def nur_mess(contact_id):
-    current_user_id = session.get('user_id')
-
-    with SQLASession() as db_session:
-        # جِب كل الدكاترة والنيرسات باش المريض يقدر يرسل ليهم
-        contacts = db_session.query(User).filter(User.user_type.in_(['doctor', 'patient'])).all()
-        messages = []
-        contact = None
-
-        if contact_id:
-            contact = db_session.query(User).filter_by(id=contact_id).first()
-
-            if contact:
-                messages = db_session.query(Message).filter(
-                    ((Message.sender_id == current_user_id) & (Message.receiver_id == contact_id)) |
-                    ((Message.sender_id == contact_id) & (Message.receiver_id == current_user_id))
-                ).order_by(Message.timestamp.asc()).all()
-
-            # إرسال رسالة جديدة
-            if request.method == 'POST':
-                content = request.form.get('content')
-                if content:
-                    msg = Message(sender_id=current_user_id, receiver_id=contact_id, content=content)
-                    db_session.add(msg)
-                    db_session.commit()
-                    return redirect(url_for('nur_mess', contact_id=contact_id))
-
-        return render_template("nur_mess.html",
-                               contacts=contacts,
-                               contact=contact,
-                               messages=messages,
-                               contact_id=contact_id,
-                               current_user_id=current_user_id)
+    return render_messages_page('nur_mess.html', 'nur_mess', ['doctor', 'patient'], contact_id)
 
 # ==== Nurse Profile ====
 @app.route('/nur_prf', methods=['GET', 'POST'])
@@ -763,6 +858,14 @@ def nur_prf():
         flash('Access denied or please log in.', 'error')
         return redirect(url_for('login'))
 
+    # viewing comes straight from the user cache, only saving needs a live row
+    if request.method == 'GET':
+        user = get_current_user()
+        if not user or user.user_type != 'nurse':
+            flash('Nurse profile not found.', 'error')
+            return redirect(url_for('login'))
+        return render_template('nur_prf.html', user=user)
+
     with SQLASession() as db_session:
         user = db_session.query(User).filter_by(id=user_id, user_type='nurse').first()
         if not user:
@@ -799,18 +902,17 @@ def nur_prf():
 
             image = request.files.get('image')
             if image and image.filename != '':
-                filename = secure_filename(image.filename)
-                unique_filename = f"{uuid.uuid4().hex}_{filename}"
-                upload_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                image.save(upload_path)
-                user.image_url = f"uploads/profile_pics/{unique_filename}".replace("\\", "/")
+                try:
+                    user.image_url = image_store.save(image)
+                except UploadError as e:
+                    flash(str(e), 'error')
+                    return redirect(url_for('nur_prf'))
 
             db_session.commit()
+            forget_user(user_id)
             flash('Profile updated successfully!', 'success')
             return redirect(url_for('nur_prf'))
 
-        return render_template('nur_prf.html', user=user)
-
 
 @app.route('/nur_sttg')
 def nur_sttg():
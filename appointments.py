@@ -0,0 +1,78 @@
+from collections import namedtuple
+from datetime import date as dt_date
+from models import ScheduleAppointment, User
+
+# Appointment listings for the dashboards. Filtering, the upcoming/past split
+# and paging all happen in SQL on the (date, time) and (patient_id, date, time)
+# indexes, so a page costs the same however many appointments exist.
+#
+# Listings are read-only, so they select just the columns the templates show,
+# patient included, in one joined query and return them as small named tuples
+# rather than ORM objects (no identity map entries, no lazy patient loads).
+
+APPOINTMENTS_PER_PAGE = 20
+
+PatientSummary = namedtuple('PatientSummary', 'id first_name last_name image_url')
+AppointmentRow = namedtuple('AppointmentRow', 'id patient_id appointment_type date time reason meet_link patient')
+
+
+class Page:
+    """One page of rows. Iterates like the plain lists templates used to get."""
+
+    def __init__(self, items, page, per_page, has_next):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_prev = page > 1
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def paginate(query, page, per_page, convert=None):
+    page = max(page or 1, 1)
+    # Fetch one extra row to know whether there is a next page without a COUNT(*)
+    rows = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+    items = rows[:per_page]
+    if convert is not None:
+        items = [convert(row) for row in items]
+    return Page(items, page, per_page, len(rows) > per_page)
+
+
+def _appointment_row(row):
+    patient = PatientSummary(*row[7:]) if row[7] is not None else None
+    return AppointmentRow(*row[:7], patient)
+
+
+def _scoped(db_session, patient_id):
+    query = db_session.query(
+        ScheduleAppointment.id, ScheduleAppointment.patient_id, ScheduleAppointment.appointment_type,
+        ScheduleAppointment.date, ScheduleAppointment.time, ScheduleAppointment.reason,
+        ScheduleAppointment.meet_link,
+        User.id, User.first_name, User.last_name, User.image_url,
+    ).outerjoin(User, ScheduleAppointment.patient_id == User.id)
+    if patient_id is not None:
+        query = query.filter(ScheduleAppointment.patient_id == patient_id)
+    return query
+
+
+def upcoming_appointments(db_session, patient_id=None, page=1, per_page=APPOINTMENTS_PER_PAGE, today=None):
+    """Appointments from today on, soonest first."""
+    today = today or dt_date.today()
+    query = _scoped(db_session, patient_id).filter(
+        ScheduleAppointment.date >= today
+    ).order_by(ScheduleAppointment.date.asc(), ScheduleAppointment.time.asc(), ScheduleAppointment.id.asc())
+    return paginate(query, page, per_page, _appointment_row)
+
+
+def past_appointments(db_session, patient_id=None, page=1, per_page=APPOINTMENTS_PER_PAGE, today=None):
+    """Appointments before today, most recent first."""
+    today = today or dt_date.today()
+    query = _scoped(db_session, patient_id).filter(
+        ScheduleAppointment.date < today
+    ).order_by(ScheduleAppointment.date.desc(), ScheduleAppointment.time.desc(), ScheduleAppointment.id.desc())
+    return paginate(query, page, per_page, _appointment_row)
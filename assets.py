@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+from flask import url_for
+from PIL import Image, ImageOps
+from media import precompress
+
+# Static asset build.
+#
+# `python assets.py` copies everything under static/ (except uploads and the
+# media served by media.py) into static/dist/ with a content hash in the file
+# name, e.g. css/styles.3f2a9c01d4.css, writes .gz and .br siblings for text
+# assets and WebP copies of large photos at RESPONSIVE_WIDTHS, and records
+# the mapping in static/dist/manifest.json. Run it on every deploy. Files of
+# the last KEEP_BUILDS builds (listed in builds.json) are kept, so pages
+# cached before the deploy still find their files; older ones are deleted.
+#
+# Templates call asset_url('static', filename=...) exactly like url_for. With
+# a manifest the URL points at the hashed copy under /assets/, which is cached
+# as immutable; without one (a fresh checkout) it is plain url_for.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_FOLDER = os.path.join(BASE_DIR, 'static')
+DIST_FOLDER = os.path.join(STATIC_FOLDER, 'dist')
+MANIFEST_NAME = 'manifest.json'
+HISTORY_NAME = 'builds.json'
+KEEP_BUILDS = 3
+# Relative to static/; uploads change at runtime and media.py serves 3D models and videos
+SKIP = {'dist', 'uploads', 'assets/3d', 'assets/videos'}
+SKIP_EXTENSIONS = {'.xmp', '.gz', '.br', '.tmp'}
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.map'}
+RESPONSIVE_FORMATS = {'.jpg', '.jpeg', '.png'}
+RESPONSIVE_WIDTHS = (480, 960, 1600)
+HASH_LENGTH = 10
+
+
+def _sources(static_folder):
+    for directory, dirs, names in os.walk(static_folder):
+        relative_dir = os.path.relpath(directory, static_folder)
+        prefix = '' if relative_dir == '.' else relative_dir.replace(os.sep, '/') + '/'
+        dirs[:] = sorted(d for d in dirs if prefix + d not in SKIP)
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() not in SKIP_EXTENSIONS:
+                yield prefix + name
+
+
+def _hashed_name(relpath, digest, suffix='', ext=None):
+    stem, original_ext = os.path.splitext(relpath)
+    return f"{stem}.{digest}{suffix}{ext or original_ext}"
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+
+def _responsive_variants(source, relpath, digest, dist_folder):
+    """WebP copies at every RESPONSIVE_WIDTHS narrower than the image. Returns [[width, name], ...]."""
+    variants = []
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        for width in RESPONSIVE_WIDTHS:
+            if width >= image.width:
+                break
+            name = _hashed_name(relpath, digest, f'-{width}w', '.webp')
+            target = os.path.join(dist_folder, name)
+            if not os.path.exists(target):
+                resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+                resized.save(target + '.tmp', 'WEBP', quality=80, method=4)
+                os.replace(target + '.tmp', target)
+            variants.append([width, name])
+    return variants
+
+
+def build(static_folder=STATIC_FOLDER, dist_folder=DIST_FOLDER):
+    """Write hashed copies, variants and the manifest. Returns the manifest."""
+    manifest = {}
+    for relpath in _sources(static_folder):
+        source = os.path.join(static_folder, relpath)
+        with open(source, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        name = _hashed_name(relpath, digest)
+        if not os.path.exists(os.path.join(dist_folder, name)):
+            _write_atomic(os.path.join(dist_folder, name), data)
+
+        entry = {'file': name}
+        if os.path.splitext(relpath)[1].lower() in RESPONSIVE_FORMATS:
+            entry['widths'] = _responsive_variants(source, relpath, digest, dist_folder)
+        manifest[relpath] = entry
+
+    precompress(dist_folder, COMPRESSIBLE)
+    _write_atomic(os.path.join(dist_folder, MANIFEST_NAME), json.dumps(manifest, indent=2).encode())
+    prune(dist_folder, _build_files(manifest))
+    return manifest
+
+
+def _build_files(manifest):
+    files = set()
+    for entry in manifest.values():
+        files.add(entry['file'])
+        files.update(name for _, name in entry.get('widths', []))
+    return files
+
+
+def prune(dist_folder, current, keep=KEEP_BUILDS):
+    """Record this build's files and delete those no recent build references. Returns the deleted paths."""
+    history_path = os.path.join(dist_folder, HISTORY_NAME)
+    history = []
+    if os.path.exists(history_path):
+        with open(history_path) as f:
+            history = json.load(f)
+    if not history or set(history[-1]) != current:
+        history.append(sorted(current))
+    history = history[-keep:]
+    _write_atomic(history_path, json.dumps(history).encode())
+
+    referenced = set().union(*map(set, history))
+    deleted = []
+    for directory, _, names in os.walk(dist_folder):
+        for name in names:
+            relpath = os.path.relpath(os.path.join(directory, name), dist_folder).replace(os.sep, '/')
+            base = relpath[:-len('.gz')] if relpath.endswith('.gz') else \
+                relpath[:-len('.br')] if relpath.endswith('.br') else relpath
+            if base not in referenced and relpath not in (MANIFEST_NAME, HISTORY_NAME):
+                os.remove(os.path.join(directory, name))
+                deleted.append(relpath)
+    return deleted
+
+
+class AssetManifest:
+    def __init__(self, entries):
+        self.entries = entries
+
+    @classmethod
+    def load(cls, dist_folder=DIST_FOLDER):
+        path = os.path.join(dist_folder, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return cls({})
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def url(self, endpoint, **values):
+        """url_for, except that built static files resolve to their hashed copy."""
+        entry = self.entries.get(values.get('filename')) if endpoint == 'static' else None
+        if entry is None:
+            return url_for(endpoint, **values)
+        return url_for('assets', **dict(values, filename=entry['file']))
+
+    def srcset(self, filename):
+        """`srcset` value listing the WebP variants of an image ('' if there are none)."""
+        entry = self.entries.get(filename) or {}
+        return ', '.join(f"{url_for('assets', filename=name)} {width}w" for width, name in entry.get('widths', []))
+
+
+if __name__ == '__main__':
+    manifest = build()
+    variants = sum(len(entry.get('widths', [])) for entry in manifest.values())
+    print(f"✅ Built {len(manifest)} assets and {variants} image variants into {DIST_FOLDER}")
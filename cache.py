@@ -0,0 +1,121 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskBackedTTLCache(TTLCache):
+    """TTLCache that also keeps entries in a SQLite file so they survive restarts
+    and can be shared by every worker on the same host.
+
+    Values must be JSON-serialisable.
+    """
+
+    def __init__(self, path, maxsize=1024, ttl=60):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.path = path
+        self.disk_hits = 0
+        self._disk_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._disk_lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+
+    def get(self, key, default=None):
+        value = super().get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._disk_lock:
+            row = self._db.execute(
+                "SELECT value, expires FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return default
+
+        remaining = row[1] - time.time()
+        value = json.loads(row[0])
+        super().set(key, value, ttl=remaining)
+        with self._lock:
+            self.disk_hits += 1
+            self.misses -= 1
+            self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        super().set(key, value, ttl=ttl)
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._disk_lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires),
+            )
+
+    def delete(self, key):
+        super().delete(key)
+        with self._disk_lock, self._db:
+            self._db.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def clear(self):
+        super().clear()
+        with self._disk_lock, self._db:
+            self._db.execute("DELETE FROM cache_entries")
+
+    def purge_expired(self):
+        with self._disk_lock, self._db:
+            self._db.execute("DELETE FROM cache_entries WHERE expires < ?", (time.time(),))
+
+    def stats(self):
+        return dict(super().stats(), disk_hits=self.disk_hits)
@@ -1,29 +1,172 @@
-from models import ScheduleAppointment, User, engine
-from sqlalchemy.orm import sessionmaker
+import argparse
+import json
+import sys
+from datetime import datetime
+from sqlalchemy import select, func, or_, update, delete, bindparam
+from models import ScheduleAppointment, User, Message, ConversationSummary, engine
 
-Session = sessionmaker(bind=engine)
-session = Session()
+# Referential integrity audit.
+#
+# Every check is a single set-based query (an anti-join against users, or a
+# GROUP BY), so the cost doesn't grow with one lookup per row. The report lists
+# a count and a sample of offending ids per check:
+#
+#   python check_app.py                       human-readable summary
+#   python check_app.py --json report.json    also write the report as JSON ("-" for stdout)
+#   python check_app.py --repair              fix what can be fixed safely, in batches
+#   python check_app.py --repair --assign-patient 12
+#                                             also re-link orphaned appointments to user 12
+#
+# Repairs delete messages and conversation summaries that point at deleted
+# users, and re-link orphaned appointments only when --assign-patient is given.
+# Duplicate emails are only reported. The exit status is 1 if problems remain.
 
-def check_appointments():
-    print("Checking appointments for missing or invalid patients...\n")
+SAMPLE_SIZE = 20
+REPAIR_BATCH_SIZE = 1000
 
-    appointments = session.query(ScheduleAppointment).all()
-    problems_found = False
+appointments = ScheduleAppointment.__table__
+messages = Message.__table__
+summaries = ConversationSummary.__table__
+users = User.__table__
 
-    for appt in appointments:
-        if not appt.patient_id:
-            print(f"Appointment ID {appt.id} has NO patient_id linked (None or 0).")
-            problems_found = True
+
+def orphan_appointments_query():
+    patient = users.alias('patient')
+    return select(appointments.c.id).select_from(
+        appointments.outerjoin(patient, appointments.c.patient_id == patient.c.id)
+    ).where(patient.c.id.is_(None))
+
+
+def orphan_messages_query():
+    sender, receiver = users.alias('sender'), users.alias('receiver')
+    return select(messages.c.id).select_from(
+        messages.outerjoin(sender, messages.c.sender_id == sender.c.id)
+                .outerjoin(receiver, messages.c.receiver_id == receiver.c.id)
+    ).where(or_(sender.c.id.is_(None), receiver.c.id.is_(None)))
+
+
+def orphan_summaries_query():
+    owner, contact = users.alias('owner'), users.alias('contact')
+    return select(summaries.c.user_id, summaries.c.contact_id).select_from(
+        summaries.outerjoin(owner, summaries.c.user_id == owner.c.id)
+                 .outerjoin(contact, summaries.c.contact_id == contact.c.id)
+    ).where(or_(owner.c.id.is_(None), contact.c.id.is_(None)))
+
+
+def duplicate_emails_query():
+    email = func.lower(users.c.email)
+    return select(email.label('email')).group_by(email).having(func.count() > 1)
+
+
+CHECKS = {
+    'orphan_appointments': orphan_appointments_query,
+    'orphan_messages': orphan_messages_query,
+    'orphan_conversation_summaries': orphan_summaries_query,
+    'duplicate_emails': duplicate_emails_query,
+}
+
+
+def _sample_value(row):
+    return row[0] if len(row) == 1 else list(row)
+
+
+def run_checks(connection, sample_size=SAMPLE_SIZE):
+    """Run every check and return the report as a dict."""
+    report = {'checked_at': datetime.utcnow().isoformat(timespec='seconds'), 'checks': {}}
+    for name, build in CHECKS.items():
+        query = build()
+        count = connection.execute(select(func.count()).select_from(query.subquery())).scalar()
+        sample = [_sample_value(row) for row in connection.execute(query.limit(sample_size))] if count else []
+        report['checks'][name] = {'count': count, 'sample': sample}
+    report['ok'] = not any(check['count'] for check in report['checks'].values())
+    return report
+
+
+def _in_batches(bind, query, apply, batch_size):
+    fixed = 0
+    while True:
+        with bind.begin() as connection:
+            batch = connection.execute(query.limit(batch_size)).fetchall()
+            if not batch:
+                return fixed
+            apply(connection, batch)
+        fixed += len(batch)
+
+
+def reassign_appointments(bind, appointment_ids, patient_id):
+    """Link the given appointments to `patient_id` (what fix_appointment_patient.py used to do by hand)."""
+    with bind.begin() as connection:
+        if connection.execute(select(users.c.id).where(users.c.id == patient_id)).first() is None:
+            raise ValueError(f"User {patient_id} does not exist")
+        return connection.execute(
+            update(appointments).where(appointments.c.id.in_(appointment_ids)).values(patient_id=patient_id)
+        ).rowcount
+
+
+def repair(bind, assign_patient=None, batch_size=REPAIR_BATCH_SIZE):
+    """Fix what can be fixed safely, one batch per transaction. Returns rows fixed per check."""
+    if assign_patient is not None:
+        with bind.connect() as connection:
+            if connection.execute(select(users.c.id).where(users.c.id == assign_patient)).first() is None:
+                raise ValueError(f"User {assign_patient} does not exist")
+
+    fixed = {
+        'orphan_messages': _in_batches(
+            bind, orphan_messages_query(),
+            lambda conn, rows: conn.execute(delete(messages).where(messages.c.id.in_([r.id for r in rows]))),
+            batch_size),
+        'orphan_conversation_summaries': _in_batches(
+            bind, orphan_summaries_query(),
+            lambda conn, rows: conn.execute(
+                delete(summaries).where(summaries.c.user_id == bindparam('owner'),
+                                        summaries.c.contact_id == bindparam('contact')),
+                [{'owner': r.user_id, 'contact': r.contact_id} for r in rows]),
+            batch_size),
+    }
+    if assign_patient is not None:
+        fixed['orphan_appointments'] = _in_batches(
+            bind, orphan_appointments_query(),
+            lambda conn, rows: conn.execute(update(appointments).where(
+                appointments.c.id.in_([r.id for r in rows])).values(patient_id=assign_patient)),
+            batch_size)
+    return fixed
+
+
+def print_report(report):
+    for name, check in report['checks'].items():
+        if check['count']:
+            print(f"❌ {name}: {check['count']:,} (e.g. {', '.join(map(str, check['sample'][:5]))})")
         else:
-            # Check if patient_id exists in users table
-            user = session.query(User).filter_by(id=appt.patient_id).first()
-            if not user:
-                print(f"Appointment ID {appt.id} linked to NON-EXISTENT patient_id {appt.patient_id}.")
-                problems_found = True
+            print(f"✅ {name}: none")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check referential integrity of the telehealth database.")
+    parser.add_argument('--json', metavar='PATH', help='write the report as JSON ("-" for stdout)')
+    parser.add_argument('--repair', action='store_true', help='delete rows pointing at deleted users, in batches')
+    parser.add_argument('--assign-patient', type=int, metavar='USER_ID',
+                        help='with --repair, re-link orphaned appointments to this user')
+    parser.add_argument('--batch-size', type=int, default=REPAIR_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    fixed = repair(engine, args.assign_patient, args.batch_size) if args.repair else None
+    with engine.connect() as connection:
+        report = run_checks(connection)
+    if fixed is not None:
+        report['repaired'] = fixed
+
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+        if fixed is not None:
+            print(f"🔧 Repaired: {fixed}")
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+    return 0 if report['ok'] else 1
 
-    if not problems_found:
-        print("✅ All appointments have valid patient links!")
 
 if __name__ == "__main__":
-    check_appointments()
-    session.close()
+    sys.exit(main())
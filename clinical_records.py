@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import delete
+from models import ClinicalRecord, engine
+from appointments import paginate
+
+# Clinical records for the doctor and nurse patient pages.
+#
+# `python clinical_records.py [path]` loads a cleaned dataset (by default
+# data/clean/heart_clean.csv, written by scripts/ingest.py) into the
+# clinical_records table. The CSV is read in chunks and every chunk goes in as
+# one executemany INSERT; PyMySQL turns that into multi-row INSERT statements,
+# so a batch is a single round trip. Reloading the same source replaces its
+# rows, and the delete and every insert share one transaction, so a load that
+# fails partway leaves the previous rows in place. A patient_id column, if
+# present, links rows to users.
+
+CLEAN_PATH = os.path.join("data", "clean", "heart_clean.csv")
+LOAD_BATCH_SIZE = 5000
+RECORDS_PER_PAGE = 25
+
+# CSV column -> ClinicalRecord column
+COLUMNS = {
+    "age": "age",
+    "sex": "sex",
+    "anaemia": "anaemia",
+    "diabetes": "diabetes",
+    "high_blood_pressure": "high_blood_pressure",
+    "smoking": "smoking",
+    "creatinine_phosphokinase": "creatinine_phosphokinase",
+    "ejection_fraction": "ejection_fraction",
+    "platelets": "platelets",
+    "serum_creatinine": "serum_creatinine",
+    "serum_sodium": "serum_sodium",
+    "time": "follow_up_days",
+    "DEATH_EVENT": "death_event",
+}
+BOOLEAN_COLUMNS = ["anaemia", "diabetes", "high_blood_pressure", "smoking", "death_event"]
+
+
+def _records(chunk, source, first_row):
+    frame = chunk.rename(columns=COLUMNS)
+    frame[BOOLEAN_COLUMNS] = frame[BOOLEAN_COLUMNS].astype(bool)
+    frame["source"] = source
+    frame["source_row"] = range(first_row, first_row + len(frame))
+    frame["loaded_at"] = datetime.utcnow()
+    if "patient_id" in frame:
+        frame["patient_id"] = frame["patient_id"].astype(object).where(frame["patient_id"].notna(), None)
+    # to_dict gives numpy scalars; the DB-API drivers want plain Python values
+    return [{key: (value.item() if hasattr(value, "item") else value) for key, value in row.items()}
+            for row in frame.to_dict("records")]
+
+
+def load_clinical_records(path=CLEAN_PATH, source=None, batch_size=LOAD_BATCH_SIZE, bind=None):
+    """Replace the rows loaded from `source` (default: the file name) with the contents of `path`."""
+    bind = bind or engine
+    source = source or os.path.basename(path)
+    table = ClinicalRecord.__table__
+    usecols = lambda name: name in COLUMNS or name == "patient_id"
+    started = time.monotonic()
+    loaded = 0
+
+    with bind.begin() as connection:
+        connection.execute(delete(table).where(table.c.source == source))
+        for chunk in pd.read_csv(path, usecols=usecols, chunksize=batch_size):
+            records = _records(chunk, source, loaded)
+            connection.execute(table.insert(), records)
+            loaded += len(records)
+            print(f"⏳ {loaded:,} records loaded ({loaded / max(time.monotonic() - started, 1e-6):,.0f}/s)")
+
+    return loaded
+
+
+def clinical_records_page(db_session, patient_id=None, max_ejection_fraction=None, min_serum_creatinine=None,
+                          page=1, per_page=RECORDS_PER_PAGE):
+    """One page of records, most at-risk first.
+
+    Sorted by creatinine (highest first) when filtering on it, otherwise by
+    ejection fraction (lowest first), so each listing walks one index. One
+    patient's records come in load order.
+    """
+    query = db_session.query(ClinicalRecord)
+    if patient_id is not None:
+        query = query.filter(ClinicalRecord.patient_id == patient_id)
+    if max_ejection_fraction is not None:
+        query = query.filter(ClinicalRecord.ejection_fraction <= max_ejection_fraction)
+    if min_serum_creatinine is not None:
+        query = query.filter(ClinicalRecord.serum_creatinine >= min_serum_creatinine)
+
+    if patient_id is not None:
+        query = query.order_by(ClinicalRecord.patient_id, ClinicalRecord.id)
+    elif min_serum_creatinine is not None:
+        query = query.order_by(ClinicalRecord.serum_creatinine.desc(), ClinicalRecord.id.desc())
+    else:
+        query = query.order_by(ClinicalRecord.ejection_fraction.asc(), ClinicalRecord.id.asc())
+
+    return paginate(query, page, per_page)
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else CLEAN_PATH
+    if not os.path.exists(path):
+        print(f"❌ File not found: {path}")
+        sys.exit(1)
+    count = load_clinical_records(path)
+    print(f"✅ Loaded {count:,} clinical records from {path}")
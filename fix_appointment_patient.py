@@ -1,18 +1,26 @@
-from sqlalchemy.orm import sessionmaker
-from models import engine, ScheduleAppointment
+import sys
+from models import engine
+from check_app import reassign_appointments
 
-Session = sessionmaker(bind=engine)
-session = Session()
+# Re-link appointments to a patient:
+#   python fix_appointment_patient.py PATIENT_ID APPOINTMENT_ID [APPOINTMENT_ID ...]
+# To re-link every orphaned appointment at once use
+#   python check_app.py --repair --assign-patient PATIENT_ID
 
-appointment_id_to_fix = 1
-patient_id_to_set = 1  # set to a valid user id from your users table
+if len(sys.argv) < 3:
+    print("Usage: python fix_appointment_patient.py PATIENT_ID APPOINTMENT_ID [APPOINTMENT_ID ...]")
+    sys.exit(1)
 
-appointment = session.query(ScheduleAppointment).get(appointment_id_to_fix)
-if appointment:
-    appointment.patient_id = patient_id_to_set
-    session.commit()
-    print(f"✅ Appointment {appointment_id_to_fix} updated with patient_id={patient_id_to_set}")
-else:
-    print(f"❌ Appointment {appointment_id_to_fix} not found")
+patient_id_to_set = int(sys.argv[1])
+appointment_ids = [int(arg) for arg in sys.argv[2:]]
+
+try:
+    updated = reassign_appointments(engine, appointment_ids, patient_id_to_set)
+except ValueError as e:
+    print(f"❌ {e}")
+    sys.exit(1)
 
-session.close()
+if updated:
+    print(f"✅ {updated} appointment(s) updated with patient_id={patient_id_to_set}")
+else:
+    print(f"❌ Appointment(s) {', '.join(map(str, appointment_ids))} not found")
@@ -0,0 +1,147 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import sys
+import threading
+from flask import send_file, abort, url_for
+from werkzeug.utils import safe_join
+
+# Large static media: the 3D models behind model-viewer and the symptom
+# explainer videos.
+#
+# Files are served from /media/<path> with a strong ETag built from a hash of
+# their content. Pages link to them through media_url(), which adds that hash
+# as ?v=..., so a fingerprinted URL never changes meaning and is cached for a
+# year as immutable; a bare URL still revalidates. Range requests (video
+# seeking, resumed downloads) and If-None-Match / If-Range are handled by
+# send_file's conditional responses.
+#
+# `python media.py` writes pre-compressed .br/.gz siblings for formats that
+# compress well (glTF, JSON, SVG; not MP4). A sibling is served to clients
+# that accept the encoding, as long as it is newer than the original. Any
+# other variant, e.g. a smaller transcode of a video, is simply another file
+# with its own media_url().
+
+MEDIA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'assets')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE = {'.glb', '.gltf', '.bin', '.json', '.svg', '.obj', '.txt'}
+# Accept-Encoding token -> file suffix, in order of preference
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+HASH_CHUNK_SIZE = 1024 * 1024
+
+mimetypes.add_type('model/gltf-binary', '.glb')
+mimetypes.add_type('model/gltf+json', '.gltf')
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+class MediaLibrary:
+    def __init__(self, folder=MEDIA_FOLDER, compressible=COMPRESSIBLE, immutable=False):
+        self.folder = folder
+        self.compressible = compressible
+        # True when every file name already carries its content hash (assets.py output)
+        self.immutable = immutable
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+
+    def path(self, filename):
+        path = safe_join(self.folder, filename)
+        return path if path and os.path.isfile(path) else None
+
+    def fingerprint(self, filename):
+        """Content hash of a media file, recomputed only when its size or mtime changes."""
+        path = self.path(filename)
+        if path is None:
+            return None
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._fingerprints.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        digest = _file_digest(path)
+        with self._lock:
+            self._fingerprints[path] = (key, digest)
+        return digest
+
+    def url(self, filename):
+        """Fingerprinted URL for a media file (unversioned if the file is missing)."""
+        return url_for('media', filename=filename, v=self.fingerprint(filename))
+
+    def _variant(self, path, accept_encoding):
+        if os.path.splitext(path)[1].lower() not in self.compressible:
+            return path, None
+        mtime = os.path.getmtime(path)
+        for encoding, suffix in ENCODINGS:
+            if encoding in accept_encoding and os.path.isfile(path + suffix) \
+                    and os.path.getmtime(path + suffix) >= mtime:
+                return path + suffix, encoding
+        return path, None
+
+    def response(self, filename, request):
+        path = self.path(filename)
+        if path is None:
+            abort(404)
+        fingerprint = self.fingerprint(filename)
+        served, encoding = self._variant(path, request.headers.get('Accept-Encoding', ''))
+
+        response = send_file(served, mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream',
+                             conditional=True, etag=f"{fingerprint}-{encoding}" if encoding else fingerprint)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if os.path.splitext(path)[1].lower() in self.compressible:
+            response.vary.add('Accept-Encoding')
+        if self.immutable or request.args.get('v') == fingerprint:
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
+
+
+def precompress(folder=MEDIA_FOLDER, extensions=COMPRESSIBLE):
+    """Write .gz (and .br, when the brotli package is installed) next to compressible files.
+
+    Siblings newer than their file are left alone. Returns (path, size, compressed size) per file written.
+    """
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+    written = []
+    for directory, _, names in os.walk(folder):
+        for name in names:
+            path = os.path.join(directory, name)
+            if os.path.splitext(name)[1].lower() not in extensions:
+                continue
+            suffixes = ['.gz', '.br'] if brotli is not None else ['.gz']
+            if all(os.path.exists(path + suffix) and os.path.getmtime(path + suffix) >= os.path.getmtime(path)
+                   for suffix in suffixes):
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                variants['.br'] = brotli.compress(data)
+            for suffix, compressed in variants.items():
+                if len(compressed) >= len(data):
+                    continue
+                with open(path + suffix + '.tmp', 'wb') as f:
+                    f.write(compressed)
+                os.replace(path + suffix + '.tmp', path + suffix)
+                written.append((path + suffix, len(data), len(compressed)))
+    return written
+
+
+if __name__ == '__main__':
+    folder = sys.argv[1] if len(sys.argv) > 1 else MEDIA_FOLDER
+    for path, before, after in precompress(folder):
+        print(f"✅ {path}: {before / 1e6:.1f} MB → {after / 1e6:.1f} MB")
@@ -0,0 +1,201 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date as dt_date
+from datetime import datetime, timedelta
+from models import ScheduleAppointment, User, SQLASession
+
+# Google Meet links for appointments.
+#
+# Credentials are authorised once (`python meetings.py authorize`), stored in
+# GOOGLE_TOKEN_PATH and refreshed automatically afterwards. The Calendar client
+# isn't thread-safe (it wraps one httplib2 connection), so each thread builds
+# its own. Links for upcoming appointments are created ahead of time in batches
+# and saved on the appointment, so joining a call is a database lookup. Each
+# batch is committed as soon as Google answers, so a failure part-way keeps
+# the links already created. Prefetching runs as one job, never inside the
+# web workers, which would race each other and invite patients twice:
+# `python meetings.py prefetch` from cron, or `python meetings.py watch` as a
+# single long-running process (every MEET_PREFETCH_INTERVAL seconds).
+
+SCOPES = ['https://www.googleapis.com/auth/calendar.events']
+GOOGLE_TOKEN_PATH = os.getenv('GOOGLE_TOKEN_PATH', 'google_token.json')
+MEETING_TIMEZONE = os.getenv('MEETING_TIMEZONE', 'Africa/Casablanca')
+MEETING_LENGTH = timedelta(minutes=30)
+CALENDAR_BATCH_SIZE = 50  # Google's limit for one batch request
+MEET_PREFETCH_INTERVAL = int(os.getenv('MEET_PREFETCH_INTERVAL', 300))
+
+
+class MeetingError(Exception):
+    """Raised when a Meet link can't be created."""
+
+
+class GoogleCalendarBackend:
+    def __init__(self, token_path=GOOGLE_TOKEN_PATH):
+        self.token_path = token_path
+        self._creds = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _credentials(self):
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+
+        if self._creds is None:
+            if not os.path.exists(self.token_path):
+                raise MeetingError("Google Calendar is not authorised yet. Run `python meetings.py authorize` once.")
+            self._creds = Credentials.from_authorized_user_file(self.token_path, SCOPES)
+
+        if not self._creds.valid:
+            if not self._creds.refresh_token:
+                raise MeetingError("Stored Google credentials can't be refreshed. Run `python meetings.py authorize`.")
+            self._creds.refresh(Request())
+            self._save()
+        return self._creds
+
+    def _save(self):
+        tmp_path = f"{self.token_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self._creds.to_json())
+        os.replace(tmp_path, self.token_path)
+
+    @contextmanager
+    def _google_errors(self):
+        """Turn Google API and auth failures (HTTP errors, revoked tokens) into MeetingError."""
+        from googleapiclient.errors import HttpError
+        from google.auth.exceptions import GoogleAuthError
+
+        try:
+            yield
+        except (HttpError, GoogleAuthError) as e:
+            raise MeetingError(f"Google Calendar request failed: {e}")
+
+    def service(self):
+        from googleapiclient.discovery import build
+
+        with self._google_errors():
+            with self._lock:
+                creds = self._credentials()
+            if getattr(self._local, 'service', None) is None:
+                self._local.service = build('calendar', 'v3', credentials=creds, cache_discovery=False)
+            return self._local.service
+
+    def create_events(self, bodies):
+        """Insert events in batches. Returns one event dict (or None on failure) per body."""
+        service = self.service()
+        results = [None] * len(bodies)
+
+        for start in range(0, len(bodies), CALENDAR_BATCH_SIZE):
+            def store(request_id, response, exception):
+                if exception is None:
+                    results[int(request_id)] = response
+
+            batch = service.new_batch_http_request(callback=store)
+            for i, body in enumerate(bodies[start:start + CALENDAR_BATCH_SIZE], start):
+                batch.add(service.events().insert(calendarId='primary', body=body, conferenceDataVersion=1),
+                          request_id=str(i))
+            with self._google_errors():
+                batch.execute()
+        return results
+
+
+def authorize(token_path=GOOGLE_TOKEN_PATH):
+    """One-off interactive consent using the GOOGLE_CREDS_JSON client secrets."""
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
+    flow = InstalledAppFlow.from_client_config(json.loads(os.getenv('GOOGLE_CREDS_JSON')), SCOPES)
+    creds = flow.run_local_server(port=5002)
+    with open(token_path, 'w') as f:
+        f.write(creds.to_json())
+    return creds
+
+
+class MeetingService:
+    def __init__(self, backend):
+        self.backend = backend
+
+    @staticmethod
+    def event_body(appointment, email):
+        start = datetime.combine(appointment.date, appointment.time)
+        return {
+            'summary': f"Appointment: {appointment.appointment_type}",
+            'description': appointment.reason,
+            'start': {'dateTime': start.isoformat(), 'timeZone': MEETING_TIMEZONE},
+            'end': {'dateTime': (start + MEETING_LENGTH).isoformat(), 'timeZone': MEETING_TIMEZONE},
+            'attendees': [{'email': email}],
+            'conferenceData': {
+                'createRequest': {'requestId': f"appointment-{appointment.id}-{uuid.uuid4().hex[:8]}"}
+            },
+        }
+
+    def ensure_link(self, db_session, appointment, email):
+        """Return the appointment's Meet link, creating and saving it if needed."""
+        if appointment.meet_link:
+            return appointment.meet_link
+
+        event = self.backend.create_events([self.event_body(appointment, email)])[0]
+        if not event or not event.get('hangoutLink'):
+            raise MeetingError("Google Calendar did not return a Meet link.")
+        appointment.meet_link = event['hangoutLink']
+        db_session.commit()
+        return appointment.meet_link
+
+    def prefetch_upcoming(self, db_session, days=1, today=None):
+        """Create links for linked appointments in the next `days` days that don't have one."""
+        today = today or dt_date.today()
+        pending = db_session.query(ScheduleAppointment, User.email).join(
+            User, ScheduleAppointment.patient_id == User.id
+        ).filter(
+            ScheduleAppointment.meet_link.is_(None),
+            ScheduleAppointment.date >= today,
+            ScheduleAppointment.date <= today + timedelta(days=days),
+        ).order_by(ScheduleAppointment.date, ScheduleAppointment.time).all()
+        created = 0
+        for start in range(0, len(pending), CALENDAR_BATCH_SIZE):
+            chunk = pending[start:start + CALENDAR_BATCH_SIZE]
+            events = self.backend.create_events([self.event_body(appt, email) for appt, email in chunk])
+            for (appointment, _), event in zip(chunk, events):
+                if event and event.get('hangoutLink'):
+                    appointment.meet_link = event['hangoutLink']
+                    created += 1
+            # Those events exist now; keep their links even if a later batch fails
+            db_session.commit()
+        return created
+
+
+def run_prefetch_loop(service, interval=MEET_PREFETCH_INTERVAL, days=1, sleep=time.sleep):
+    """Keep links for the next `days` days filled in, every `interval` seconds.
+
+    Run it in exactly one process (`python meetings.py watch`). Pass a
+    cooperative `sleep` (e.g. socketio.sleep) under eventlet/gevent.
+    """
+    while True:
+        try:
+            with SQLASession() as db_session:
+                service.prefetch_upcoming(db_session, days=days)
+        except Exception as e:
+            print(f"❌ Meet link prefetch failed: {e}")
+        sleep(interval)
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'prefetch'
+    if command == 'authorize':
+        authorize()
+        print(f"✅ Google credentials saved to {GOOGLE_TOKEN_PATH}")
+    elif command == 'prefetch':
+        days = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+        with SQLASession() as db_session:
+            created = MeetingService(GoogleCalendarBackend()).prefetch_upcoming(db_session, days=days)
+        print(f"✅ Created {created} Meet links.")
+    elif command == 'watch':
+        interval = int(sys.argv[2]) if len(sys.argv) > 2 else MEET_PREFETCH_INTERVAL
+        days = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+        print(f"⏳ Prefetching Meet links every {interval}s. Run this in one process only.")
+        run_prefetch_loop(MeetingService(GoogleCalendarBackend()), interval, days=days)
+    else:
+        print("Usage: python meetings.py [authorize | prefetch [days] | watch [interval] [days]]")
@@ -0,0 +1,406 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime
+from sqlalchemy import and_, or_, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from models import Message, User, ConversationSummary
+
+# Conversation history helpers shared by the messaging pages and the chat API.
+# Threads are read newest-first through ix_messages_conversation, one direction
+# at a time, so a page costs the same whether the thread has 50 or 50k rows.
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+CURSOR_FORMAT = '%Y%m%d%H%M%S%f'
+SNIPPET_LENGTH = 120
+CLIENT_REF_LENGTH = 64
+
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(msg):
+    """Build an opaque "load older" cursor from the oldest message on a page."""
+    return f"{msg.timestamp.strftime(CURSOR_FORMAT)}-{msg.id}"
+
+
+def decode_cursor(cursor):
+    """Turn a cursor back into (timestamp, id). Raises ValueError if malformed."""
+    stamp, msg_id = cursor.split('-', 1)
+    return datetime.strptime(stamp, CURSOR_FORMAT), int(msg_id)
+
+
+def conversation_page(db_session, user_id, contact_id, before=None, limit=PAGE_SIZE):
+    """Return (messages, next_cursor) for one page of a conversation.
+
+    Messages are the newest `limit` ones older than `before`, ordered oldest
+    first so they can be rendered as-is. next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    older_than = decode_cursor(before) if before else None
+
+    rows = []
+    for sender_id, receiver_id in {(user_id, contact_id), (contact_id, user_id)}:
+        query = db_session.query(Message).filter(
+            Message.sender_id == sender_id,
+            Message.receiver_id == receiver_id,
+        )
+        if older_than:
+            stamp, msg_id = older_than
+            query = query.filter(or_(
+                Message.timestamp < stamp,
+                and_(Message.timestamp == stamp, Message.id < msg_id),
+            ))
+        rows.extend(
+            query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit + 1).all()
+        )
+
+    rows.sort(key=lambda m: (m.timestamp, m.id), reverse=True)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1]) if has_more else None
+    rows.reverse()
+    return rows, next_cursor
+
+
+def serialize_message(msg):
+    return {
+        'id': msg.id,
+        'sender_id': msg.sender_id,
+        'receiver_id': msg.receiver_id,
+        'content': msg.content,
+        'is_read': bool(msg.is_read),
+        'timestamp': msg.timestamp.strftime('%H:%M'),
+        'sent_at': msg.timestamp.isoformat(),
+    }
+
+
+# ==== conversation summaries ====
+# Each message touches two ConversationSummary rows: the sender's view of the
+# thread and the receiver's (which also gains an unread message). The sidebars
+# then read one row per contact instead of scanning every thread.
+
+def _update_summary(db_session, user_id, contact_id, values, unread):
+    return db_session.query(ConversationSummary).filter_by(
+        user_id=user_id, contact_id=contact_id
+    ).update(
+        dict(values, unread_count=ConversationSummary.unread_count + unread),
+        synchronize_session=False,
+    )
+
+
+def _touch_summary(db_session, user_id, contact_id, last, unread):
+    values = {
+        'last_message': last.content[:SNIPPET_LENGTH],
+        'last_sender_id': last.sender_id,
+        'last_timestamp': last.timestamp,
+    }
+    if _update_summary(db_session, user_id, contact_id, values, unread):
+        return
+    try:
+        # Savepoint, so losing the race below doesn't roll back the caller's transaction
+        with db_session.begin_nested():
+            db_session.add(ConversationSummary(
+                user_id=user_id, contact_id=contact_id, unread_count=unread, **values))
+    except IntegrityError:
+        # Another writer created the row between our UPDATE and INSERT
+        _update_summary(db_session, user_id, contact_id, values, unread)
+
+
+def record_messages(db_session, msgs):
+    """Update both sides' summaries for new messages, one write per thread side.
+
+    `msgs` only need sender_id, receiver_id, content and timestamp. The caller commits.
+    """
+    sides = {}
+    for msg in msgs:
+        if msg.timestamp is None:
+            msg.timestamp = datetime.utcnow()
+        for user_id, contact_id, unread in ((msg.sender_id, msg.receiver_id, 0),
+                                            (msg.receiver_id, msg.sender_id, 1)):
+            if user_id == contact_id and unread:
+                continue
+            last, count = sides.get((user_id, contact_id), (msg, 0))
+            if msg.timestamp >= last.timestamp:
+                last = msg
+            sides[(user_id, contact_id)] = (last, count + unread)
+
+    for (user_id, contact_id), (last, unread) in sides.items():
+        _touch_summary(db_session, user_id, contact_id, last, unread)
+
+
+def record_message(db_session, msg):
+    """Update both sides' summaries for a new message. The caller commits."""
+    record_messages(db_session, [msg])
+
+
+def mark_conversation_read(db_session, user_id, contact_id):
+    """Mark everything `contact_id` sent to `user_id` as read. Returns True if anything changed."""
+    summary = db_session.get(ConversationSummary, (user_id, contact_id))
+    if not summary or not summary.unread_count:
+        return False
+
+    db_session.query(Message).filter(
+        Message.sender_id == contact_id,
+        Message.receiver_id == user_id,
+        or_(Message.is_read.is_(False), Message.is_read.is_(None)),
+    ).update({'is_read': True}, synchronize_session=False)
+    summary.unread_count = 0
+    db_session.commit()
+    return True
+
+
+def contacts_with_summaries(db_session, user_id, contact_types):
+    """Return [(contact, summary or None)], most recent conversation first."""
+    return db_session.query(User, ConversationSummary).outerjoin(
+        ConversationSummary,
+        and_(ConversationSummary.user_id == user_id,
+             ConversationSummary.contact_id == User.id),
+    ).filter(
+        User.user_type.in_(contact_types)
+    ).order_by(
+        ConversationSummary.last_timestamp.is_(None),
+        ConversationSummary.last_timestamp.desc(),
+        User.first_name,
+    ).all()
+
+
+def rebuild_conversation_summaries(db_session):
+    """Recompute every summary from the messages table (backfill / repair)."""
+    db_session.query(ConversationSummary).delete(synchronize_session=False)
+
+    unread = dict(
+        ((receiver_id, sender_id), count)
+        for receiver_id, sender_id, count in db_session.query(
+            Message.receiver_id, Message.sender_id, func.count(Message.id)
+        ).filter(
+            or_(Message.is_read.is_(False), Message.is_read.is_(None))
+        ).group_by(Message.receiver_id, Message.sender_id)
+    )
+    latest_ids = [
+        row[0] for row in db_session.query(func.max(Message.id)).group_by(
+            Message.sender_id, Message.receiver_id)
+    ]
+
+    latest = db_session.query(Message).filter(Message.id.in_(latest_ids)).all() if latest_ids else []
+
+    newest = {}
+    for msg in latest:
+        for key in {(msg.sender_id, msg.receiver_id), (msg.receiver_id, msg.sender_id)}:
+            current = newest.get(key)
+            if not current or (msg.timestamp, msg.id) > (current.timestamp, current.id):
+                newest[key] = msg
+
+    summaries = [
+        ConversationSummary(
+            user_id=user_id,
+            contact_id=contact_id,
+            unread_count=unread.get((user_id, contact_id), 0),
+            last_message=msg.content[:SNIPPET_LENGTH],
+            last_sender_id=msg.sender_id,
+            last_timestamp=msg.timestamp,
+        )
+        for (user_id, contact_id), msg in newest.items()
+    ]
+
+    db_session.add_all(summaries)
+    db_session.commit()
+    return len(summaries)
+
+
+# ==== write-behind message persistence ====
+# Real-time messages are emitted as soon as they arrive and written to the
+# database by a background thread in batches: everything that arrives within
+# MESSAGE_FLUSH_INTERVAL seconds (up to MESSAGE_BATCH_SIZE messages) goes in
+# one transaction, summaries included. Rows go in through a single Core
+# executemany INSERT rather than the ORM unit of work, tagged with their
+# client_ref so their ids can be read back. Once a batch is
+# committed, on_persisted(pending, msg_id) is called for each message so
+# clients can learn the stored id. A batch that fails goes back to the front
+# of the queue, in order, and the writer waits RETRY_DELAY seconds, doubling
+# up to MAX_RETRY_DELAY, before trying again, so a database outage of about a
+# minute loses nothing. A message still unsaved after MAX_ATTEMPTS is given up
+# on and on_failed(pending) is called, so the sender can be told. Whatever is
+# still buffered at exit is flushed once, with failures reported the same way.
+
+class PendingMessage:
+    __slots__ = ('client_ref', 'sender_id', 'receiver_id', 'content', 'timestamp', 'attempts')
+
+    def __init__(self, sender_id, receiver_id, content, client_ref=None):
+        if not isinstance(client_ref, str) or not 0 < len(client_ref) <= CLIENT_REF_LENGTH:
+            client_ref = uuid.uuid4().hex
+        self.client_ref = client_ref
+        self.sender_id = sender_id
+        self.receiver_id = receiver_id
+        self.content = content
+        self.timestamp = datetime.utcnow()
+        self.attempts = 0
+
+
+class MessageWriter:
+    MAX_ATTEMPTS = 8
+    RETRY_DELAY = 0.5
+    MAX_RETRY_DELAY = 30
+
+    def __init__(self, session_factory, flush_interval=None, batch_size=None, on_persisted=None,
+                 on_failed=None):
+        self.session_factory = session_factory
+        self.flush_interval = float(os.getenv('MESSAGE_FLUSH_INTERVAL', 0.25)
+                                    if flush_interval is None else flush_interval)
+        self.batch_size = int(os.getenv('MESSAGE_BATCH_SIZE', 200) if batch_size is None else batch_size)
+        self.on_persisted = on_persisted
+        self.on_failed = on_failed
+        self._queue = queue.Queue()
+        self._write_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.stop)
+
+    def submit(self, sender_id, receiver_id, content, client_ref=None):
+        """Queue a message for writing and return its PendingMessage right away."""
+        pending = PendingMessage(sender_id, receiver_id, content, client_ref)
+        if self.flush_interval <= 0:
+            # Write-through mode: persist before returning, and let the caller see a failure
+            self._report_saved(self._save([pending]))
+            return pending
+        self._ensure_started()
+        self._queue.put(pending)
+        return pending
+
+    def _ensure_started(self):
+        # Threads don't survive a fork, so a forked worker starts its own
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='message-writer', daemon=True)
+            self._thread.start()
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def retry_delay(self, failures):
+        """Seconds to wait after `failures` failed writes in a row."""
+        return min(self.RETRY_DELAY * 2 ** (failures - 1), self.MAX_RETRY_DELAY)
+
+    def _run(self):
+        failures = 0
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            # Let the rest of this flush window fill the batch
+            self._stopping.wait(self.flush_interval)
+            if self._write([first] + self._drain(self.batch_size - 1)):
+                failures = 0
+            else:
+                failures += 1
+                self._stopping.wait(self.retry_delay(failures))
+
+    def flush(self):
+        """Write everything buffered so far, in the calling thread.
+
+        Each batch gets one attempt; messages that fail are reported through on_failed.
+        """
+        batch = self._drain(self.batch_size)
+        while batch:
+            self._write(batch, retry=False)
+            batch = self._drain(self.batch_size)
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _requeue(self, batch):
+        # Put a failed batch back ahead of anything that arrived since, keeping its order
+        with self._queue.mutex:
+            self._queue.queue.extendleft(reversed(batch))
+            self._queue.unfinished_tasks += len(batch)
+            self._queue.not_empty.notify()
+
+    def _insert(self, db_session, batch):
+        """INSERT the batch in one executemany and return the new ids, in batch order."""
+        db_session.execute(insert(Message), [
+            {'sender_id': p.sender_id, 'receiver_id': p.receiver_id, 'content': p.content,
+             'timestamp': p.timestamp, 'is_read': False, 'client_ref': p.client_ref}
+            for p in batch
+        ])
+        # The ids are looked up by (sender_id, client_ref). A ref the sender reused
+        # matches older rows too, so take the newest ones: this batch's, in insert order.
+        wanted = defaultdict(int)
+        for p in batch:
+            wanted[(p.sender_id, p.client_ref)] += 1
+        found = defaultdict(deque)
+        for msg_id, sender_id, client_ref in db_session.execute(
+            select(Message.id, Message.sender_id, Message.client_ref).where(
+                Message.sender_id.in_({sender_id for sender_id, _ in wanted}),
+                Message.client_ref.in_({client_ref for _, client_ref in wanted}),
+            ).order_by(Message.id)
+        ):
+            ids = found[(sender_id, client_ref)]
+            ids.append(msg_id)
+            if len(ids) > wanted[(sender_id, client_ref)]:
+                ids.popleft()
+        return [found[(p.sender_id, p.client_ref)].popleft() for p in batch]
+
+    def _save(self, batch):
+        """Write a batch and its summaries in one transaction. Returns [(pending, msg_id)]."""
+        with self._write_lock:
+            with self.session_factory() as db_session:
+                ids = self._insert(db_session, batch)
+                record_messages(db_session, batch)
+                db_session.commit()
+        return list(zip(batch, ids))
+
+    def _write(self, batch, retry=True):
+        """Save a batch, requeueing it on failure while it has attempts left. Returns True if saved."""
+        try:
+            saved = self._save(batch)
+        except Exception:
+            for p in batch:
+                p.attempts += 1
+            requeue = [p for p in batch if retry and p.attempts < self.MAX_ATTEMPTS]
+            dropped = [p for p in batch if not (retry and p.attempts < self.MAX_ATTEMPTS)]
+            logger.exception("Failed to save %d messages (%d dropped)", len(batch), len(dropped))
+            self._requeue(requeue)
+            self._report_failed(dropped)
+            return False
+        self._report_saved(saved)
+        return True
+
+    def _report_failed(self, dropped):
+        if self.on_failed:
+            for pending in dropped:
+                try:
+                    self.on_failed(pending)
+                except Exception:
+                    logger.exception("Error reporting failed message %s", pending.client_ref)
+
+    def _report_saved(self, saved):
+        if self.on_persisted:
+            for pending, msg_id in saved:
+                try:
+                    self.on_persisted(pending, msg_id)
+                except Exception:
+                    logger.exception("Error reporting saved message %s", msg_id)
+
+
+if __name__ == '__main__':
+    from models import SQLASession
+
+    with SQLASession() as db_session:
+        count = rebuild_conversation_summaries(db_session)
+    print(f"✅ Rebuilt {count} conversation summaries.")
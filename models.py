@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import Column, String, Integer, DateTime, create_engine, Date, Time, func, DATETIME, ForeignKey, Text, Boolean
+from sqlalchemy import Column, String, Integer, DateTime, create_engine, Date, Time, func, DATETIME, ForeignKey, Text, Boolean, Index, inspect, text, Float, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -35,6 +35,10 @@ class User(Base):
 # Schedulding appointements table
 class ScheduleAppointment(Base):
     __tablename__ = 'schedule_appointments'
+    __table_args__ = (
+        Index('ix_schedule_appointments_date_time', 'date', 'time'),
+        Index('ix_schedule_appointments_patient_date', 'patient_id', 'date', 'time'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     patient_id = Column(Integer, ForeignKey('users.id'))
@@ -43,6 +47,7 @@ class ScheduleAppointment(Base):
     date = Column(Date, nullable=False)
     time = Column(Time, nullable=False)
     reason = Column(String(700), nullable=False)
+    meet_link = Column(String(255))
     created_at = Column(DateTime, default=datetime.utcnow)
     patient = relationship("User", back_populates="appointments")
 
@@ -53,6 +58,12 @@ class ScheduleAppointment(Base):
 # Messages model
 class Message(Base):
     __tablename__ = 'messages'
+    __table_args__ = (
+        # Serves both directions of a conversation, newest first, for keyset paging
+        Index('ix_messages_conversation', 'sender_id', 'receiver_id', 'timestamp', 'id'),
+        # Lets the background writer find the ids of a batch it just inserted
+        Index('ix_messages_client_ref', 'sender_id', 'client_ref'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     sender_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -60,14 +71,148 @@ class Message(Base):
     content = Column(String(1000), nullable=False)
     is_read = Column(Boolean, default=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    client_ref = Column(String(64))  # the sending page's id for the message, see messaging.py
 
     def __repr__(self):
         return f"<Message(id={self.id}, from={self.sender_id}, to={self.receiver_id})>"
 
 
+# Per-(user, contact) thread summary that feeds the messaging sidebars
+class ConversationSummary(Base):
+    __tablename__ = 'conversation_summaries'
+    __table_args__ = (
+        Index('ix_conversation_summaries_recent', 'user_id', 'last_timestamp'),
+    )
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    contact_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    unread_count = Column(Integer, nullable=False, default=0)
+    last_message = Column(String(120))
+    last_sender_id = Column(Integer)
+    last_timestamp = Column(DateTime)
+
+    def __repr__(self):
+        return f"<ConversationSummary(user={self.user_id}, contact={self.contact_id}, unread={self.unread_count})>"
+
+
+# Clinical records (heart-failure follow-up data) loaded by clinical_records.py
+class ClinicalRecord(Base):
+    __tablename__ = 'clinical_records'
+    __table_args__ = (
+        Index('ix_clinical_records_patient', 'patient_id', 'id'),
+        Index('ix_clinical_records_ejection_fraction', 'ejection_fraction', 'id'),
+        Index('ix_clinical_records_serum_creatinine', 'serum_creatinine', 'id'),
+        # Lets a dataset be reloaded without duplicating rows
+        UniqueConstraint('source', 'source_row', name='uq_clinical_records_source_row'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    patient_id = Column(Integer, ForeignKey('users.id'))
+    source = Column(String(100), nullable=False)
+    source_row = Column(Integer, nullable=False)
+    age = Column(Float, nullable=False)
+    sex = Column(Integer, nullable=False)  # 1 = male, 0 = female
+    anaemia = Column(Boolean, nullable=False)
+    diabetes = Column(Boolean, nullable=False)
+    high_blood_pressure = Column(Boolean, nullable=False)
+    smoking = Column(Boolean, nullable=False)
+    creatinine_phosphokinase = Column(Integer, nullable=False)
+    ejection_fraction = Column(Integer, nullable=False)
+    platelets = Column(Float, nullable=False)
+    serum_creatinine = Column(Float, nullable=False)
+    serum_sodium = Column(Integer, nullable=False)
+    follow_up_days = Column(Integer, nullable=False)
+    death_event = Column(Boolean, nullable=False)
+    loaded_at = Column(DateTime, default=datetime.utcnow)
+    risk_score = Column(Float)  # written nightly by `python risk.py score`
+    risk_scored_at = Column(DateTime)
+
+    def __repr__(self):
+        return f"<ClinicalRecord(id={self.id}, patient={self.patient_id}, ef={self.ejection_fraction})>"
+
+
 # Engine and sessionmaker
-engine = create_engine(DATABASE_URL, echo=True)
+# Tuned through the environment:
+#   DB_ECHO            "true" logs every statement, "debug" also logs rows (default off)
+#   DB_POOL_SIZE       connections kept open per process (default 5)
+#   DB_MAX_OVERFLOW    extra connections allowed under burst (default 10)
+#   DB_POOL_TIMEOUT    seconds to wait for a free connection (default 30)
+#   DB_POOL_RECYCLE    seconds before a connection is replaced (default 1800)
+#   DB_POOL_PRE_PING   test connections before use (default on)
+#   DATABASE_REPLICA_URL  optional read replica for dashboard / messaging reads
+
+def _env_flag(name, default):
+    value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def make_engine(url):
+    """Build an engine for `url` from the DB_* environment settings."""
+    echo = os.getenv('DB_ECHO', '').strip().lower()
+    options = {
+        'echo': 'debug' if echo == 'debug' else _env_flag('DB_ECHO', False),
+        'pool_pre_ping': _env_flag('DB_POOL_PRE_PING', True),
+    }
+    # SQLite uses its own single-file pools that don't take sizing arguments
+    if not url.startswith('sqlite'):
+        options.update(
+            pool_size=int(os.getenv('DB_POOL_SIZE', 5)),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 10)),
+            pool_timeout=int(os.getenv('DB_POOL_TIMEOUT', 30)),
+            pool_recycle=int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        )
+    return create_engine(url, **options)
+
+
+engine = make_engine(DATABASE_URL)
 SQLASession = sessionmaker(bind=engine)
 
+# Read-only queries can go to a replica; without one they share the primary.
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+read_engine = make_engine(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else engine
+ReadSession = sessionmaker(bind=read_engine)
+
+
+def _reset_pools_after_fork():
+    # gunicorn forks workers after importing the app; each worker must open its
+    # own connections instead of sharing the sockets inherited from the master.
+    for bind in {engine, read_engine}:
+        bind.dispose(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+
+def ensure_indexes(bind):
+    """Create indexes declared on the models that are missing from existing tables."""
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind)
+
+
+def ensure_columns(bind):
+    """Add nullable columns declared on the models that are missing from existing tables."""
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=bind.dialect)
+                with bind.begin() as connection:
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+
 # Create tables
-Base.metadata.create_all(engine)
\ No newline at end of file
+Base.metadata.create_all(engine)
+ensure_columns(engine)
+ensure_indexes(engine)
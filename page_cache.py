@@ -0,0 +1,90 @@
+import hashlib
+import os
+from functools import wraps
+from flask import request, session, make_response
+from markupsafe import Markup
+from cache import TTLCache, DiskBackedTTLCache
+
+# Rendered-page cache for the public pages.
+#
+# @page_cache.cached stores the rendered body of GET requests from visitors
+# with an empty session (not logged in, no pending flash messages) and
+# replays it with an ETag, so browsers revalidate with If-None-Match and get a
+# 304. Logged-in visitors always get a fresh render.
+#
+# Inside templates, {% call cache_fragment('name') %}...{% endcall %} caches
+# a block that doesn't depend on the visitor for everyone, logged in or not.
+#
+# Every key starts with the deploy key: DEPLOY_ID when it is set, otherwise a
+# hash of the template files and the asset manifest. A deploy that changes
+# either starts from an empty cache without anything having to be flushed.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGE_CACHE_TTL = int(os.getenv('PAGE_CACHE_TTL', 300))
+PAGE_CACHE_SIZE = int(os.getenv('PAGE_CACHE_SIZE', 256))
+
+
+def deploy_key(folders=(os.path.join(BASE_DIR, 'templates'), os.path.join(BASE_DIR, 'static', 'dist'))):
+    if os.getenv('DEPLOY_ID'):
+        return os.getenv('DEPLOY_ID')
+    digest = hashlib.sha256()
+    for folder in folders:
+        for directory, dirs, names in os.walk(folder):
+            dirs.sort()
+            for name in sorted(names):
+                if folder.endswith('dist') and name != 'manifest.json':
+                    continue
+                stat = os.stat(os.path.join(directory, name))
+                digest.update(f"{os.path.join(directory, name)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:12]
+
+
+def make_page_store():
+    path = os.getenv('PAGE_CACHE_PATH')
+    if path:
+        return DiskBackedTTLCache(path, maxsize=PAGE_CACHE_SIZE, ttl=PAGE_CACHE_TTL)
+    return TTLCache(maxsize=PAGE_CACHE_SIZE, ttl=PAGE_CACHE_TTL)
+
+
+class PageCache:
+    def __init__(self, store=None, key=None):
+        self.store = store if store is not None else make_page_store()
+        self.key = key or deploy_key()
+
+    def _respond(self, entry):
+        body, mimetype, etag = entry
+        response = make_response(body)
+        response.mimetype = mimetype
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    def cached(self, view):
+        """Serve anonymous GETs of `view` from the cache, with ETag / 304 support."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or session:
+                return view(*args, **kwargs)
+            key = f"page:{self.key}:{request.full_path}"
+            entry = self.store.get(key)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed or session:
+                    return response
+                body = response.get_data(as_text=True)
+                entry = [body, response.mimetype, hashlib.sha256(body.encode()).hexdigest()[:20]]
+                self.store.set(key, entry)
+            return self._respond(entry)
+        return wrapper
+
+    def fragment(self, name, ttl=None, caller=None):
+        """Template global behind {% call cache_fragment(name) %}: the block's output, rendered once."""
+        key = f"fragment:{self.key}:{name}"
+        html = self.store.get(key)
+        if html is None:
+            html = str(caller())
+            self.store.set(key, html, ttl=ttl)
+        return Markup(html)
+
+    def clear(self):
+        self.store.clear()
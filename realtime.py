@@ -0,0 +1,295 @@
+import json
+import os
+import queue
+import threading
+import time
+import socketio
+
+# Pub/sub backend for the Socket.IO layer.
+#
+# With one process the default in-memory manager is enough. Once the app runs
+# behind several gunicorn workers or nodes, a client's room only exists in the
+# worker it is connected to, so every emit has to go through a shared message
+# queue. SOCKETIO_MESSAGE_QUEUE picks the backend:
+#
+#   (unset)              in-memory, single process
+#   redis://host:6379/0  Redis pub/sub (also kafka://, zmq+..., amqp:// via Kombu)
+#   local://<name>       in-process broker shared by every Socket.IO server in
+#                        this interpreter; stands in for a real broker in tests
+#
+# SOCKETIO_CHANNEL names the channel all workers share (default "telehealth").
+
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'telehealth')
+PRESENCE_URL = os.getenv('PRESENCE_URL')
+PRESENCE_TTL = int(os.getenv('PRESENCE_TTL', 90))
+
+
+class LocalBroker:
+    """Fan-out of serialised messages to every subscriber of a channel."""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        inbox = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(inbox)
+        return inbox
+
+    def unsubscribe(self, channel, inbox):
+        with self._lock:
+            if inbox in self._subscribers.get(channel, []):
+                self._subscribers[channel].remove(inbox)
+
+    def publish(self, channel, message):
+        with self._lock:
+            inboxes = list(self._subscribers.get(channel, []))
+        for inbox in inboxes:
+            inbox.put(message)
+
+
+local_broker = LocalBroker()
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """Socket.IO client manager backed by the in-process LocalBroker.
+
+    Messages are JSON-encoded on the way through, exactly as they would be on
+    Redis, so payloads that can't cross a real broker fail here too.
+    """
+    name = 'local'
+
+    def __init__(self, channel=SOCKETIO_CHANNEL, write_only=False, logger=None, broker=local_broker):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.broker = broker
+        self.inbox = None if write_only else broker.subscribe(channel)
+
+    def _publish(self, data):
+        self.broker.publish(self.channel, json.dumps(data))
+
+    def _listen(self):
+        while True:
+            yield self.inbox.get()
+
+
+def socketio_options(url=SOCKETIO_MESSAGE_QUEUE, channel=SOCKETIO_CHANNEL):
+    """Keyword arguments for SocketIO() that select the configured pub/sub backend."""
+    if not url:
+        return {}
+    if url.startswith('local://'):
+        return {'client_manager': LocalPubSubManager(channel=url[len('local://'):] or channel)}
+    return {'message_queue': url, 'channel': channel}
+
+
+# ==== ephemeral event throttling ====
+# Typing and presence events carry no history, so only the latest one per
+# conversation matters. The first event for a key is sent immediately and opens
+# a window; repeats inside the window are dropped if they carry the same
+# payload, otherwise the newest one is held and sent once the window closes.
+# Pass schedule=socketio_scheduler(socketio) in the app: the default
+# threading.Timer would emit from OS threads under eventlet/gevent.
+
+
+def socketio_scheduler(socketio):
+    """A `schedule(delay, fn)` for EventThrottle that runs `fn` as a Socket.IO background task."""
+    def schedule(delay, fn):
+        def later():
+            socketio.sleep(delay)
+            fn()
+        socketio.start_background_task(later)
+    return schedule
+
+class EventThrottle:
+    PRUNE_EVERY = 1000
+
+    def __init__(self, window, clock=time.monotonic, schedule=None):
+        self.window = window
+        self.clock = clock
+        self.schedule = schedule or self._timer
+        self._windows = {}  # key -> [closes_at, last_sent_payload, pending (payload, send) or None]
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self.emitted = self.coalesced = self.dropped = 0
+
+    @staticmethod
+    def _timer(delay, fn):
+        timer = threading.Timer(delay, fn)
+        timer.daemon = True
+        timer.start()
+
+    def submit(self, key, payload, send):
+        """Send `payload` through `send(payload)` now, later or not at all."""
+        now = self.clock()
+        with self._lock:
+            self._submitted += 1
+            if self._submitted % self.PRUNE_EVERY == 0:
+                self._prune(now)
+
+            state = self._windows.get(key)
+            if state is None or (now >= state[0] and state[2] is None):
+                self._windows[key] = [now + self.window, payload, None]
+                self.emitted += 1
+            elif state[2] is None and payload == state[1]:
+                self.dropped += 1
+                return
+            else:
+                if state[2] is None:
+                    self.schedule(max(state[0] - now, 0), lambda: self._close(key))
+                else:
+                    self.coalesced += 1
+                state[2] = (payload, send)
+                return
+        send(payload)
+
+    def _close(self, key):
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or state[2] is None:
+                return
+            payload, send = state[2]
+            self._windows[key] = [self.clock() + self.window, payload, None]
+            self.emitted += 1
+        send(payload)
+
+    def _prune(self, now):
+        expired = [key for key, state in self._windows.items() if now >= state[0] and state[2] is None]
+        for key in expired:
+            del self._windows[key]
+
+    def stats(self):
+        return {'emitted': self.emitted, 'coalesced': self.coalesced, 'dropped': self.dropped}
+
+
+# ==== presence ====
+# Which users have a live socket. Connections register on connect/join_room,
+# refresh themselves with a heartbeat event and are forgotten on disconnect or
+# once PRESENCE_TTL seconds pass without a heartbeat (a worker that died never
+# sends the disconnect). The in-memory registry only sees this process's
+# sockets; set PRESENCE_URL to a redis:// URL to share presence between
+# workers.
+
+class PresenceRegistry:
+    def __init__(self, ttl=PRESENCE_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._sockets = {}  # sid -> [user_id, expires_at]
+        self._users = {}    # user_id -> set of sids
+        self._lock = threading.Lock()
+
+    def connect(self, user_id, sid):
+        with self._lock:
+            previous = self._sockets.get(sid)
+            if previous and previous[0] != user_id:
+                self._forget(sid)
+            self._sockets[sid] = [user_id, self.clock() + self.ttl]
+            self._users.setdefault(user_id, set()).add(sid)
+
+    def heartbeat(self, sid):
+        with self._lock:
+            if sid in self._sockets:
+                self._sockets[sid][1] = self.clock() + self.ttl
+                return True
+            return False
+
+    def disconnect(self, sid):
+        """Forget a socket. Returns its user id, or None if it was never registered."""
+        with self._lock:
+            return self._forget(sid)
+
+    def _forget(self, sid):
+        entry = self._sockets.pop(sid, None)
+        if entry is None:
+            return None
+        sids = self._users.get(entry[0])
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del self._users[entry[0]]
+        return entry[0]
+
+    def is_online(self, user_id):
+        with self._lock:
+            now = self.clock()
+            for sid in list(self._users.get(user_id, ())):
+                if self._sockets[sid][1] > now:
+                    return True
+                self._forget(sid)
+            return False
+
+    def online(self, user_ids):
+        """The subset of `user_ids` with at least one live socket."""
+        return {user_id for user_id in user_ids if self.is_online(user_id)}
+
+    def expire(self):
+        """Drop sockets whose heartbeat ran out. Returns how many were dropped."""
+        with self._lock:
+            now = self.clock()
+            stale = [sid for sid, (_, expires_at) in self._sockets.items() if expires_at <= now]
+            for sid in stale:
+                self._forget(sid)
+            return len(stale)
+
+
+class RedisPresenceRegistry(PresenceRegistry):
+    """Presence shared through Redis: one sorted set of sid -> expiry per user."""
+
+    def __init__(self, url, ttl=PRESENCE_TTL, prefix='presence'):
+        import redis
+
+        super().__init__(ttl=ttl, clock=time.time)
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, user_id):
+        return f"{self.prefix}:{user_id}"
+
+    def _touch(self, user_id, sid):
+        expires_at = self.clock() + self.ttl
+        pipe = self.redis.pipeline()
+        pipe.zadd(self._key(user_id), {sid: expires_at})
+        pipe.expire(self._key(user_id), self.ttl)
+        pipe.execute()
+
+    def connect(self, user_id, sid):
+        super().connect(user_id, sid)
+        self._touch(user_id, sid)
+
+    def heartbeat(self, sid):
+        if not super().heartbeat(sid):
+            return False
+        self._touch(self._sockets[sid][0], sid)
+        return True
+
+    def disconnect(self, sid):
+        user_id = super().disconnect(sid)
+        if user_id is not None:
+            self.redis.zrem(self._key(user_id), sid)
+        return user_id
+
+    def is_online(self, user_id):
+        return self.redis.zcount(self._key(user_id), self.clock(), '+inf') > 0
+
+    def online(self, user_ids):
+        user_ids = list(user_ids)
+        now = self.clock()
+        pipe = self.redis.pipeline()
+        for user_id in user_ids:
+            pipe.zcount(self._key(user_id), now, '+inf')
+        return {user_id for user_id, live in zip(user_ids, pipe.execute()) if live}
+
+    def expire(self):
+        dropped = super().expire()
+        now = self.clock()
+        pipe = self.redis.pipeline()
+        for user_id in list(self._users):
+            pipe.zremrangebyscore(self._key(user_id), '-inf', now)
+        pipe.execute()
+        return dropped
+
+
+def make_presence(url=PRESENCE_URL, ttl=PRESENCE_TTL):
+    if url:
+        return RedisPresenceRegistry(url, ttl=ttl)
+    return PresenceRegistry(ttl=ttl)
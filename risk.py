@@ -0,0 +1,214 @@
+import json
+import math
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, update, bindparam
+
+# Heart-failure risk scores for clinical decision support.
+#
+# A logistic regression is fitted offline on data/clean/heart_clean.csv
+# (`python risk.py train`). The feature scaling is folded into the
+# coefficients, so scoring is one matrix-vector product and a sigmoid, and
+# the artifacts are plain .npy files that every process memory-maps once
+# (get_model()). `python risk.py score` is the nightly job: it walks the
+# clinical_records table in id order, scores each batch in one vectorised
+# call and writes risk_score back with one executemany UPDATE per batch.
+# Dashboards call score_record() for a single patient.
+#
+# Follow-up time is left out of the features on purpose: it is only known
+# after the outcome.
+
+CLEAN_PATH = os.path.join("data", "clean", "heart_clean.csv")
+RISK_MODEL_DIR = os.getenv("RISK_MODEL_DIR", os.path.join("data", "models", "risk"))
+SCORE_BATCH_SIZE = 50_000
+
+FEATURES = [
+    "age", "anaemia", "creatinine_phosphokinase", "diabetes", "ejection_fraction", "high_blood_pressure",
+    "platelets", "serum_creatinine", "serum_sodium", "sex", "smoking",
+]
+TARGET = "DEATH_EVENT"
+# Probability cut-offs for the bands shown to clinicians
+RISK_BANDS = [(0.6, "high"), (0.3, "moderate"), (0.0, "low")]
+
+
+class RiskModelMissing(Exception):
+    """Raised when no trained model artifacts are found."""
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -500, 500)))
+
+
+def _auc(y, scores):
+    order = np.argsort(scores, kind="mergesort")
+    ranks = np.empty(len(scores))
+    ranks[order] = np.arange(1, len(scores) + 1)
+    positives = y.sum()
+    negatives = len(y) - positives
+    if not positives or not negatives:
+        return None
+    return float((ranks[y == 1].sum() - positives * (positives + 1) / 2) / (positives * negatives))
+
+
+def fit_logistic(X, y, l2=1.0, iterations=50, tol=1e-8):
+    """Fit by Newton's method (IRLS) on standardised features.
+
+    Returns (coef, intercept) for the raw, unscaled features.
+    """
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    A = np.hstack([np.ones((len(X), 1)), (X - mean) / scale])
+    penalty = l2 * np.eye(A.shape[1])
+    penalty[0, 0] = 0.0  # don't shrink the intercept
+
+    w = np.zeros(A.shape[1])
+    for _ in range(iterations):
+        p = _sigmoid(A @ w)
+        hessian = A.T @ (A * (p * (1 - p))[:, None]) + penalty
+        gradient = A.T @ (p - y) + penalty @ w
+        step = np.linalg.solve(hessian, gradient)
+        w -= step
+        if np.abs(step).max() < tol:
+            break
+
+    coef = w[1:] / scale
+    return coef, float(w[0] - coef @ mean)
+
+
+def train(path=CLEAN_PATH, model_dir=RISK_MODEL_DIR, l2=1.0):
+    """Fit the model on a cleaned CSV and write the artifacts. Returns the metadata."""
+    data = pd.read_csv(path, usecols=FEATURES + [TARGET])
+    X = data[FEATURES].to_numpy(dtype=np.float64)
+    y = data[TARGET].to_numpy(dtype=np.float64)
+    coef, intercept = fit_logistic(X, y, l2=l2)
+
+    meta = {
+        "features": FEATURES,
+        "intercept": intercept,
+        "trained_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "rows": int(len(y)),
+        "training_auc": _auc(y, X @ coef + intercept),
+        "l2": l2,
+    }
+    os.makedirs(model_dir, exist_ok=True)
+    coef_path, meta_path = os.path.join(model_dir, "coef.npy"), os.path.join(model_dir, "meta.json")
+    with open(coef_path + ".tmp", "wb") as f:
+        np.save(f, coef)
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(coef_path + ".tmp", coef_path)
+    os.replace(meta_path + ".tmp", meta_path)
+    return meta
+
+
+class RiskModel:
+    def __init__(self, coef, intercept, features, meta=None):
+        self.coef = coef
+        self.intercept = intercept
+        self.features = features
+        self.meta = meta or {}
+        # Plain floats for the single-record path; cheaper than NumPy for one row
+        self._pairs = list(zip(features, (float(c) for c in coef)))
+
+    @classmethod
+    def load(cls, model_dir=RISK_MODEL_DIR):
+        coef_path = os.path.join(model_dir, "coef.npy")
+        if not os.path.exists(coef_path):
+            raise RiskModelMissing(f"No risk model in {model_dir}. Run `python risk.py train` first.")
+        with open(os.path.join(model_dir, "meta.json")) as f:
+            meta = json.load(f)
+        return cls(np.load(coef_path, mmap_mode="r"), meta["intercept"], meta["features"], meta)
+
+    def score_batch(self, X):
+        """Risk probabilities for an (n, len(features)) array, in one vectorised pass."""
+        return _sigmoid(np.asarray(X, dtype=np.float64) @ self.coef + self.intercept)
+
+    def score_frame(self, frame):
+        return self.score_batch(frame[self.features].to_numpy(dtype=np.float64))
+
+    def score_record(self, record):
+        """Risk probability for one record (a dict or an object with the feature attributes)."""
+        get = record.get if isinstance(record, dict) else lambda name: getattr(record, name)
+        z = self.intercept
+        for name, weight in self._pairs:
+            z += weight * float(get(name))
+        z = min(max(z, -500.0), 500.0)
+        return 1.0 / (1.0 + math.exp(-z))
+
+
+def risk_band(probability):
+    for cutoff, band in RISK_BANDS:
+        if probability >= cutoff:
+            return band
+    return RISK_BANDS[-1][1]
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model(model_dir=RISK_MODEL_DIR):
+    """The process-wide model, loaded (and memory-mapped) on first use."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = RiskModel.load(model_dir)
+    return _model
+
+
+def score_all_records(bind=None, model=None, batch_size=SCORE_BATCH_SIZE):
+    """Score every clinical record and store risk_score. Returns the number scored."""
+    from models import ClinicalRecord, engine
+
+    bind = bind or engine
+    model = model or get_model()
+    table = ClinicalRecord.__table__
+    columns = [table.c[name] for name in model.features]
+    writer = update(table).where(table.c.id == bindparam("record_id")).values(
+        risk_score=bindparam("score"), risk_scored_at=bindparam("scored_at"))
+
+    last_id, scored, started = 0, 0, time.monotonic()
+    while True:
+        with bind.connect() as connection:
+            rows = connection.execute(
+                select(table.c.id, *columns).where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)
+            ).all()
+        if not rows:
+            return scored
+
+        values = np.array(rows, dtype=np.float64)
+        scores = model.score_batch(values[:, 1:])
+        now = datetime.utcnow()
+        with bind.begin() as connection:
+            connection.execute(writer, [
+                {"record_id": int(record_id), "score": float(score), "scored_at": now}
+                for record_id, score in zip(values[:, 0], scores)
+            ])
+        last_id = rows[-1][0]
+        scored += len(rows)
+        print(f"⏳ {scored:,} records scored ({scored / max(time.monotonic() - started, 1e-6):,.0f}/s)")
+
+
+def training_summary(meta):
+    # No AUC when the training data holds only one outcome
+    auc = meta['training_auc']
+    auc_text = f"training AUC {auc:.3f}" if auc is not None else "no training AUC: only one outcome in the data"
+    return f"Risk model trained on {meta['rows']:,} rows ({auc_text}), saved to {RISK_MODEL_DIR}"
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "score"
+    if command == "train":
+        meta = train(sys.argv[2] if len(sys.argv) > 2 else CLEAN_PATH)
+        print(f"✅ {training_summary(meta)}")
+    elif command == "score":
+        print(f"✅ Scored {score_all_records():,} clinical records.")
+    else:
+        print("Usage: python risk.py [train [path] | score]")
@@ -1,41 +1,332 @@
 import os
+import json
+import shutil
+import hashlib
+import argparse
+from datetime import datetime
+import numpy as np
 import pandas as pd
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Clean the heart-failure clinical records for the app.
+#
+# The raw CSV is read in chunks of CHUNK_SIZE rows, so memory depends on the
+# chunk size and not on the file. Every chunk is checked against SCHEMA in a
+# few vectorised passes: values must parse as numbers, fall inside the allowed
+# range and be whole numbers for integer columns. Failing rows go to the
+# rejects file with the reason, the rest are appended to the clean CSV and to
+# a Parquet dataset (pyarrow; skipped with a note if it isn't installed).
+#
+# Runs are incremental. MANIFEST_PATH records, per source file, its SHA-256,
+# size, row counts, header and schema fingerprint, plus the size of each output
+# (and of each Parquet part file) after the run. Next time:
+#   - same hash                      -> nothing to do
+#   - old content is a prefix of new -> only the appended bytes are processed
+#     and appended to the outputs (a new Parquet part file for the delta)
+#   - anything else, or --full       -> full rebuild
+# Full rebuilds write to temporary files that replace the outputs at the end,
+# and the manifest itself is replaced atomically last. Outputs that grew past
+# their recorded size (an append interrupted mid-way) are cut back first, and
+# Parquet parts the manifest doesn't know about are removed.
+
 # Define paths
 RAW_PATH = "data/raw/heart_failure_clinical_records_dataset.csv"
 CLEAN_DIR = "data/clean"
 CLEAN_PATH = os.path.join(CLEAN_DIR, "heart_clean.csv")
+PARQUET_PATH = os.path.join(CLEAN_DIR, "heart_clean.parquet")  # directory of part files
+REJECTS_PATH = os.path.join(CLEAN_DIR, "heart_rejects.csv")
+MANIFEST_PATH = os.path.join(CLEAN_DIR, "ingest_manifest.json")
+CHUNK_SIZE = 100_000
+HASH_BLOCK_SIZE = 1 << 20
+
+# column -> (dtype, minimum, maximum); None leaves that side open, up to what
+# the dtype can hold for integer columns
+SCHEMA = {
+    "age": ("float64", 0, 120),
+    "anaemia": ("int8", 0, 1),
+    "creatinine_phosphokinase": ("int32", 0, None),
+    "diabetes": ("int8", 0, 1),
+    "ejection_fraction": ("int16", 0, 100),
+    "high_blood_pressure": ("int8", 0, 1),
+    "platelets": ("float64", 0, None),
+    "serum_creatinine": ("float64", 0, None),
+    "serum_sodium": ("int16", 0, None),
+    "sex": ("int8", 0, 1),
+    "smoking": ("int8", 0, 1),
+    "time": ("int16", 0, None),
+    "DEATH_EVENT": ("int8", 0, 1),
+}
+
+
+class SchemaError(Exception):
+    """Raised when the input file is missing columns listed in SCHEMA."""
+
+
+def read_header(path):
+    header = list(pd.read_csv(path, nrows=0).columns)
+    missing = [col for col in SCHEMA if col not in header]
+    if missing:
+        raise SchemaError(f"{path} is missing columns: {', '.join(missing)}")
+    return header
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE, offset=0):
+    """Yield raw chunks with every schema column as text, so bad values can be reported as-is.
+
+    With an offset, reading starts at that byte (the start of an appended row)
+    and the header is taken from the top of the file.
+    """
+    header = read_header(path)
+    if not offset:
+        yield from pd.read_csv(path, usecols=list(SCHEMA), dtype=str, chunksize=chunk_size)
+        return
+    with open(path, "rb") as f:
+        f.seek(offset)
+        yield from pd.read_csv(f, names=header, header=None, usecols=list(SCHEMA), dtype=str,
+                               chunksize=chunk_size)
+
+
+def _bounds(dtype, low, high):
+    """(low, high) for a column, with integer columns kept inside what their dtype can hold."""
+    if not dtype.startswith("int"):
+        return low, high
+    info = np.iinfo(dtype)
+    return (info.min if low is None else max(low, info.min),
+            info.max if high is None else min(high, info.max))
+
+
+def validate_chunk(raw):
+    """Split a raw chunk into (clean typed frame, rejected rows with a reject_reason column)."""
+    values = raw.apply(pd.to_numeric, errors="coerce")
+    reason = pd.Series(np.nan, index=raw.index, dtype=object)
+
+    for col, (dtype, low, high) in SCHEMA.items():
+        low, high = _bounds(dtype, low, high)
+        column = values[col]
+        bad = column.isna() & reason.isna()
+        reason[bad] = np.where(raw[col][bad].isna(), f"{col}: missing", f"{col}: not a number")
+
+        out_of_range = column.notna() & ~np.isfinite(column)
+        if low is not None:
+            out_of_range |= column < low
+        if high is not None:
+            out_of_range |= column > high
+        if dtype.startswith("int"):
+            out_of_range |= column.notna() & (column != np.floor(column))
+        reason[out_of_range & reason.isna()] = f"{col}: out of range"
+
+    rejected = reason.notna()
+    clean = values[~rejected].astype({col: dtype for col, (dtype, _, _) in SCHEMA.items()})
+    return clean, raw[rejected].assign(reject_reason=reason[rejected])
+
+
+class ParquetSink:
+    """Writes chunks to one Parquet part file, moved into place on close()."""
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
 
-def load_data(path):
-    print("📥 Loading data...")
-    return pd.read_csv(path)
+    def write(self, df):
+        if df.empty:
+            return
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.writer = pq.ParquetWriter(self.path + ".tmp", table.schema)
+        self.writer.write_table(table)
 
-def clean_data(df):
-    print("🧹 Cleaning data...")
-    # Drop rows with missing values
-    df_clean = df.dropna()
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            os.replace(self.path + ".tmp", self.path)
 
-    # Optionally validate numeric columns
-    numeric_cols = df_clean.select_dtypes(include=["number"]).columns
-    for col in numeric_cols:
-        df_clean[col] = pd.to_numeric(df_clean[col], errors="coerce")
 
-    return df_clean
+# ==== manifest ====
+
+def schema_fingerprint():
+    return hashlib.sha256(json.dumps(SCHEMA, sort_keys=True).encode()).hexdigest()
+
+
+def file_digests(path, prefix_size=None):
+    """SHA-256 of the whole file and, in the same pass, of its first prefix_size bytes."""
+    full, prefix, done = hashlib.sha256(), None, 0
+    with open(path, "rb") as f:
+        while True:
+            if prefix_size is not None and prefix is None and done == prefix_size:
+                prefix = full.hexdigest()
+            limit = HASH_BLOCK_SIZE
+            if prefix_size is not None and done < prefix_size:
+                limit = min(limit, prefix_size - done)
+            block = f.read(limit)
+            if not block:
+                return full.hexdigest(), prefix
+            full.update(block)
+            done += len(block)
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {"sources": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _parquet_parts(parquet_dir):
+    """{part file name: size} for a Parquet dataset directory."""
+    if not parquet_dir or not os.path.isdir(parquet_dir):
+        return {}
+    return {name: os.path.getsize(os.path.join(parquet_dir, name))
+            for name in sorted(os.listdir(parquet_dir)) if name.endswith(".parquet")}
+
+
+def outputs_intact(entry):
+    """True if every recorded output still holds at least what the manifest says;
+    anything written after that (an interrupted append) is truncated or removed."""
+    for output in entry["outputs"].values():
+        if "parts" in output:
+            if any(_parquet_parts(output["path"]).get(name) != size for name, size in output["parts"].items()):
+                return False
+        elif not os.path.exists(output["path"]) or os.path.getsize(output["path"]) < output["size"]:
+            return False
+    for output in entry["outputs"].values():
+        if "parts" in output:
+            for name in set(_parquet_parts(output["path"])) - set(output["parts"]):
+                os.remove(os.path.join(output["path"], name))
+        elif os.path.getsize(output["path"]) > output["size"]:
+            os.truncate(output["path"], output["size"])
+    return True
+
+
+def _process(raw_path, clean_file, rejects_file, parquet, chunk_size, offset, header):
+    stats = {"clean": 0, "rejected": 0}
+    for number, raw in enumerate(read_chunks(raw_path, chunk_size, offset)):
+        clean, rejected = validate_chunk(raw)
+        clean.to_csv(clean_file, index=False, header=header and number == 0)
+        rejected.to_csv(rejects_file, index=False, header=header and number == 0)
+        if parquet:
+            parquet.write(clean)
+        stats["clean"] += len(clean)
+        stats["rejected"] += len(rejected)
+        print(f"⏳ Chunk {number + 1}: {stats['clean']:,} clean, {stats['rejected']:,} rejected")
+    if parquet:
+        parquet.close()
+    return stats
+
+
+def ingest(raw_path=RAW_PATH, clean_path=CLEAN_PATH, rejects_path=REJECTS_PATH,
+           parquet_path=PARQUET_PATH, chunk_size=CHUNK_SIZE, manifest_path=MANIFEST_PATH, full=False):
+    """Bring the clean/rejects (and Parquet) outputs up to date with raw_path.
+
+    Returns {"mode": "unchanged" | "append" | "full", "clean": n, "rejected": n}
+    where the counts cover the rows processed by this run.
+    """
+    os.makedirs(os.path.dirname(clean_path) or ".", exist_ok=True)
+    header = read_header(raw_path)
+    manifest = load_manifest(manifest_path) if manifest_path else {"sources": {}}
+    entry = manifest["sources"].get(raw_path)
+    size = os.path.getsize(raw_path)
+    if parquet_path and pq is None:
+        print("ℹ️  pyarrow is not installed, skipping the Parquet output.")
+        parquet_path = None
+
+    mode = "full"
+    if entry and not full and entry["schema"] == schema_fingerprint() and entry["columns"] == header \
+            and entry["outputs"]["clean"]["path"] == clean_path \
+            and (entry["outputs"].get("parquet") or {}).get("path") == parquet_path and outputs_intact(entry):
+        digest, previous = file_digests(raw_path, entry["size"] if size >= entry["size"] else None)
+        if digest == entry["sha256"]:
+            print(f"✅ {raw_path} is unchanged since {entry['ingested_at']}, nothing to do.")
+            return {"mode": "unchanged", "clean": 0, "rejected": 0}
+        if previous == entry["sha256"]:
+            mode = "append"
+    else:
+        digest, _ = file_digests(raw_path)
+
+    if mode == "append":
+        print(f"➕ Processing {size - entry['size']:,} appended bytes of {raw_path}")
+        parts = len(_parquet_parts(parquet_path))
+        parquet = ParquetSink(os.path.join(parquet_path, f"part-{parts:05d}.parquet")) if parquet_path else None
+        with open(clean_path, "a", newline="") as clean_file, open(rejects_path, "a", newline="") as rejects_file:
+            stats = _process(raw_path, clean_file, rejects_file, parquet, chunk_size, entry["size"], header=False)
+        totals = {"rows": entry["rows"] + stats["clean"] + stats["rejected"],
+                  "clean": entry["clean"] + stats["clean"], "rejected": entry["rejected"] + stats["rejected"]}
+    else:
+        staged_parquet = f"{parquet_path}.tmp" if parquet_path else None
+        if staged_parquet:
+            shutil.rmtree(staged_parquet, ignore_errors=True)
+        parquet = ParquetSink(os.path.join(staged_parquet, "part-00000.parquet")) if parquet_path else None
+        with open(clean_path + ".tmp", "w", newline="") as clean_file, \
+                open(rejects_path + ".tmp", "w", newline="") as rejects_file:
+            stats = _process(raw_path, clean_file, rejects_file, parquet, chunk_size, 0, header=True)
+        os.replace(clean_path + ".tmp", clean_path)
+        os.replace(rejects_path + ".tmp", rejects_path)
+        if staged_parquet:
+            os.makedirs(staged_parquet, exist_ok=True)  # no part file if every row was rejected
+            if os.path.isdir(parquet_path):
+                shutil.rmtree(parquet_path)
+            elif os.path.exists(parquet_path):
+                os.remove(parquet_path)
+            os.replace(staged_parquet, parquet_path)
+        totals = {"rows": stats["clean"] + stats["rejected"], "clean": stats["clean"], "rejected": stats["rejected"]}
+
+    if manifest_path:
+        outputs = {
+            "clean": {"path": clean_path, "size": os.path.getsize(clean_path)},
+            "rejects": {"path": rejects_path, "size": os.path.getsize(rejects_path)},
+        }
+        if parquet_path:
+            outputs["parquet"] = {"path": parquet_path, "parts": _parquet_parts(parquet_path)}
+        manifest["sources"][raw_path] = dict(
+            totals,
+            sha256=digest,
+            size=size,
+            columns=header,
+            schema=schema_fingerprint(),
+            ingested_at=datetime.utcnow().isoformat(timespec="seconds"),
+            outputs=outputs,
+        )
+        save_manifest(manifest, manifest_path)
+    return dict(stats, mode=mode)
 
-def save_data(df, path):
-    print("💾 Saving cleaned data...")
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    df.to_csv(path, index=False)
-    print(f"✅ Cleaned data saved to: {path}")
 
 def main():
-    if not os.path.exists(RAW_PATH):
-        print(f"❌ Raw file not found at: {RAW_PATH}")
+    parser = argparse.ArgumentParser(description="Clean the heart-failure clinical records.")
+    parser.add_argument("--input", default=RAW_PATH)
+    parser.add_argument("--output", default=CLEAN_PATH)
+    parser.add_argument("--rejects", default=REJECTS_PATH)
+    parser.add_argument("--parquet", default=PARQUET_PATH, help="Parquet dataset directory ('' to skip)")
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and rebuild everything")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"❌ Raw file not found at: {args.input}")
         return
 
-    df = load_data(RAW_PATH)
-    df_clean = clean_data(df)
-    save_data(df_clean, CLEAN_PATH)
+    print("📥 Streaming data...")
+    try:
+        stats = ingest(args.input, args.output, args.rejects, args.parquet, args.chunk_size,
+                       args.manifest, args.full)
+    except SchemaError as e:
+        print(f"❌ {e}")
+        return
+    if stats["mode"] != "unchanged":
+        print(f"✅ Cleaned data saved to: {args.output} ({stats['mode']} run: {stats['clean']:,} rows, "
+              f"{stats['rejected']:,} rejected into {args.rejects})")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -88,17 +88,49 @@ document.addEventListener("DOMContentLoaded", function () {
       responseBox.textContent = "Thinking...";
 
       try {
-        const res = await fetch("/api/ask", {
+        const res = await fetch("/api/ask/stream", {
           method: "POST",
           headers: {
             "Content-Type": "application/json"
           },
           body: JSON.stringify({ prompt: prompt })
         });
+        if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+        // Read the Server-Sent Events stream and show the answer as it arrives
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        let answer = "";
+        let failed = false;
+        let finished = false;
+
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+
+          const frames = buffer.split("\n\n");
+          buffer = frames.pop();
+          for (const frame of frames) {
+            const event = (frame.match(/^event: (.*)$/m) || [])[1];
+            const data = (frame.match(/^data: (.*)$/m) || [])[1];
+            if (event === "error") failed = true;
+            if (event === "done") {
+              // The server's final, cleaned-up answer replaces the raw tokens
+              finished = true;
+              answer = JSON.parse(data).response;
+            }
+            if (!event && data) {
+              answer += JSON.parse(data).token || "";
+              responseBox.textContent = answer;
+            }
+          }
+        }
 
-        const data = await res.json();
-        console.log(data);
-        responseBox.innerHTML = formatResponse(data.response || "Sorry, no response received.");
+        // A stream that stops without a "done" event was cut off; don't show it as a full answer
+        if (failed || !finished) throw new Error("AI provider error");
+        responseBox.innerHTML = formatResponse(answer);
       } catch (err) {
         console.error("Error:", err);
         responseBox.textContent = "There was an error connecting to the AI.";
@@ -211,12 +243,16 @@ document.addEventListener("DOMContentLoaded", () => {
   // Join own room so server can send you messages
   socket.emit('join_room', { user_id: currentUserId });
 
+  // Keep our presence alive while the page is open
+  setInterval(() => socket.emit('heartbeat'), 30000);
+
   // Append message to chat area
   function appendMessage(data) {
     const isMe = data.sender_id == currentUserId;
     const div = document.createElement("div");
     div.className = `msg-bubble ${isMe ? 'right' : 'left'}`;
     div.innerHTML = `<p>${data.content}</p><span class="msg-time">${data.timestamp}</span>`;
+    if (data.client_ref) div.dataset.clientRef = data.client_ref;
     messagesContainer.appendChild(div);
     messagesContainer.scrollTop = messagesContainer.scrollHeight;
   }
@@ -227,13 +263,15 @@ document.addEventListener("DOMContentLoaded", () => {
     const message = messageInput.value.trim();
     if (!message) return;
 
+    const clientRef = `${currentUserId}-${Date.now()}-${Math.random().toString(36).slice(2, 8)}`;
     socket.emit('send_message', {
       sender_id: currentUserId,
       receiver_id: contactId,
-      content: message
+      content: message,
+      client_ref: clientRef
     });
 
-    appendMessage({ sender_id: currentUserId, content: message, timestamp: new Date().toLocaleTimeString() });
+    appendMessage({ sender_id: currentUserId, content: message, timestamp: new Date().toLocaleTimeString(), client_ref: clientRef });
     messageInput.value = '';
   });
 
@@ -249,6 +287,77 @@ document.addEventListener("DOMContentLoaded", () => {
     // Only show messages from your current chat contact
     if (data.sender_id == contactId && data.receiver_id == currentUserId) {
       appendMessage(data);
+    } else if (data.sender_id == currentUserId && data.client_ref) {
+      // Our own message echoed back: show the server's timestamp
+      const mine = messagesContainer.querySelector(`[data-client-ref="${data.client_ref}"] .msg-time`);
+      if (mine) mine.textContent = data.timestamp;
+    }
+  });
+
+  // Messages are saved in the background; record the stored id once they are
+  socket.on('message_saved', (data) => {
+    const bubble = messagesContainer.querySelector(`[data-client-ref="${data.client_ref}"]`);
+    if (bubble) bubble.dataset.messageId = data.id;
+  });
+
+  // The server couldn't save a message; flag it instead of leaving it looking sent
+  socket.on('message_failed', (data) => {
+    const bubble = messagesContainer.querySelector(`[data-client-ref="${data.client_ref}"]`);
+    if (!bubble) return;
+    bubble.classList.add('failed');
+    bubble.title = bubble.classList.contains('right')
+      ? 'Not delivered. Please send it again.'
+      : 'This message could not be saved.';
+  });
+});
+
+
+//load older messages
+document.addEventListener("DOMContentLoaded", () => {
+  const container = document.querySelector("[data-next-cursor]");
+  const loadOlderButton = document.getElementById("loadOlderButton");
+  const contactInput = document.getElementById("contact-id");
+  const currentUserInput = document.getElementById("current-user-id");
+  if (!container || !loadOlderButton || !contactInput || !currentUserInput) return;
+
+  const contactId = contactInput.value;
+  const currentUserId = currentUserInput.value;
+
+  function buildBubble(data) {
+    const div = document.createElement("div");
+    div.className = `msg-bubble ${data.sender_id == currentUserId ? 'right' : 'left'}`;
+    const text = document.createElement("p");
+    text.textContent = data.content;
+    const time = document.createElement("span");
+    time.className = "msg-time";
+    time.textContent = data.timestamp;
+    div.append(text, time);
+    return div;
+  }
+
+  loadOlderButton.addEventListener("click", async () => {
+    const cursor = container.dataset.nextCursor;
+    if (!cursor) return;
+
+    loadOlderButton.disabled = true;
+    try {
+      const res = await fetch(`/api/messages/${contactId}?before=${encodeURIComponent(cursor)}`);
+      const data = await res.json();
+      if (!res.ok) throw new Error(data.error || "Failed to load messages");
+
+      // keep the current view still while older bubbles are added above it
+      const previousHeight = container.scrollHeight;
+      const fragment = document.createDocumentFragment();
+      data.messages.forEach(msg => fragment.appendChild(buildBubble(msg)));
+      loadOlderButton.after(fragment);
+      container.scrollTop += container.scrollHeight - previousHeight;
+
+      container.dataset.nextCursor = data.next_cursor || "";
+      if (!data.next_cursor) loadOlderButton.style.display = "none";
+    } catch (err) {
+      console.error("Error:", err);
+    } finally {
+      loadOlderButton.disabled = false;
     }
   });
 });
@@ -0,0 +1,81 @@
+import json
+import os
+import re
+
+# Maps symptoms in a free-text question to one of the explainer videos under
+# static/assets/videos. The mapping lives in data/symptom_videos.json (or the
+# file named by SYMPTOM_VIDEO_MAP): each topic has a video and a list of terms,
+# synonyms and multi-word phrases included.
+#
+# All terms are compiled once into a single regex shaped like a trie, so the
+# engine never retries a shared prefix and matching stays fast however many
+# terms the file lists.
+
+SYMPTOM_VIDEO_MAP = os.getenv('SYMPTOM_VIDEO_MAP',
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'symptom_videos.json'))
+
+
+def _trie_pattern(terms):
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        end = '' in node
+        branches = [
+            (r'\s+' if char == ' ' else re.escape(char)) + build(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # A term ending here makes the longer continuations optional (and greedy)
+        if end:
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+class SymptomVideoIndex:
+    def __init__(self, mapping):
+        self.videos = {}
+        self.topics = {}
+        for topic, entry in mapping.items():
+            self.videos[topic] = entry['video']
+            for term in [topic] + list(entry.get('terms', [])):
+                self.topics[' '.join(term.lower().split())] = topic
+
+        self.pattern = re.compile(r'\b(?:' + _trie_pattern(self.topics) + r')\b', re.IGNORECASE) \
+            if self.topics else None
+
+    @classmethod
+    def from_file(cls, path=SYMPTOM_VIDEO_MAP):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def match_all(self, text):
+        """Return every topic mentioned in `text`, in order of first mention."""
+        if not self.pattern or not text:
+            return []
+        topics = []
+        for found in self.pattern.finditer(text):
+            topic = self.topics[' '.join(found.group(0).lower().split())]
+            if topic not in topics:
+                topics.append(topic)
+        return topics
+
+    def match(self, text):
+        """Return the first topic mentioned in `text`, or None."""
+        if not self.pattern or not text:
+            return None
+        found = self.pattern.search(text)
+        return self.topics[' '.join(found.group(0).lower().split())] if found else None
+
+    def video_for(self, text):
+        """Return the video filename for the first symptom in `text`, or None."""
+        topic = self.match(text)
+        return self.videos[topic] if topic else None
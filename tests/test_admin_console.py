@@ -0,0 +1,111 @@
+# tests/test_admin_console.py
+import csv
+import json
+import os
+import tempfile
+import unittest
+from werkzeug.security import check_password_hash
+from models import User, ScheduleAppointment, SQLASession
+import admin_console
+
+
+class BulkImportExportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.emails = [f"bulk{i}@example.com" for i in range(5)]
+        self._cleanup()
+
+    def tearDown(self):
+        self._cleanup()
+        self.tmp.cleanup()
+
+    def _cleanup(self):
+        with SQLASession() as session:
+            ids = [u.id for u in session.query(User).filter(User.email.in_(self.emails))]
+            if ids:
+                session.query(ScheduleAppointment).filter(
+                    ScheduleAppointment.patient_id.in_(ids)).delete(synchronize_session=False)
+                session.query(User).filter(User.id.in_(ids)).delete(synchronize_session=False)
+                session.commit()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_import_users_in_chunks_and_export_them_again(self):
+        with open(self.path('staff.csv'), 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['first_name', 'last_name', 'email', 'user_type', 'sc_code',
+                                                   'password'])
+            writer.writeheader()
+            for email in self.emails[:4]:
+                writer.writerow({'first_name': 'Bulk', 'last_name': 'User', 'email': email,
+                                 'user_type': 'Nurse', 'sc_code': '4321', 'password': 'secret123'})
+            writer.writerow({'first_name': 'Dup', 'last_name': 'User', 'email': self.emails[0],
+                             'user_type': 'nurse', 'sc_code': '4321', 'password': 'secret123'})
+            writer.writerow({'first_name': 'No', 'last_name': 'Type', 'email': self.emails[4],
+                             'user_type': 'admin', 'sc_code': '4321', 'password': 'secret123'})
+            writer.writerow({'first_name': 'No', 'last_name': 'Code', 'email': self.emails[4],
+                             'user_type': 'nurse', 'sc_code': '  ', 'password': 'secret123'})
+
+        stats = admin_console.import_users(self.path('staff.csv'), chunk_size=2, workers=2)
+        self.assertEqual(stats, {'inserted': 4, 'skipped': 1, 'invalid': 2, 'failed': 0})
+
+        again = admin_console.import_users(self.path('staff.csv'), chunk_size=2, workers=1)
+        self.assertEqual(again['inserted'], 0)
+
+        with SQLASession() as session:
+            user = session.query(User).filter_by(email=self.emails[0]).one()
+            self.assertEqual(user.user_type, 'nurse')
+            self.assertTrue(check_password_hash(user.password, 'secret123'))
+
+        admin_console.export_users(self.path('users.jsonl'), with_password_hashes=True)
+        with open(self.path('users.jsonl')) as f:
+            exported = {row['email']: row for row in map(json.loads, f)}
+        self.assertEqual(exported[self.emails[0]]['password_hash'], user.password)
+
+    def test_import_appointments_resolves_patient_emails(self):
+        with SQLASession() as session:
+            session.add(User(user_type='patient', first_name='Bulk', last_name='Patient', email=self.emails[0],
+                             tel='', password='x', sc_code='', image_url=''))
+            session.commit()
+
+        with open(self.path('appointments.jsonl'), 'w') as f:
+            f.write(json.dumps({'patient_email': self.emails[0], 'appointment_type': 'Checkup',
+                                'date': '2030-01-02', 'time': '09:30', 'reason': 'Annual'}) + "\n")
+            f.write(json.dumps({'patient_email': 'nobody@example.com', 'appointment_type': 'Checkup',
+                                'date': '2030-01-02', 'time': '09:30', 'reason': 'Annual'}) + "\n")
+            f.write(json.dumps({'patient_id': 987654321, 'appointment_type': 'Checkup',
+                                'date': '2030-01-03', 'time': '09:30', 'reason': 'Unknown id'}) + "\n")
+
+        stats = admin_console.import_appointments(self.path('appointments.jsonl'))
+        self.assertEqual(stats, {'inserted': 1, 'invalid': 2, 'failed': 0})
+
+        admin_console.export_appointments(self.path('appointments.csv'))
+        with open(self.path('appointments.csv'), newline='') as f:
+            rows = [row for row in csv.DictReader(f) if row['patient_email'] == self.emails[0]]
+        self.assertEqual([(r['date'], r['time']) for r in rows], [('2030-01-02', '09:30:00')])
+
+    def test_view_records_filters_selects_columns_and_exports(self):
+        with SQLASession() as session:
+            session.add_all([User(user_type='doctor', first_name=f'Viewer{i}', last_name='Doe', email=email,
+                                  tel='', password='x', sc_code='', image_url='')
+                             for i, email in enumerate(self.emails)])
+            session.commit()
+
+        where = ["email like bulk%@example.com", "first_name != Viewer0"]
+        query = admin_console.build_records_query('users', ['email', 'first_name'], where)
+        pages = list(admin_console.stream_records(query, page_size=3))
+        self.assertEqual([len(rows) for _, rows in pages], [3, 1])
+        self.assertEqual(pages[0][0], ['email', 'first_name'])
+
+        admin_console.export_records('users', self.path('users.csv'), ['email'], where)
+        with open(self.path('users.csv'), newline='') as f:
+            self.assertEqual(sorted(row['email'] for row in csv.DictReader(f)), self.emails[1:])
+
+        with self.assertRaises(ValueError):
+            admin_console.build_records_query('users', ['password; DROP TABLE users'])
+        with self.assertRaises(ValueError):
+            admin_console.build_records_query('users', filters=['1=1 OR id > 0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+# tests/test_ai_assistant.py
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import app as app_module
+from ai_assistant import TogetherClient, FALLBACK_REPLY
+from cache import TTLCache, DiskBackedTTLCache
+
+
+class StubProvider(BaseHTTPRequestHandler):
+    """Stands in for the Together API: fixed answers, optionally streamed."""
+    requests_seen = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        StubProvider.requests_seen.append((self.path, payload))
+
+        if payload.get('stream'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            if 'drop' in json.dumps(payload):
+                # One token, then the connection goes away mid-body
+                self.send_header('Content-Length', '10000')
+                self.end_headers()
+                self.wfile.write(f"data: {json.dumps({'choices': [{'text': 'Rest '}]})}\n\n".encode())
+                self.close_connection = True
+                return
+            self.end_headers()
+            tokens = ["I'm not sure", "."] if 'unsure' in json.dumps(payload) else ["Rest ", "and ", "ice."]
+            for token in tokens:
+                choice = {'delta': {'content': token}} if self.path == '/chat/completions' else {'text': token}
+                self.wfile.write(f"data: {json.dumps({'choices': [choice]})}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+
+        if self.path == '/chat/completions':
+            body = {'choices': [{'message': {'content': 'Drink water.'}}]}
+        else:
+            body = {'choices': [{'text': ' Rest and ice. '}]}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class AssistantTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubProvider)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.original_assistant = app_module.assistant
+        app_module.assistant = TogetherClient("test-key", base_url=f"http://127.0.0.1:{cls.server.server_port}")
+
+    @classmethod
+    def tearDownClass(cls):
+        app_module.assistant = cls.original_assistant
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.app = app_module.app.test_client()
+        self.app.testing = True
+        StubProvider.requests_seen.clear()
+
+    def test_ask_returns_completion(self):
+        response = self.app.post('/api/ask', json={'prompt': 'What helps knee pain?'})
+        self.assertEqual(response.get_json(), {'response': 'Rest and ice.'})
+
+    def test_ask_stream_sends_tokens_as_events(self):
+        response = self.app.post('/api/ask/stream', json={'prompt': 'What helps knee pain?'})
+        body = response.get_data(as_text=True)
+
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertIn('data: {"token": "Rest "}', body)
+        self.assertTrue(body.rstrip().endswith('event: done\ndata: {"response": "Rest and ice."}'))
+
+    def test_ask_stream_finishes_with_the_same_fallback_as_ask(self):
+        response = self.app.post('/api/ask/stream', json={'prompt': 'unsure'})
+        done = response.get_data(as_text=True).rstrip().split('\n')[-1]
+
+        self.assertEqual(json.loads(done[len('data: '):]), {'response': FALLBACK_REPLY})
+
+    def test_dropped_stream_ends_with_an_error_event(self):
+        response = self.app.post('/api/ask/stream', json={'prompt': 'please drop'})
+        body = response.get_data(as_text=True)
+
+        self.assertIn('event: error', body)
+        self.assertNotIn('event: done', body)
+
+    def test_chat_streams_when_asked(self):
+        response = self.app.post('/chat', json={'question': 'my knee hurts'},
+                                 headers={'Accept': 'text/event-stream'})
+        body = response.get_data(as_text=True)
+
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertTrue(body.startswith('event: video\ndata: {"video_url": "/media/videos/knees.mp4'))
+        self.assertIn('data: {"token": "and "}', body)
+        self.assertTrue(body.rstrip().endswith('event: done\ndata: {"response": "Rest and ice."}'))
+        self.assertEqual(StubProvider.requests_seen[0][0], '/chat/completions')
+
+    def test_chat_uses_chat_completions(self):
+        response = self.app.post('/chat', json={'question': 'I feel dizzy'})
+        self.assertEqual(response.get_json()['answer'], 'Drink water.')
+        self.assertEqual(StubProvider.requests_seen[0][0], '/chat/completions')
+
+    def test_unreachable_provider_is_reported(self):
+        app_module.assistant, working = TogetherClient("test-key", base_url="http://127.0.0.1:9"), app_module.assistant
+        try:
+            response = self.app.post('/api/ask', json={'prompt': 'hello'})
+        finally:
+            app_module.assistant = working
+        self.assertEqual(response.status_code, 500)
+
+    def test_repeated_questions_are_served_from_cache(self):
+        cached_client = TogetherClient("test-key", base_url=app_module.assistant.base_url, cache=TTLCache())
+        app_module.assistant, plain = cached_client, app_module.assistant
+        try:
+            first = self.app.post('/api/ask', json={'prompt': 'What causes knee pain?'}).get_json()
+            second = self.app.post('/api/ask', json={'prompt': '  what causes KNEE pain '}).get_json()
+            streamed = self.app.post('/api/ask/stream', json={'prompt': 'What causes knee pain'})
+        finally:
+            app_module.assistant = plain
+
+        self.assertEqual(first, second)
+        self.assertIn('Rest and ice.', streamed.get_data(as_text=True))
+        self.assertEqual(len(StubProvider.requests_seen), 1)
+        self.assertEqual(cached_client.cache.stats()['hits'], 2)
+
+
+class DiskBackedCacheTestCase(unittest.TestCase):
+    def test_entries_survive_a_new_instance(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'answers.sqlite')
+            DiskBackedTTLCache(path, ttl=60).set('key', 'answer')
+
+            reopened = DiskBackedTTLCache(path, ttl=60)
+            self.assertEqual(reopened.get('key'), 'answer')
+            self.assertEqual(reopened.stats()['disk_hits'], 1)
+            self.assertIsNone(reopened.get('missing'))
+            reopened._db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
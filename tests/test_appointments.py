@@ -0,0 +1,88 @@
+# tests/test_appointments.py
+import unittest
+from datetime import date, time, timedelta
+from app import SQLASession
+from models import ScheduleAppointment
+from appointments import upcoming_appointments, past_appointments
+
+
+class AppointmentListingTestCase(unittest.TestCase):
+    PATIENT_ID = 987654
+
+    def setUp(self):
+        self.today = date(2025, 6, 15)
+        self._cleanup()
+        with SQLASession() as session:
+            session.add_all([
+                ScheduleAppointment(patient_id=patient_id, appointment_type="Checkup",
+                                    date=self.today + timedelta(days=offset), time=time(9, 30),
+                                    reason="test")
+                for offset in range(-5, 5)
+                for patient_id in (self.PATIENT_ID, self.PATIENT_ID + 1)
+            ])
+            session.commit()
+
+    def tearDown(self):
+        self._cleanup()
+
+    def _cleanup(self):
+        with SQLASession() as session:
+            session.query(ScheduleAppointment).filter(
+                ScheduleAppointment.patient_id.in_([self.PATIENT_ID, self.PATIENT_ID + 1])
+            ).delete(synchronize_session=False)
+            session.commit()
+
+    def test_upcoming_are_scoped_sorted_and_paged(self):
+        with SQLASession() as session:
+            first = upcoming_appointments(session, patient_id=self.PATIENT_ID, per_page=3, today=self.today)
+            second = upcoming_appointments(session, patient_id=self.PATIENT_ID, page=2, per_page=3, today=self.today)
+
+            self.assertEqual([a.date for a in first], [self.today + timedelta(days=d) for d in range(3)])
+            self.assertTrue(first.has_next)
+            self.assertFalse(first.has_prev)
+            self.assertEqual(len(second), 2)
+            self.assertFalse(second.has_next)
+            self.assertTrue(all(a.patient_id == self.PATIENT_ID for a in list(first) + list(second)))
+
+    def test_past_are_most_recent_first(self):
+        with SQLASession() as session:
+            past = past_appointments(session, patient_id=self.PATIENT_ID, today=self.today)
+            self.assertEqual([a.date for a in past], [self.today - timedelta(days=d) for d in range(1, 6)])
+
+    def test_rows_carry_the_patient_from_one_query(self):
+        from sqlalchemy import event
+        from models import User, engine
+
+        with SQLASession() as session:
+            patient = User(user_type='patient', first_name='Row', last_name='Patient', email='rows@example.com',
+                           tel='', password='x', sc_code='', image_url='uploads/rows.png')
+            session.add(patient)
+            session.commit()
+            session.query(ScheduleAppointment).filter_by(patient_id=self.PATIENT_ID).update(
+                {'patient_id': patient.id})
+            session.commit()
+            patient_id = patient.id
+
+        statements = []
+        count = lambda *args: statements.append(args[2])
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            with SQLASession() as session:
+                rows = list(upcoming_appointments(session, per_page=50, today=self.today))
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+            with SQLASession() as session:
+                session.query(ScheduleAppointment).filter_by(patient_id=patient_id).delete()
+                session.query(User).filter_by(id=patient_id).delete()
+                session.commit()
+
+        self.assertEqual(len(statements), 1)
+        linked = [row for row in rows if row.patient_id == patient_id]
+        self.assertEqual(len(linked), 5)
+        self.assertEqual(linked[0].patient.first_name, 'Row')
+        self.assertEqual(linked[0].patient.image_url, 'uploads/rows.png')
+        self.assertTrue(all(row.patient is None for row in rows if row.patient_id == self.PATIENT_ID + 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# tests/test_assets.py
+import gzip
+import os
+import tempfile
+import unittest
+from PIL import Image
+import app as app_module
+from assets import AssetManifest, build, COMPRESSIBLE
+from media import MediaLibrary
+
+
+class AssetBuildTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmp.name, 'static')
+        self.dist = os.path.join(self.static, 'dist')
+        for folder in ('css', 'assets/Images', 'uploads'):
+            os.makedirs(os.path.join(self.static, folder))
+        self.css = b'body { color: #123456; }\n' * 200
+        with open(os.path.join(self.static, 'css', 'styles.css'), 'wb') as f:
+            f.write(self.css)
+        Image.new('RGB', (1200, 800), (10, 120, 200)).save(os.path.join(self.static, 'assets/Images/hero.jpg'))
+        Image.new('RGB', (10, 10)).save(os.path.join(self.static, 'uploads', 'avatar.png'))
+        self.manifest = build(self.static, self.dist)
+
+        self.original = app_module.asset_library
+        app_module.asset_library = MediaLibrary(self.dist, compressible=COMPRESSIBLE, immutable=True)
+        self.client = app_module.app.test_client()
+
+    def tearDown(self):
+        app_module.asset_library = self.original
+        self.tmp.cleanup()
+
+    def test_manifest_lists_hashed_copies(self):
+        self.assertEqual(sorted(self.manifest), ['assets/Images/hero.jpg', 'css/styles.css'])
+        name = self.manifest['css/styles.css']['file']
+        self.assertRegex(name, r'^css/styles\.[0-9a-f]{10}\.css$')
+        with gzip.open(os.path.join(self.dist, name + '.gz')) as f:
+            self.assertEqual(f.read(), self.css)
+        self.assertTrue(os.path.exists(os.path.join(self.dist, name + '.br')))
+        widths = [width for width, _ in self.manifest['assets/Images/hero.jpg']['widths']]
+        self.assertEqual(widths, [480, 960])
+
+    def test_rebuild_is_stable(self):
+        self.assertEqual(build(self.static, self.dist), self.manifest)
+
+    def test_old_builds_are_pruned(self):
+        first = self.manifest['css/styles.css']['file']
+        for version in range(3):
+            with open(os.path.join(self.static, 'css', 'styles.css'), 'ab') as f:
+                f.write(f'p {{ margin: {version}px; }}\n'.encode())
+            latest = build(self.static, self.dist)['css/styles.css']['file']
+            if version == 0:
+                second = latest
+
+        self.assertFalse(os.path.exists(os.path.join(self.dist, first)))
+        self.assertFalse(os.path.exists(os.path.join(self.dist, first + '.gz')))
+        self.assertTrue(os.path.exists(os.path.join(self.dist, second)))
+        self.assertTrue(os.path.exists(os.path.join(self.dist, latest + '.gz')))
+        self.assertTrue(os.path.exists(os.path.join(self.dist, self.manifest['assets/Images/hero.jpg']['file'])))
+
+    def test_urls_and_serving(self):
+        manifest = AssetManifest.load(self.dist)
+        with app_module.app.test_request_context():
+            url = manifest.url('static', filename='css/styles.css')
+            srcset = manifest.srcset('assets/Images/hero.jpg')
+            self.assertEqual(manifest.url('static', filename='css/other.css'), '/static/css/other.css')
+            self.assertEqual(AssetManifest({}).url('static', filename='css/styles.css'), '/static/css/styles.css')
+        self.assertTrue(url.startswith('/assets/css/styles.'))
+        self.assertIn('-480w.webp 480w, ', srcset)
+
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.mimetype, 'text/css')
+        self.assertTrue(response.cache_control.immutable)
+        self.assertEqual(self.client.get('/assets/manifest.json').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,6 @@
 # tests/test_auth.py
 import unittest
-from app import app, SQLASession
+from app import app, SQLASession, user_cache
 from models import User
 from werkzeug.security import generate_password_hash
 
@@ -59,5 +59,57 @@ class AuthTestCase(unittest.TestCase):
 
         self.assertIn(b'Invalid credentials', response.data)
 
+    def test_profile_uses_cached_user_until_updated(self):
+        self.app.post('/login', data={
+            'user_type': 'patient',
+            'first_name': 'Test',
+            'password': 'password123',
+            'sc_code': '1234'
+        })
+        user_cache.clear()
+
+        self.app.get('/patient_prf')
+        self.app.get('/patient_prf')
+        self.assertEqual(len(user_cache), 1)
+
+        self.app.post('/patient_prf', data={
+            'first_name': 'Renamed',
+            'last_name': 'User',
+            'email': self.test_email,
+            'tel': '1234567890',
+            'sc_code': '1234',
+        })
+        self.assertEqual(len(user_cache), 0)
+
+        response = self.app.get('/patient_prf')
+        self.assertIn(b'Renamed', response.data)
+
+    def test_profile_update_reaches_other_workers(self):
+        self.app.post('/login', data={
+            'user_type': 'patient',
+            'first_name': 'Test',
+            'password': 'password123',
+            'sc_code': '1234'
+        })
+        user_cache.clear()
+        self.app.get('/patient_prf')
+        with self.app.session_transaction() as sess:
+            old_key = (sess['user_id'], sess.get('user_version', 0))
+        stale = user_cache.get(old_key)
+        self.assertIsNotNone(stale)
+
+        self.app.post('/patient_prf', data={
+            'first_name': 'Renamed',
+            'last_name': 'User',
+            'email': self.test_email,
+            'tel': '1234567890',
+            'sc_code': '1234',
+        })
+        # Another worker's cache still holds the profile it loaded before the save
+        user_cache.set(old_key, stale)
+
+        response = self.app.get('/patient_prf')
+        self.assertIn(b'Renamed', response.data)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,67 @@
+# tests/test_check_app.py
+import unittest
+from datetime import date, time
+from models import User, ScheduleAppointment, Message, ConversationSummary, SQLASession, engine
+import check_app
+
+
+class IntegrityCheckTestCase(unittest.TestCase):
+    MISSING_USER = 987654
+
+    def setUp(self):
+        self._cleanup()
+        with SQLASession() as session:
+            patient = User(user_type='patient', first_name='Audit', last_name='Patient', email='audit@example.com',
+                           tel='', password='x', sc_code='', image_url='')
+            session.add(patient)
+            session.commit()
+            self.patient_id = patient.id
+            session.add_all([
+                ScheduleAppointment(patient_id=self.MISSING_USER, appointment_type='Audit', date=date(2030, 1, 1),
+                                    time=time(9), reason='orphan'),
+                ScheduleAppointment(patient_id=None, appointment_type='Audit', date=date(2030, 1, 1),
+                                    time=time(10), reason='unlinked'),
+                ScheduleAppointment(patient_id=patient.id, appointment_type='Audit', date=date(2030, 1, 1),
+                                    time=time(11), reason='fine'),
+                Message(sender_id=patient.id, receiver_id=self.MISSING_USER, content='audit orphan'),
+                Message(sender_id=patient.id, receiver_id=patient.id, content='audit fine'),
+                ConversationSummary(user_id=patient.id, contact_id=self.MISSING_USER, unread_count=0),
+            ])
+            session.commit()
+
+    def tearDown(self):
+        self._cleanup()
+
+    def _cleanup(self):
+        with SQLASession() as session:
+            session.query(ScheduleAppointment).filter_by(appointment_type='Audit').delete()
+            session.query(Message).filter(Message.content.like('audit %')).delete(synchronize_session=False)
+            session.query(ConversationSummary).filter_by(contact_id=self.MISSING_USER).delete()
+            session.query(User).filter_by(email='audit@example.com').delete()
+            session.commit()
+
+    def test_report_finds_orphans_with_one_query_per_check(self):
+        with engine.connect() as connection:
+            report = check_app.run_checks(connection)
+
+        checks = report['checks']
+        self.assertFalse(report['ok'])
+        self.assertEqual(checks['orphan_appointments']['count'], 2)
+        self.assertEqual(checks['orphan_messages']['count'], 1)
+        self.assertEqual(checks['orphan_conversation_summaries']['sample'], [[self.patient_id, self.MISSING_USER]])
+        self.assertEqual(checks['duplicate_emails']['count'], 0)
+
+    def test_repair_in_batches(self):
+        fixed = check_app.repair(engine, assign_patient=self.patient_id, batch_size=1)
+        self.assertEqual(fixed, {'orphan_messages': 1, 'orphan_conversation_summaries': 1,
+                                 'orphan_appointments': 2})
+
+        with engine.connect() as connection:
+            self.assertTrue(check_app.run_checks(connection)['ok'])
+
+        with self.assertRaises(ValueError):
+            check_app.repair(engine, assign_patient=self.MISSING_USER)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# tests/test_clinical_records.py
+import os
+import tempfile
+import unittest
+from app import app
+from models import ClinicalRecord, SQLASession
+from clinical_records import load_clinical_records, clinical_records_page
+
+HEADER = ("age,anaemia,creatinine_phosphokinase,diabetes,ejection_fraction,high_blood_pressure,"
+          "platelets,serum_creatinine,serum_sodium,sex,smoking,time,DEATH_EVENT")
+
+
+class ClinicalRecordsTestCase(unittest.TestCase):
+    SOURCE = 'test_clinical.csv'
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, self.SOURCE)
+        with open(self.path, 'w') as f:
+            f.write(HEADER + "\n")
+            for i in range(7):
+                f.write(f"{60 + i}.0,1,582,0,{15 + i * 5},1,265000.0,{1.0 + i / 10},130,1,0,{i + 4},{i % 2}\n")
+
+    def tearDown(self):
+        with SQLASession() as session:
+            session.query(ClinicalRecord).filter_by(source=self.SOURCE).delete()
+            session.commit()
+        self.tmp.cleanup()
+
+    def test_load_in_batches_and_reload_replaces(self):
+        self.assertEqual(load_clinical_records(self.path, batch_size=3), 7)
+        self.assertEqual(load_clinical_records(self.path, batch_size=3), 7)
+
+        with SQLASession() as session:
+            records = session.query(ClinicalRecord).filter_by(source=self.SOURCE).order_by(ClinicalRecord.source_row)
+            records = records.all()
+            self.assertEqual(len(records), 7)
+            self.assertEqual(records[2].follow_up_days, 6)
+            self.assertIs(records[1].death_event, True)
+
+            low_ef = clinical_records_page(session, max_ejection_fraction=25, per_page=2)
+            self.assertEqual([r.ejection_fraction for r in low_ef if r.source == self.SOURCE], [15, 20])
+            self.assertTrue(low_ef.has_next)
+
+    def test_failed_reload_keeps_previous_rows(self):
+        load_clinical_records(self.path, batch_size=3)
+        with open(self.path, 'a') as f:
+            f.write(",1,582,0,20,1,265000.0,1.2,130,1,0,9,1\n")  # no age, in the last batch
+        with self.assertRaises(Exception):
+            load_clinical_records(self.path, batch_size=3)
+
+        with SQLASession() as session:
+            self.assertEqual(session.query(ClinicalRecord).filter_by(source=self.SOURCE).count(), 7)
+
+    def test_patient_pages_list_records(self):
+        load_clinical_records(self.path)
+        for endpoint, user_type in (('/doc_patient', 'doctor'), ('/nur_patient', 'nurse')):
+            with self.app.session_transaction() as sess:
+                sess['user_id'] = 1
+                sess['user_type'] = user_type
+            response = self.app.get(f'{endpoint}?min_creatinine=1.55')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'1.6 mg/dL', response.data)
+            self.assertNotIn(b'1.5 mg/dL', response.data)
+
+    def test_patient_pages_require_clinical_staff(self):
+        load_clinical_records(self.path)
+        for endpoint in ('/doc_patient', '/nur_patient'):
+            response = self.app.get(endpoint)
+            self.assertEqual(response.status_code, 302)
+            self.assertIn('/login', response.headers['Location'])
+            self.assertNotIn(b'mg/dL', response.data)
+
+        with self.app.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['user_type'] = 'patient'
+        self.assertEqual(self.app.get('/doc_patient').status_code, 302)
+        self.assertEqual(self.app.get('/nur_patient').status_code, 302)
+
+
+if __name__ == '__main__':
+    unittest.main()
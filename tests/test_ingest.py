@@ -0,0 +1,146 @@
+# tests/test_ingest.py
+import os
+import sys
+import tempfile
+import unittest
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+import ingest
+
+HEADER = ",".join(ingest.SCHEMA)
+GOOD = "75,0,582,0,20,1,265000,1.9,130,1,0,4,1"
+
+
+class StreamingIngestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.raw = os.path.join(self.tmp.name, 'raw.csv')
+        self.clean = os.path.join(self.tmp.name, 'clean.csv')
+        self.rejects = os.path.join(self.tmp.name, 'rejects.csv')
+        self.manifest = os.path.join(self.tmp.name, 'manifest.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_ingest(self, lines, chunk_size=2):
+        with open(self.raw, 'w') as f:
+            f.write("\n".join([HEADER] + lines) + "\n")
+        return ingest.ingest(self.raw, self.clean, self.rejects, parquet_path=None, chunk_size=chunk_size,
+                             manifest_path=None)
+
+    def test_bad_rows_are_rejected_with_a_reason(self):
+        stats = self.run_ingest([
+            GOOD,
+            "abc,0,582,0,20,1,265000,1.9,130,1,0,4,1",
+            "60,2,582,0,20,1,265000,1.9,130,1,0,4,1",
+            "60,0,582,0,20,1,265000,,130,1,0,4,1",
+            "60,0,582,0,20.5,1,265000,1.9,130,1,0,4,1",
+            GOOD,
+        ])
+
+        self.assertEqual(stats, {'mode': 'full', 'clean': 2, 'rejected': 4})
+        clean = pd.read_csv(self.clean)
+        self.assertEqual(list(clean.columns), list(ingest.SCHEMA))
+        self.assertEqual(clean['age'].tolist(), [75.0, 75.0])
+        self.assertEqual(pd.read_csv(self.rejects)['reject_reason'].tolist(), [
+            'age: not a number',
+            'anaemia: out of range',
+            'serum_creatinine: missing',
+            'ejection_fraction: out of range',
+        ])
+
+    def test_values_too_large_for_their_dtype_are_rejected(self):
+        stats = self.run_ingest([
+            "60,0,582,0,20,1,265000,1.9,40000,1,0,4,1",
+            "60,0,1e12,0,20,1,265000,1.9,130,1,0,4,1",
+            "60,0,582,0,20,1,265000,1.9,130,1,0,40000,1",
+            "60,0,582,0,20,1,inf,1.9,130,1,0,4,1",
+            "60,0,2147483647,0,20,1,265000,1.9,32767,1,0,4,1",
+        ])
+
+        self.assertEqual(stats, {'mode': 'full', 'clean': 1, 'rejected': 4})
+        self.assertEqual(pd.read_csv(self.rejects)['reject_reason'].tolist(), [
+            'serum_sodium: out of range',
+            'creatinine_phosphokinase: out of range',
+            'time: out of range',
+            'platelets: out of range',
+        ])
+        clean = pd.read_csv(self.clean)
+        self.assertEqual(clean['creatinine_phosphokinase'].tolist(), [2147483647])
+        self.assertEqual(clean['serum_sodium'].tolist(), [32767])
+
+    def test_missing_columns_are_reported(self):
+        with open(self.raw, 'w') as f:
+            f.write("age,sex\n60,1\n")
+        with self.assertRaises(ingest.SchemaError):
+            ingest.ingest(self.raw, self.clean, self.rejects, parquet_path=None)
+
+    def incremental(self):
+        return ingest.ingest(self.raw, self.clean, self.rejects, parquet_path=None, chunk_size=2,
+                             manifest_path=self.manifest)
+
+    def test_incremental_runs_skip_unchanged_files_and_process_appends(self):
+        with open(self.raw, 'w') as f:
+            f.write("\n".join([HEADER, GOOD, GOOD, "abc,0,582,0,20,1,265000,1.9,130,1,0,4,1"]) + "\n")
+        self.assertEqual(self.incremental(), {'mode': 'full', 'clean': 2, 'rejected': 1})
+        self.assertEqual(self.incremental()['mode'], 'unchanged')
+
+        with open(self.raw, 'a') as f:
+            f.write(GOOD.replace('75,', '61,', 1) + "\n")
+        self.assertEqual(self.incremental(), {'mode': 'append', 'clean': 1, 'rejected': 0})
+
+        clean = pd.read_csv(self.clean)
+        self.assertEqual(clean['age'].tolist(), [75.0, 75.0, 61.0])
+        self.assertEqual(len(pd.read_csv(self.rejects)), 1)
+        self.assertEqual(ingest.load_manifest(self.manifest)['sources'][self.raw]['rows'], 4)
+
+        # an append that died half-way is cut back, then redone
+        with open(self.clean, 'a') as f:
+            f.write("61.0,0,58")
+        with open(self.raw, 'a') as f:
+            f.write(GOOD.replace('75,', '62,', 1) + "\n")
+        self.assertEqual(self.incremental()['mode'], 'append')
+        self.assertEqual(pd.read_csv(self.clean)['age'].tolist(), [75.0, 75.0, 61.0, 62.0])
+
+    def test_rewritten_source_is_rebuilt(self):
+        with open(self.raw, 'w') as f:
+            f.write("\n".join([HEADER, GOOD, GOOD]) + "\n")
+        self.incremental()
+        with open(self.raw, 'w') as f:
+            f.write("\n".join([HEADER, GOOD]) + "\n")
+        self.assertEqual(self.incremental(), {'mode': 'full', 'clean': 1, 'rejected': 0})
+        self.assertEqual(len(pd.read_csv(self.clean)), 1)
+
+    def test_parquet_parts_for_full_and_append_runs(self):
+        parquet = os.path.join(self.tmp.name, 'clean.parquet')
+        run = lambda: ingest.ingest(self.raw, self.clean, self.rejects, parquet_path=parquet, chunk_size=2,
+                                    manifest_path=self.manifest)
+        with open(self.raw, 'w') as f:
+            f.write("\n".join([HEADER, GOOD, GOOD, GOOD]) + "\n")
+        self.assertEqual(run()['mode'], 'full')
+        self.assertEqual(os.listdir(parquet), ['part-00000.parquet'])
+        data = pd.read_parquet(parquet)
+        self.assertEqual(len(data), 3)
+        self.assertEqual(str(data['anaemia'].dtype), 'int8')
+
+        with open(self.raw, 'a') as f:
+            f.write(GOOD.replace('75,', '61,', 1) + "\n")
+        self.assertEqual(run()['mode'], 'append')
+        self.assertEqual(sorted(os.listdir(parquet)), ['part-00000.parquet', 'part-00001.parquet'])
+        self.assertEqual(pd.read_parquet(parquet)['age'].tolist(), [75.0, 75.0, 75.0, 61.0])
+        recorded = ingest.load_manifest(self.manifest)['sources'][self.raw]['outputs']['parquet']['parts']
+        self.assertEqual(sorted(recorded), ['part-00000.parquet', 'part-00001.parquet'])
+
+        # a part left by an interrupted append is dropped; a damaged dataset forces a rebuild
+        with open(os.path.join(parquet, 'part-00002.parquet'), 'wb') as f:
+            f.write(b'partial')
+        self.assertEqual(run()['mode'], 'unchanged')
+        self.assertNotIn('part-00002.parquet', os.listdir(parquet))
+        os.remove(os.path.join(parquet, 'part-00001.parquet'))
+        self.assertEqual(run()['mode'], 'full')
+        self.assertEqual(len(pd.read_parquet(parquet)), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
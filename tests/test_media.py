@@ -0,0 +1,84 @@
+# tests/test_media.py
+import gzip
+import os
+import tempfile
+import unittest
+import app as app_module
+from media import MediaLibrary, precompress, IMMUTABLE_MAX_AGE
+
+
+class MediaTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.tmp.name, '3d'))
+        os.makedirs(os.path.join(self.tmp.name, 'videos'))
+        self.video = bytes(range(256)) * 400
+        with open(os.path.join(self.tmp.name, 'videos', 'heart.mp4'), 'wb') as f:
+            f.write(self.video)
+        self.model = b'glTF' + b'\x00' * 50000
+        with open(os.path.join(self.tmp.name, '3d', 'heart.glb'), 'wb') as f:
+            f.write(self.model)
+
+        self.original = app_module.media_library
+        app_module.media_library = MediaLibrary(self.tmp.name)
+        app_module.app.jinja_env.globals['media_url'] = app_module.media_library.url
+        app_module.page_cache.clear()  # index.html is otherwise served from the page cache
+        self.client = app_module.app.test_client()
+
+    def tearDown(self):
+        app_module.media_library = self.original
+        app_module.app.jinja_env.globals['media_url'] = self.original.url
+        self.tmp.cleanup()
+
+    def url(self, filename):
+        with app_module.app.test_request_context():
+            return app_module.media_library.url(filename)
+
+    def test_fingerprinted_urls_are_immutable(self):
+        url = self.url('videos/heart.mp4')
+        self.assertIn('?v=', url)
+        response = self.client.get(url)
+        self.assertEqual(response.data, self.video)
+        self.assertTrue(response.cache_control.immutable)
+        self.assertEqual(response.cache_control.max_age, IMMUTABLE_MAX_AGE)
+
+        unversioned = self.client.get('/media/videos/heart.mp4')
+        self.assertTrue(unversioned.cache_control.no_cache)
+        self.assertEqual(unversioned.headers['ETag'], response.headers['ETag'])
+
+    def test_range_and_conditional_requests(self):
+        url = self.url('videos/heart.mp4')
+        partial = self.client.get(url, headers={'Range': 'bytes=1000-1999'})
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial.data, self.video[1000:2000])
+        self.assertEqual(partial.headers['Content-Range'], f'bytes 1000-1999/{len(self.video)}')
+
+        etag = partial.headers['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+    def test_precompressed_variant(self):
+        precompress(self.tmp.name)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'videos', 'heart.mp4.gz')))
+
+        response = self.client.get('/media/3d/heart.glb', headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.mimetype, 'model/gltf-binary')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(gzip.decompress(response.data), self.model)
+
+        plain = self.client.get('/media/3d/heart.glb')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual(plain.data, self.model)
+        self.assertNotEqual(plain.headers['ETag'], response.headers['ETag'])
+
+    def test_missing_and_escaping_paths(self):
+        self.assertEqual(self.client.get('/media/videos/nope.mp4').status_code, 404)
+        self.assertEqual(self.client.get('/media/../app.py').status_code, 404)
+
+    def test_index_page_links_models(self):
+        self.assertIn(self.url('3d/heart.glb'), self.client.get('/').get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+# tests/test_meetings.py
+import threading
+import unittest
+from datetime import date, time, timedelta
+from unittest import mock
+from google.auth.exceptions import RefreshError
+from googleapiclient.errors import HttpError
+import app as app_module
+from app import SQLASession
+from models import User, ScheduleAppointment
+from meetings import MeetingService, MeetingError, GoogleCalendarBackend, run_prefetch_loop
+
+
+class FakeCalendarBackend:
+    """Records inserted events and answers with a predictable Meet link."""
+
+    def __init__(self):
+        self.batches = []
+
+    def create_events(self, bodies):
+        self.batches.append(bodies)
+        return [{'hangoutLink': f"https://meet.example/{body['conferenceData']['createRequest']['requestId']}"}
+                for body in bodies]
+
+
+class FailingSecondBatchBackend(FakeCalendarBackend):
+    def create_events(self, bodies):
+        if self.batches:
+            raise MeetingError("Google Calendar request failed: 503")
+        return super().create_events(bodies)
+
+
+class RevokedTokenBackend(GoogleCalendarBackend):
+    def _credentials(self):
+        raise RefreshError("invalid_grant: Token has been expired or revoked.")
+
+
+class ForbiddenBackend(GoogleCalendarBackend):
+    def service(self):
+        batch = mock.Mock()
+        batch.execute.side_effect = HttpError(mock.Mock(status=403, reason='Forbidden'), b'{}')
+        return mock.Mock(new_batch_http_request=mock.Mock(return_value=batch))
+
+
+class MeetingServiceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = app_module.app.test_client()
+        self.app.testing = True
+        self.backend = FakeCalendarBackend()
+        self.original_service = app_module.meeting_service
+        app_module.meeting_service = MeetingService(self.backend)
+        self.today = date.today()
+        self._cleanup()
+
+        with SQLASession() as session:
+            patient = User(user_type="patient", first_name="Meet", last_name="Patient",
+                           email="meet-patient@example.com", tel="1234567890", password="x",
+                           sc_code="1234", image_url="")
+            session.add(patient)
+            session.commit()
+            appointments = [
+                ScheduleAppointment(patient_id=patient.id, appointment_type="Video", reason="test",
+                                    date=self.today + timedelta(days=offset), time=time(10, 0))
+                for offset in (0, 1, 5)
+            ]
+            session.add_all(appointments)
+            session.commit()
+            self.patient_id = patient.id
+            self.appointment_ids = [a.id for a in appointments]
+
+    def tearDown(self):
+        app_module.meeting_service = self.original_service
+        self._cleanup()
+
+    def _cleanup(self):
+        with SQLASession() as session:
+            patient = session.query(User).filter_by(email="meet-patient@example.com").first()
+            if patient:
+                session.query(ScheduleAppointment).filter_by(patient_id=patient.id).delete()
+                session.delete(patient)
+                session.commit()
+
+    def test_prefetch_creates_links_in_one_batch(self):
+        with SQLASession() as session:
+            created = app_module.meeting_service.prefetch_upcoming(session, days=1, today=self.today)
+        self.assertEqual(created, 2)
+        self.assertEqual(len(self.backend.batches), 1)
+
+        with SQLASession() as session:
+            links = [session.get(ScheduleAppointment, i).meet_link for i in self.appointment_ids]
+        self.assertTrue(links[0] and links[1])
+        self.assertIsNone(links[2])
+
+    def test_links_from_earlier_batches_survive_a_later_failure(self):
+        backend = FailingSecondBatchBackend()
+        with mock.patch('meetings.CALENDAR_BATCH_SIZE', 1), SQLASession() as session:
+            with self.assertRaises(MeetingError):
+                MeetingService(backend).prefetch_upcoming(session, days=1, today=self.today)
+        self.assertEqual(len(backend.batches), 1)
+
+        with SQLASession() as session:
+            links = [session.get(ScheduleAppointment, i).meet_link for i in self.appointment_ids[:2]]
+        self.assertTrue(links[0].startswith('https://meet.example/'))
+        self.assertIsNone(links[1])
+
+    def test_join_meeting_reuses_stored_link(self):
+        first = self.app.post(f'/join_meeting/{self.appointment_ids[2]}')
+        second = self.app.post(f'/join_meeting/{self.appointment_ids[2]}')
+
+        self.assertEqual(first.status_code, 302)
+        self.assertTrue(first.location.startswith('https://meet.example/'))
+        self.assertEqual(first.location, second.location)
+        self.assertEqual(len(self.backend.batches), 1)
+
+    def test_google_failures_become_meeting_errors(self):
+        with SQLASession() as session:
+            appointment = session.get(ScheduleAppointment, self.appointment_ids[0])
+            for backend in (RevokedTokenBackend(), ForbiddenBackend()):
+                with self.assertRaises(MeetingError):
+                    MeetingService(backend).ensure_link(session, appointment, 'meet-patient@example.com')
+
+        app_module.meeting_service = MeetingService(RevokedTokenBackend())
+        response = self.app.post(f'/join_meeting/{self.appointment_ids[0]}')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/patient_appoin', response.location)
+
+    def test_each_thread_gets_its_own_calendar_client(self):
+        backend = GoogleCalendarBackend()
+        backend._credentials = lambda: 'creds'
+        with mock.patch('googleapiclient.discovery.build', side_effect=lambda *a, **k: object()):
+            here = [backend.service(), backend.service()]
+            there = []
+            worker = threading.Thread(target=lambda: there.append(backend.service()))
+            worker.start()
+            worker.join()
+        self.assertIs(here[0], here[1])
+        self.assertIsNot(here[0], there[0])
+
+    def test_prefetch_loop_uses_the_given_sleep(self):
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            run_prefetch_loop(MeetingService(self.backend), 30, sleep=sleep)
+        self.assertEqual(waits, [30])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,234 @@
+# tests/test_messaging.py
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+from app import app, SQLASession
+from models import User, Message, ConversationSummary
+import messaging
+from messaging import MessageWriter, PendingMessage
+from werkzeug.security import generate_password_hash
+
+
+class ConversationHistoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        self.emails = ["chat-patient@example.com", "chat-doctor@example.com"]
+        self._cleanup()
+
+        with SQLASession() as session:
+            patient, doctor = [
+                User(user_type=user_type, first_name=user_type.title(), last_name="Chat",
+                     email=email, tel="1234567890", password=generate_password_hash("password123"),
+                     sc_code="1234", image_url="")
+                for user_type, email in zip(["patient", "doctor"], self.emails)
+            ]
+            session.add_all([patient, doctor])
+            session.commit()
+            self.patient_id, self.doctor_id = patient.id, doctor.id
+
+            start = datetime(2024, 1, 1, 9, 0)
+            session.add_all([
+                Message(sender_id=self.patient_id if i % 2 else self.doctor_id,
+                        receiver_id=self.doctor_id if i % 2 else self.patient_id,
+                        content=f"message {i}",
+                        timestamp=start + timedelta(minutes=i))
+                for i in range(120)
+            ])
+            session.commit()
+
+        with self.app.session_transaction() as sess:
+            sess['user_id'] = self.patient_id
+
+    def tearDown(self):
+        self._cleanup()
+
+    def _cleanup(self):
+        with SQLASession() as session:
+            users = session.query(User).filter(User.email.in_(self.emails)).all()
+            ids = [u.id for u in users]
+            if ids:
+                session.query(ConversationSummary).filter(
+                    ConversationSummary.user_id.in_(ids) | ConversationSummary.contact_id.in_(ids)
+                ).delete(synchronize_session=False)
+                session.query(Message).filter(
+                    Message.sender_id.in_(ids) | Message.receiver_id.in_(ids)
+                ).delete(synchronize_session=False)
+                for user in users:
+                    session.delete(user)
+                session.commit()
+
+    def test_pages_walk_back_through_the_whole_thread(self):
+        seen = []
+        cursor = None
+        while True:
+            url = f'/api/messages/{self.doctor_id}?limit=50'
+            if cursor:
+                url += f'&before={cursor}'
+            data = self.app.get(url).get_json()
+            seen = [m['content'] for m in data['messages']] + seen
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(seen, [f"message {i}" for i in range(120)])
+
+    def test_invalid_cursor(self):
+        response = self.app.get(f'/api/messages/{self.doctor_id}?before=nope')
+        self.assertEqual(response.status_code, 400)
+
+    def test_requires_login(self):
+        with self.app.session_transaction() as sess:
+            sess.clear()
+        response = self.app.get(f'/api/messages/{self.doctor_id}')
+        self.assertEqual(response.status_code, 401)
+
+    def test_sending_updates_summaries_and_opening_thread_clears_unread(self):
+        self.app.post(f'/patient_mess/{self.doctor_id}', data={'content': 'Can we talk about my results?'})
+
+        with SQLASession() as session:
+            doctor_view = session.get(ConversationSummary, (self.doctor_id, self.patient_id))
+            patient_view = session.get(ConversationSummary, (self.patient_id, self.doctor_id))
+            self.assertEqual(doctor_view.unread_count, 1)
+            self.assertEqual(patient_view.unread_count, 0)
+            self.assertEqual(doctor_view.last_message, 'Can we talk about my results?')
+
+        with self.app.session_transaction() as sess:
+            sess['user_id'] = self.doctor_id
+        response = self.app.get(f'/doc_mess/{self.patient_id}')
+        self.assertEqual(response.status_code, 200)
+
+        with SQLASession() as session:
+            doctor_view = session.get(ConversationSummary, (self.doctor_id, self.patient_id))
+            self.assertEqual(doctor_view.unread_count, 0)
+
+    def test_summary_created_by_another_writer_is_updated_not_duplicated(self):
+        with SQLASession() as session:
+            session.add(ConversationSummary(user_id=self.patient_id, contact_id=self.doctor_id, unread_count=2,
+                                            last_message='earlier', last_sender_id=self.doctor_id,
+                                            last_timestamp=datetime(2024, 1, 1)))
+            session.commit()
+
+        # The first UPDATE misses, as if the other writer's INSERT committed right after it
+        real_update = messaging._update_summary
+        calls = []
+
+        def racing_update(*args):
+            calls.append(args)
+            return 0 if len(calls) == 1 else real_update(*args)
+
+        with mock.patch('messaging._update_summary', side_effect=racing_update):
+            with SQLASession() as session:
+                msg = Message(sender_id=self.doctor_id, receiver_id=self.patient_id, content='Results are in',
+                              timestamp=datetime(2024, 2, 1))
+                session.add(msg)
+                messaging._touch_summary(session, self.patient_id, self.doctor_id, msg, 1)
+                session.commit()
+
+        self.assertEqual(len(calls), 2)
+        with SQLASession() as session:
+            patient_view = session.get(ConversationSummary, (self.patient_id, self.doctor_id))
+            self.assertEqual(patient_view.unread_count, 3)
+            self.assertEqual(patient_view.last_message, 'Results are in')
+            self.assertIsNotNone(session.query(Message).filter_by(content='Results are in').first())
+
+    def test_message_writer_saves_a_batch_and_reports_ids(self):
+        saved = []
+        writer = MessageWriter(SQLASession, flush_interval=60,
+                               on_persisted=lambda pending, msg_id: saved.append((pending.client_ref, msg_id)))
+        for i in range(3):
+            writer.submit(self.doctor_id, self.patient_id, f"batched {i}", client_ref=f"ref-{i}")
+        writer.stop()
+
+        self.assertEqual([ref for ref, _ in saved], ['ref-0', 'ref-1', 'ref-2'])
+        with SQLASession() as session:
+            stored = {m.id: m.content for m in session.query(Message).filter(
+                Message.content.like('batched %'), Message.sender_id == self.doctor_id)}
+            patient_view = session.get(ConversationSummary, (self.patient_id, self.doctor_id))
+            self.assertEqual(patient_view.unread_count, 3)
+            self.assertEqual(patient_view.last_message, 'batched 2')
+        self.assertEqual([stored[msg_id] for _, msg_id in saved], ['batched 0', 'batched 1', 'batched 2'])
+
+    def test_retries_back_off_and_given_up_messages_are_reported(self):
+        def broken_session():
+            raise RuntimeError("database is down")
+
+        failed = []
+        writer = MessageWriter(broken_session, flush_interval=60, on_failed=lambda p: failed.append(p.client_ref))
+        self.assertEqual([writer.retry_delay(n) for n in range(1, 9)], [0.5, 1, 2, 4, 8, 16, 30, 30])
+
+        writer._queue.put(PendingMessage(self.doctor_id, self.patient_id, "kept trying", client_ref="ref-0"))
+        with self.assertLogs('messaging', level='ERROR'):
+            for attempt in range(1, writer.MAX_ATTEMPTS):
+                self.assertFalse(writer._write(writer._drain(writer.batch_size)))
+                self.assertEqual(failed, [])
+            # The last attempt gives up on the message and reports it
+            self.assertFalse(writer._write(writer._drain(writer.batch_size)))
+        self.assertEqual(failed, ['ref-0'])
+        self.assertTrue(writer._queue.empty())
+
+        writer._queue.put(PendingMessage(self.doctor_id, self.patient_id, "at exit", client_ref="ref-1"))
+        with self.assertLogs('messaging', level='ERROR'):
+            writer.flush()
+        self.assertEqual(failed, ['ref-0', 'ref-1'])
+
+    def test_write_through_failures_reach_the_caller(self):
+        def broken_session():
+            raise RuntimeError("database is down")
+
+        writer = MessageWriter(broken_session, flush_interval=0)
+        with self.assertRaises(RuntimeError):
+            writer.submit(self.doctor_id, self.patient_id, "not saved")
+        self.assertTrue(writer._queue.empty())
+
+    def test_message_writer_ids_follow_client_refs(self):
+        with SQLASession() as session:
+            earlier = Message(sender_id=self.doctor_id, receiver_id=self.patient_id, content="same text",
+                              client_ref="ref-0")
+            session.add(earlier)
+            session.commit()
+            earlier_id = earlier.id
+
+        saved = {}
+        writer = MessageWriter(SQLASession, flush_interval=60,
+                               on_persisted=lambda pending, msg_id: saved.update({pending.client_ref: msg_id}))
+        for ref in ("ref-0", "ref-1"):
+            writer._queue.put(PendingMessage(self.doctor_id, self.patient_id, "same text", client_ref=ref))
+        writer.flush()
+
+        self.assertEqual(len(set(saved.values()) | {earlier_id}), 3)
+        with SQLASession() as session:
+            for ref, msg_id in saved.items():
+                self.assertEqual(session.get(Message, msg_id).client_ref, ref)
+
+    def test_message_writer_retries_a_failed_batch_first_and_in_order(self):
+        attempts = []
+
+        def flaky_session():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError("database is locked")
+            return SQLASession()
+
+        saved = []
+        writer = MessageWriter(flaky_session, flush_interval=60, batch_size=2,
+                               on_persisted=lambda pending, msg_id: saved.append((pending.client_ref, msg_id)))
+        pending = [PendingMessage(self.doctor_id, self.patient_id, f"retried {i}", client_ref=f"ref-{i}")
+                   for i in range(3)]
+        for p in pending:
+            writer._queue.put(p)
+
+        with self.assertLogs('messaging', level='ERROR') as logs:
+            writer._write(writer._drain(writer.batch_size))
+        self.assertIn("Failed to save 2 messages (0 dropped)", logs.output[0])
+        writer.flush()
+
+        self.assertEqual([ref for ref, _ in saved], ['ref-0', 'ref-1', 'ref-2'])
+        self.assertEqual([p.attempts for p in pending], [1, 1, 0])
+        with SQLASession() as session:
+            stored = {m.id: m.content for m in session.query(Message).filter(Message.content.like('retried %'))}
+        self.assertEqual([stored[msg_id] for _, msg_id in saved], ['retried 0', 'retried 1', 'retried 2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
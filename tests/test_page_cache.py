@@ -0,0 +1,62 @@
+# tests/test_page_cache.py
+import unittest
+from unittest import mock
+import app as app_module
+from cache import TTLCache
+from page_cache import PageCache
+
+
+class PageCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.original = app_module.page_cache.store
+        app_module.page_cache.store = TTLCache(maxsize=64, ttl=60)
+        self.client = app_module.app.test_client()
+
+    def tearDown(self):
+        app_module.page_cache.store = self.original
+
+    def test_anonymous_pages_render_once(self):
+        with mock.patch.object(app_module, 'render_template', wraps=app_module.render_template) as render:
+            first = self.client.get('/about')
+            second = self.client.get('/about')
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first.headers['ETag'], second.headers['ETag'])
+        self.assertTrue(first.cache_control.no_cache)
+
+    def test_conditional_get(self):
+        etag = self.client.get('/').headers['ETag']
+        response = self.client.get('/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+    def test_logged_in_visitors_skip_the_cache(self):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 12345
+        with mock.patch.object(app_module, 'render_template', wraps=app_module.render_template) as render:
+            self.client.get('/contact')
+            self.client.get('/contact')
+        self.assertEqual(render.call_count, 2)
+        self.assertEqual(len(app_module.page_cache.store), 0)
+
+    def test_deploy_key_separates_entries(self):
+        store = TTLCache()
+        with app_module.app.test_request_context('/services'):
+            view = lambda: 'v1'
+            PageCache(store, key='release-1').cached(view)()
+            view = lambda: 'v2'
+            response = PageCache(store, key='release-2').cached(view)()
+        self.assertEqual(response.get_data(as_text=True), 'v2')
+
+    def test_fragments_are_shared(self):
+        renders = []
+        template = app_module.app.jinja_env.from_string(
+            "{% call cache_fragment('greeting') %}{{ note(name) }}{% endcall %}")
+        note = lambda name: renders.append(name) or name.upper()
+        self.assertEqual(template.render(name='one', note=note), 'ONE')
+        self.assertEqual(template.render(name='two', note=note), 'ONE')
+        self.assertEqual(renders, ['one'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+# tests/test_realtime.py
+import time
+import unittest
+import socketio
+from realtime import (LocalBroker, LocalPubSubManager, EventThrottle, PresenceRegistry, socketio_options,
+                      socketio_scheduler)
+
+
+def make_worker(broker):
+    """A Socket.IO server as one gunicorn worker would run it, recording what it sends."""
+    manager = LocalPubSubManager(channel='test', broker=broker)
+    server = socketio.Server(client_manager=manager, async_mode='threading')
+    server.sent = []
+    server._send_eio_packet = lambda eio_sid, pkt: server.sent.append((eio_sid, pkt.data))
+    manager.initialize()
+    return server, manager
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class PubSubFanOutTestCase(unittest.TestCase):
+    def test_emit_reaches_room_joined_on_another_worker(self):
+        broker = LocalBroker()
+        worker_a, manager_a = make_worker(broker)
+        worker_b, _ = make_worker(broker)
+
+        sid = manager_a.connect('browser-1', '/')
+        manager_a.enter_room(sid, '/', '42')
+        worker_b.emit('receive_message', {'content': 'hello'}, room='42')
+
+        self.assertTrue(wait_for(lambda: worker_a.sent))
+        self.assertEqual(worker_a.sent, [('browser-1', '2["receive_message",{"content":"hello"}]')])
+        self.assertEqual(worker_b.sent, [])
+
+    def test_options_select_backend(self):
+        self.assertEqual(socketio_options(None), {})
+        self.assertEqual(socketio_options('redis://localhost:6379/0', 'chat'),
+                         {'message_queue': 'redis://localhost:6379/0', 'channel': 'chat'})
+        manager = socketio_options('local://chat')['client_manager']
+        self.assertIsInstance(manager, LocalPubSubManager)
+        self.assertEqual(manager.channel, 'chat')
+
+
+class EventThrottleTestCase(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.timers = []
+        self.sent = []
+        self.throttle = EventThrottle(1.0, clock=lambda: self.now,
+                                      schedule=lambda delay, fn: self.timers.append(fn))
+
+    def submit(self, payload, key='room-1'):
+        self.throttle.submit(key, payload, self.sent.append)
+
+    def test_burst_of_identical_events_sends_one(self):
+        for i in range(20):
+            self.now = i * 0.02
+            self.submit({'sender_id': 7})
+
+        self.assertEqual(self.sent, [{'sender_id': 7}])
+        self.assertEqual(self.throttle.stats(), {'emitted': 1, 'coalesced': 0, 'dropped': 19})
+
+    def test_changed_payloads_collapse_into_one_trailing_event(self):
+        self.submit({'state': 'typing'})
+        self.submit({'state': 'idle'})
+        self.submit({'state': 'typing again'})
+        self.assertEqual(len(self.timers), 1)
+
+        self.now = 1.0
+        self.timers.pop()()
+        self.assertEqual(self.sent, [{'state': 'typing'}, {'state': 'typing again'}])
+        self.assertEqual(self.throttle.stats(), {'emitted': 2, 'coalesced': 1, 'dropped': 0})
+
+    def test_socketio_scheduler_waits_in_a_background_task(self):
+        calls = []
+
+        class FakeSocketIO:
+            def start_background_task(self, target):
+                calls.append('task')
+                target()
+
+            def sleep(self, seconds):
+                calls.append(('sleep', seconds))
+
+        socketio_scheduler(FakeSocketIO())(0.5, lambda: calls.append('fn'))
+        self.assertEqual(calls, ['task', ('sleep', 0.5), 'fn'])
+
+    def test_windows_are_per_key_and_reopen(self):
+        self.submit({'sender_id': 7}, key='room-1')
+        self.submit({'sender_id': 7}, key='room-2')
+        self.now = 1.5
+        self.submit({'sender_id': 7}, key='room-1')
+        self.assertEqual(len(self.sent), 3)
+
+
+class PresenceRegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.presence = PresenceRegistry(ttl=60, clock=lambda: self.now)
+
+    def test_user_stays_online_until_last_socket_leaves(self):
+        self.presence.connect(7, 'tab-1')
+        self.presence.connect(7, 'tab-2')
+        self.assertEqual(self.presence.disconnect('tab-1'), 7)
+        self.assertTrue(self.presence.is_online(7))
+        self.presence.disconnect('tab-2')
+        self.assertFalse(self.presence.is_online(7))
+        self.assertIsNone(self.presence.disconnect('tab-2'))
+
+    def test_sockets_expire_without_heartbeat(self):
+        self.presence.connect(7, 'tab-1')
+        self.presence.connect(8, 'tab-2')
+        self.now = 50
+        self.presence.heartbeat('tab-1')
+        self.now = 70
+        self.assertEqual(self.presence.online([7, 8, 9]), {7})
+        self.now = 200
+        self.assertEqual(self.presence.expire(), 1)
+        self.assertFalse(self.presence.is_online(7))
+
+
+if __name__ == '__main__':
+    unittest.main()
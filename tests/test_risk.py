@@ -0,0 +1,73 @@
+# tests/test_risk.py
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+import risk
+from app import app
+from models import ClinicalRecord, SQLASession
+from clinical_records import load_clinical_records
+
+CLEAN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'clean', 'heart_clean.csv')
+
+
+class RiskModelTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.meta = risk.train(CLEAN_PATH, model_dir=cls.tmp.name)
+        cls.model = risk.RiskModel.load(cls.tmp.name)
+        cls.data = pd.read_csv(CLEAN_PATH)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_model_separates_outcomes(self):
+        self.assertGreater(self.meta['training_auc'], 0.7)
+        self.assertIsInstance(self.model.coef, np.memmap)
+
+        scores = self.model.score_frame(self.data)
+        died = self.data['DEATH_EVENT'] == 1
+        self.assertGreater(scores[died].mean(), scores[~died].mean())
+
+    def test_training_on_one_outcome_still_reports(self):
+        path = os.path.join(self.tmp.name, 'survivors.csv')
+        self.data[self.data['DEATH_EVENT'] == 0].head(50).to_csv(path, index=False)
+        with tempfile.TemporaryDirectory() as model_dir:
+            meta = risk.train(path, model_dir=model_dir)
+
+        self.assertIsNone(meta['training_auc'])
+        self.assertIn('no training AUC', risk.training_summary(meta))
+        self.assertIn('AUC 0.', risk.training_summary(self.meta))
+
+    def test_single_record_matches_batch(self):
+        batch = self.model.score_frame(self.data.head(20))
+        single = [self.model.score_record(row) for row in self.data.head(20).to_dict('records')]
+        np.testing.assert_allclose(batch, single, rtol=1e-9)
+        self.assertEqual(risk.risk_band(0.75), 'high')
+        self.assertEqual(risk.risk_band(0.1), 'low')
+
+    def test_nightly_scoring_and_api(self):
+        load_clinical_records(CLEAN_PATH, source='test_risk.csv')
+        original, risk._model = risk._model, self.model
+        try:
+            self.assertGreaterEqual(risk.score_all_records(model=self.model, batch_size=100), 299)
+            with SQLASession() as session:
+                record = session.query(ClinicalRecord).filter_by(source='test_risk.csv', source_row=0).one()
+                self.assertAlmostEqual(record.risk_score, self.model.score_record(record))
+
+            response = app.test_client().post('/api/risk', json=self.data.iloc[0].to_dict())
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(response.get_json()['band'], ('low', 'moderate', 'high'))
+            self.assertEqual(app.test_client().post('/api/risk', json={'age': 60}).status_code, 400)
+        finally:
+            risk._model = original
+            with SQLASession() as session:
+                session.query(ClinicalRecord).filter_by(source='test_risk.csv').delete()
+                session.commit()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+# tests/test_symptom_videos.py
+import unittest
+from symptom_videos import SymptomVideoIndex
+
+
+class SymptomVideoIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.index = SymptomVideoIndex({
+            "heart": {"video": "heart.mp4", "terms": ["cardiac", "chest pain"]},
+            "knee": {"video": "knees.mp4", "terms": ["knees", "kneecap"]},
+        })
+
+    def test_synonyms_and_phrases(self):
+        self.assertEqual(self.index.video_for("Sharp CHEST   pain since morning"), "heart.mp4")
+        self.assertEqual(self.index.video_for("my kneecap is swollen"), "knees.mp4")
+
+    def test_whole_words_only(self):
+        self.assertIsNone(self.index.match("is heartburn serious?"))
+
+    def test_all_topics_in_order_of_mention(self):
+        self.assertEqual(self.index.match_all("knees ache and my heart races, knees again"), ["knee", "heart"])
+
+    def test_shipped_mapping_loads(self):
+        index = SymptomVideoIndex.from_file()
+        self.assertEqual(index.video_for("what causes knee pain"), "knees.mp4")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# tests/test_uploads.py
+import hashlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+from uploads import ImageStore, UploadError, AVATAR_SIZES, MAX_ORIGINAL_SIDE
+
+
+def jpeg_upload(size=(1600, 1200), color=(200, 30, 30), filename='me.jpg', exif=None):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG', **({'exif': exif} if exif else {}))
+    buffer.seek(0)
+    return FileStorage(buffer, filename=filename)
+
+
+class ImageStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = ImageStore(self.tmp.name, url_prefix='uploads/profile_pics')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_same_content_is_stored_once(self):
+        first = self.store.save(jpeg_upload(filename='a.jpg'))
+        second = self.store.save(jpeg_upload(filename='b.jpg'))
+        self.store.wait()
+        self.assertEqual(first, second)
+        originals = [n for n in os.listdir(self.tmp.name) if n.endswith('.jpg')]
+        self.assertEqual(len(originals), 1)
+
+    def test_originals_are_shrunk_and_thumbnails_written(self):
+        image_url = self.store.save(jpeg_upload())
+        self.store.wait()
+        with Image.open(os.path.join(self.tmp.name, os.path.basename(image_url))) as original:
+            self.assertEqual(max(original.size), MAX_ORIGINAL_SIDE)
+        for size in AVATAR_SIZES:
+            url = self.store.avatar_url(image_url, size)
+            self.assertTrue(url.endswith(f'-{size}.webp'))
+            with Image.open(os.path.join(self.tmp.name, 'thumbs', os.path.basename(url))) as thumb:
+                self.assertEqual(thumb.size, (size, size))
+
+    def test_name_matches_stored_content_and_metadata_is_stripped(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'PhoneMaker'
+        exif[0x8825] = {1: 'N', 2: (51.0, 30.0, 12.0)}  # GPS position
+        image_url = self.store.save(jpeg_upload(size=(300, 200), exif=exif))
+        self.store.wait()
+
+        path = os.path.join(self.tmp.name, os.path.basename(image_url))
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.assertEqual(os.path.splitext(os.path.basename(image_url))[0], hashlib.sha256(data).hexdigest()[:32])
+        with Image.open(path) as stored:
+            self.assertEqual(dict(stored.getexif()), {})
+            self.assertEqual(stored.size, (300, 200))
+
+    def test_reupload_does_not_render_thumbnails_again(self):
+        self.store.save(jpeg_upload())
+        self.store.wait()
+        with mock.patch.object(self.store, 'process') as process:
+            self.store.save(jpeg_upload(filename='again.jpg'))
+            self.store.wait()
+        process.assert_not_called()
+
+    def test_avatar_url_falls_back_to_the_original(self):
+        self.assertEqual(self.store.avatar_url('uploads/profile_pics/old.jpg'), 'uploads/profile_pics/old.jpg')
+        self.assertEqual(self.store.avatar_url(''), '')
+
+    def test_rejects_files_that_are_not_images(self):
+        with self.assertRaises(UploadError):
+            self.store.save(FileStorage(io.BytesIO(b'not an image'), filename='x.jpg'))
+        self.assertEqual(os.listdir(self.tmp.name), ['thumbs'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+import hashlib
+import io
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Profile picture uploads.
+#
+# Every upload is normalised before it is stored: rotated upright, shrunk to
+# MAX_ORIGINAL_SIDE and re-encoded, which drops EXIF (GPS position, camera
+# serial) and any other metadata. The stored file is named after a hash of
+# those normalised bytes, so the same photo uploaded twice is stored once and
+# the name always matches the content. A small thread pool then renders square
+# WebP and JPEG thumbnails at AVATAR_SIZES into thumbs/, unless they exist
+# already. Templates ask for an avatar through avatar_url(), which falls back
+# to the stored image until the thumbnail exists.
+#
+# `python uploads.py` normalises and thumbnails uploads that predate this.
+
+UPLOAD_FOLDER = os.path.join('static', 'uploads', 'profile_pics')
+UPLOAD_URL_PREFIX = 'uploads/profile_pics'
+AVATAR_SIZES = (60, 120)
+DEFAULT_AVATAR_SIZE = 120  # covers the 100px profile picture and 60px avatars on 2x screens
+MAX_ORIGINAL_SIDE = 1024
+THUMBNAIL_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+# Accepted upload format -> format it is stored in (GIFs keep their first frame)
+STORED_FORMATS = {'JPEG': 'JPEG', 'PNG': 'PNG', 'WEBP': 'WEBP', 'GIF': 'PNG'}
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+CONTENT_NAME = re.compile(r'[0-9a-f]{32}\.\w+')
+
+
+class UploadError(Exception):
+    """Raised when an upload isn't an image we accept."""
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _encode(image, fmt, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def normalize(data):
+    """Re-encode image bytes upright, at most MAX_ORIGINAL_SIDE and without metadata.
+
+    Returns (bytes, extension); raises UploadError for anything that isn't a supported image.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as original:
+            fmt = STORED_FORMATS.get(original.format)
+            if fmt is None:
+                raise UploadError(f"{original.format} images are not supported.")
+            image = ImageOps.exif_transpose(original)
+            image.load()
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError):
+        raise UploadError("The uploaded file is not a valid image.")
+
+    if max(image.size) > MAX_ORIGINAL_SIDE:
+        image.thumbnail((MAX_ORIGINAL_SIDE, MAX_ORIGINAL_SIDE), Image.LANCZOS)
+    if fmt == 'JPEG':
+        image = image.convert('RGB') if image.mode not in ('RGB', 'L') else image
+        return _encode(image, fmt, quality=85, optimize=True), EXTENSIONS[fmt]
+    if fmt == 'WEBP':
+        return _encode(image, fmt, quality=85), EXTENSIONS[fmt]
+    if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGBA')
+    return _encode(image, fmt, optimize=True), EXTENSIONS[fmt]
+
+
+class ImageStore:
+    def __init__(self, folder=UPLOAD_FOLDER, url_prefix=UPLOAD_URL_PREFIX, workers=2):
+        self.folder = folder
+        self.url_prefix = url_prefix
+        self.thumbs = os.path.join(folder, 'thumbs')
+        os.makedirs(self.thumbs, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnails')
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def save(self, upload):
+        """Store an uploaded image (a werkzeug FileStorage) and return its image_url."""
+        data, ext = normalize(upload.read())
+        name = hashlib.sha256(data).hexdigest()[:32] + ext
+        path = os.path.join(self.folder, name)
+        if not os.path.exists(path):
+            _write_atomic(path, data)
+        if not self.has_thumbnails(name):
+            self.process_later(name)
+        return f"{self.url_prefix}/{name}"
+
+    def has_thumbnails(self, name):
+        return all(os.path.exists(self._thumbnail_path(name, size, ext))
+                   for size in AVATAR_SIZES for ext in THUMBNAIL_FORMATS)
+
+    def normalize_in_place(self, name):
+        """Normalise an upload stored before save() did (names that aren't content hashes only)."""
+        if CONTENT_NAME.fullmatch(name):
+            return
+        path = os.path.join(self.folder, name)
+        with open(path, 'rb') as f:
+            data, _ = normalize(f.read())
+        _write_atomic(path, data)
+
+    def process_later(self, name):
+        """Render thumbnails on the worker pool. Returns the future."""
+        with self._lock:
+            future = self._pending.get(name)
+            if future is None:
+                future = self._executor.submit(self.process, name)
+                self._pending[name] = future
+                future.add_done_callback(lambda _: self._forget(name))
+            return future
+
+    def _forget(self, name):
+        with self._lock:
+            self._pending.pop(name, None)
+
+    def _thumbnail_path(self, name, size, ext):
+        return os.path.join(self.thumbs, f"{os.path.splitext(name)[0]}-{size}.{ext}")
+
+    def process(self, name):
+        path = os.path.join(self.folder, name)
+        try:
+            with Image.open(path) as stored:
+                image = ImageOps.exif_transpose(stored)
+                image.load()
+        except (OSError, UnidentifiedImageError) as e:
+            print(f"❌ Can't process upload {name}: {e}")
+            return
+
+        rgb = image.convert('RGBA').convert('RGB') if image.mode != 'RGB' else image
+        for size in AVATAR_SIZES:
+            square = ImageOps.fit(rgb, (size, size), Image.LANCZOS)
+            for ext, fmt in THUMBNAIL_FORMATS.items():
+                _write_atomic(self._thumbnail_path(name, size, ext),
+                              _encode(square, fmt, quality=82, optimize=True) if fmt == 'JPEG'
+                              else _encode(square, fmt, quality=80, method=4))
+
+    def avatar_url(self, image_url, size=DEFAULT_AVATAR_SIZE, ext='webp'):
+        """Static path of the thumbnail for `image_url`, or the original if it isn't ready."""
+        if not image_url or not image_url.startswith(self.url_prefix + '/'):
+            return image_url
+        name = image_url[len(self.url_prefix) + 1:]
+        size = min((s for s in AVATAR_SIZES if s >= size), default=max(AVATAR_SIZES))
+        if os.path.exists(self._thumbnail_path(name, size, ext)):
+            return f"{self.url_prefix}/thumbs/{os.path.splitext(name)[0]}-{size}.{ext}"
+        return image_url
+
+    def wait(self):
+        """Block until queued processing has finished (for scripts and tests)."""
+        with self._lock:
+            pending = list(self._pending.values())
+        for future in pending:
+            future.result()
+
+
+if __name__ == '__main__':
+    folder = sys.argv[1] if len(sys.argv) > 1 else UPLOAD_FOLDER
+    store = ImageStore(folder)
+    names = [n for n in sorted(os.listdir(folder)) if os.path.isfile(os.path.join(folder, n))
+             and not n.endswith('.tmp')]
+    before = sum(os.path.getsize(os.path.join(folder, n)) for n in names)
+    for name in names:
+        try:
+            store.normalize_in_place(name)
+        except UploadError as e:
+            print(f"❌ Skipping {name}: {e}")
+            continue
+        store.process_later(name)
+    store.wait()
+    after = sum(os.path.getsize(os.path.join(folder, n)) for n in names)
+    print(f"✅ Processed {len(names)} uploads ({before / 1e6:.1f} MB → {after / 1e6:.1f} MB of originals)")